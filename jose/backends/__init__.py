@@ -1,26 +1,255 @@
+import importlib
+import importlib.util
+import timeit
+
+from jose.backends.base import DIRKey  # noqa: F401
 from jose.backends.native import get_random_bytes  # noqa: F401
+from jose.constants import ALGORITHMS
+from jose.exceptions import JWKError
+
+# The implementations of each key family, most preferred first, as
+# (name, required distribution module, "module:class", unsupported algorithms).
+BACKENDS = {
+    "RSA": (
+        ("cryptography", "cryptography", "jose.backends.cryptography_backend:CryptographyRSAKey", ()),
+        ("rsa", "rsa", "jose.backends.rsa_backend:RSAKey", (ALGORITHMS.RSA_OAEP,)),
+    ),
+    "EC": (
+        ("cryptography", "cryptography", "jose.backends.cryptography_backend:CryptographyECKey", ()),
+        ("ecdsa", "ecdsa", "jose.backends.ecdsa_backend:ECDSAECKey", tuple(ALGORITHMS.EC_KW)),
+    ),
+    "OKP": (("cryptography", "cryptography", "jose.backends.cryptography_backend:CryptographyOKPKey", ()),),
+    "AES": (("cryptography", "cryptography", "jose.backends.cryptography_backend:CryptographyAESKey", ()),),
+    "HMAC": (
+        ("cryptography", "cryptography", "jose.backends.cryptography_hmac:CryptographyHMACKey", ()),
+        ("native", None, "jose.backends.native:HMACKey", ()),
+    ),
+}
+
+FAMILIES = {
+    "RSA": ALGORITHMS.RSA,
+    "EC": ALGORITHMS.EC,
+    "OKP": ALGORITHMS.OKP,
+    "AES": ALGORITHMS.AES,
+    "HMAC": ALGORITHMS.HMAC,
+}
+
+# The module level name each family's active key class is published under.
+# The backends are only imported when one of these is first looked up, so
+# e.g. using HMAC alone never imports the asymmetric key libraries.
+_EXPORTS = {"RSA": "RSAKey", "EC": "ECKey", "OKP": "OKPKey", "AES": "AESKey", "HMAC": "HMACKey"}
+_FAMILY_OF = {algorithm: family for family, algorithms in FAMILIES.items() for algorithm in algorithms}
+
+# The names of the backends chosen for each family, in order of preference.
+_preferences = {}
+
+# The active (name, key class) of each family, and the key class of each algorithm.
+_selected = {}
+_dispatch = {ALGORITHMS.DIR: DIRKey}
+
 
-try:
-    from jose.backends.cryptography_backend import CryptographyRSAKey as RSAKey  # noqa: F401
-except ImportError:
+def _candidates(family):
     try:
-        from jose.backends.rsa_backend import RSAKey  # noqa: F401
+        return BACKENDS[family]
+    except KeyError:
+        raise JWKError("Unknown key family: %s" % family)
+
+
+def _load(candidate):
+    name, requirement, path, unsupported = candidate
+    if requirement is not None and importlib.util.find_spec(requirement) is None:
+        return None
+    module_name, class_name = path.split(":")
+    try:
+        return getattr(importlib.import_module(module_name), class_name)
     except ImportError:
-        RSAKey = None
+        return None
+
+
+def available_backends(family):
+    """
+    List the backends installed for a key family.
+
+    Args:
+        family (str): A key family, one of ``FAMILIES``, e.g. "RSA".
+
+    Returns:
+        list: The backend names, most preferred first.
+
+    Raises:
+        JWKError: If the family is not known.
+    """
+    return [
+        candidate[0]
+        for candidate in _candidates(family)
+        if candidate[1] is None or importlib.util.find_spec(candidate[1]) is not None
+    ]
+
+
+def _select(family):
+    candidates = _candidates(family)
+    names = _preferences.get(family)
+    if names is not None:
+        candidates = [next(c for c in candidates if c[0] == name) for name in names]
+
+    _selected[family] = None, None
+    for candidate in candidates:
+        key_class = _load(candidate)
+        if key_class is not None:
+            _selected[family] = candidate[0], key_class
+            break
+
+    _advertise(family, _selected[family][0])
+    globals()[_EXPORTS[family]] = _selected[family][1]
+    for algorithm in FAMILIES[family]:
+        _dispatch.pop(algorithm, None)
+
+
+def _advertise(family, selected):
+    # Only advertise the algorithms of the family that the backend implements.
+    if selected is None:
+        ALGORITHMS.SUPPORTED.difference_update(FAMILIES[family])
+        return
+    for name, requirement, path, unsupported in _candidates(family):
+        if name == selected:
+            ALGORITHMS.SUPPORTED.difference_update(unsupported)
+        else:
+            ALGORITHMS.SUPPORTED.update(set(unsupported) & FAMILIES[family])
+
+
+def get_backend(family):
+    """
+    Get the key class that is used for a key family.
+
+    Args:
+        family (str): A key family, one of ``FAMILIES``, e.g. "RSA".
+
+    Returns:
+        type: The key class, or None if no backend is installed for the family.
+
+    Raises:
+        JWKError: If the family is not known.
+    """
+    if family not in _selected:
+        _select(family)
+    return _selected[family][1]
+
+
+def use_backend(family, *names):
+    """
+    Choose the backend that is used for a key family.
+
+    The first installed backend out of ``names`` is used, so a single name
+    pins the backend and several names state an order of preference. Without
+    any names the default order is restored. Algorithms the chosen backend
+    does not implement are removed from ``ALGORITHMS.SUPPORTED``.
+
+    Args:
+        family (str): A key family, one of ``FAMILIES``, e.g. "RSA".
+        *names (str): Backend names, as listed by ``available_backends``.
+
+    Returns:
+        str: The name of the backend now in use, or None if no names are
+        given and no backend of the family is installed.
+
+    Raises:
+        JWKError: If the family or a backend name is not known, or none of
+            the named backends is installed.
+    """
+    known = [candidate[0] for candidate in _candidates(family)]
+    for name in names:
+        if name not in known:
+            raise JWKError("Unknown %s backend: %s" % (family, name))
+
+    previous = _preferences.get(family)
+    _preferences[family] = names or None
+    _select(family)
+    if _selected[family][1] is None and names:
+        # Keep what was in use before rather than leave the family without a backend.
+        _preferences[family] = previous
+        _select(family)
+        raise JWKError("None of the %s backends %s is installed" % (family, ", ".join(names)))
+    return _selected[family][0]
+
+
+def get_key_class(algorithm):
+    """
+    Get the key class of the backend that is used for an algorithm.
+
+    Args:
+        algorithm (str): The algorithm, e.g. "RS256".
+
+    Returns:
+        type: The key class, or None if the algorithm is not implemented.
+    """
+    key_class = _dispatch.get(algorithm)
+    if key_class is None and algorithm in _FAMILY_OF:
+        family = _FAMILY_OF[algorithm]
+        key_class = get_backend(family)
+        if key_class is not None:
+            _dispatch.update(dict.fromkeys(FAMILIES[family], key_class))
+    return key_class
+
+
+def benchmark_backends(family, key_data, algorithm, number=50):
+    """
+    Time signing and verifying a message with each installed backend of a
+    key family.
+
+    Args:
+        family (str): A key family, one of ``FAMILIES``, e.g. "RSA".
+        key_data: A private key in a form all the backends accept, e.g. PEM.
+        algorithm (str): The signing algorithm to time, e.g. "RS256".
+        number (int): How many signatures to time.
+
+    Returns:
+        dict: The seconds each backend took per signature and verification.
+
+    Raises:
+        JWKError: If the family is not known or the algorithm is not a
+            signing algorithm of the family.
+    """
+    if algorithm not in FAMILIES.get(family, ()) or algorithm not in ALGORITHMS.HASHES:
+        raise JWKError("Unable to benchmark %s with %s backends" % (algorithm, family))
+
+    msg = b"benchmark"
+    timings = {}
+    for candidate in _candidates(family):
+        key_class = _load(candidate)
+        if key_class is None:
+            continue
+        key = key_class(key_data, algorithm)
+        verifying_key = key.public_key() if family != "HMAC" else key
+
+        def sign_and_verify():
+            verifying_key.verify(msg, key.sign(msg))
+
+        timings[candidate[0]] = timeit.timeit(sign_and_verify, number=number) / number
+    return timings
+
+
+def use_fastest_backend(family, key_data, algorithm, number=50):
+    """
+    Run ``benchmark_backends`` and use the fastest backend for the family.
+
+    This is meant to be called once at startup. The arguments are those of
+    ``benchmark_backends``.
+
+    Returns:
+        str: The name of the backend now in use.
+    """
+    timings = benchmark_backends(family, key_data, algorithm, number=number)
+    return use_backend(family, min(timings, key=timings.get))
 
-try:
-    from jose.backends.cryptography_backend import CryptographyECKey as ECKey  # noqa: F401
-except ImportError:
-    from jose.backends.ecdsa_backend import ECDSAECKey as ECKey  # noqa: F401
 
-try:
-    from jose.backends.cryptography_backend import CryptographyAESKey as AESKey  # noqa: F401
-except ImportError:
-    AESKey = None
+def __getattr__(name):
+    for family, export in _EXPORTS.items():
+        if export == name:
+            return get_backend(family)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
-try:
-    from jose.backends.cryptography_backend import CryptographyHMACKey as HMACKey  # noqa: F401
-except ImportError:
-    from jose.backends.native import HMACKey  # noqa: F401
 
-from .base import DIRKey  # noqa: F401
+# Advertise what the backend each family would use supports, without importing it yet.
+for _family in BACKENDS:
+    _advertise(_family, (available_backends(_family) or [None])[0])
+del _family
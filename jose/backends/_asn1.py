@@ -1,84 +1,189 @@
-"""ASN1 encoding helpers for converting between PKCS1 and PKCS8.
+"""DER encoding helpers for the RSA key structures read and written by rsa_backend.
 
-Required by rsa_backend but not cryptography_backend.
+Only the structures needed are implemented: PKCS1 RSAPublicKey and
+RSAPrivateKey, and the PKCS8 PrivateKeyInfo and SubjectPublicKeyInfo that
+wrap them. Required by rsa_backend but not cryptography_backend.
 """
 
-from pyasn1.codec.der import decoder, encoder
-from pyasn1.type import namedtype, univ
-
 RSA_ENCRYPTION_ASN1_OID = "1.2.840.113549.1.1.1"
 
+_SEQUENCE = 0x30
+_INTEGER = 0x02
+_BIT_STRING = 0x03
+_OCTET_STRING = 0x04
 
-class RsaAlgorithmIdentifier(univ.Sequence):
-    """ASN1 structure for recording RSA PrivateKeyAlgorithm identifiers."""
+# AlgorithmIdentifier SEQUENCE { OID rsaEncryption, NULL }
+_RSA_ALGORITHM_IDENTIFIER = bytes.fromhex("300d06092a864886f70d0101010500")
 
-    componentType = namedtype.NamedTypes(
-        namedtype.NamedType("rsaEncryption", univ.ObjectIdentifier()), namedtype.NamedType("parameters", univ.Null())
-    )
 
+def _read(der, offset, tag):
+    """Read the element with the given tag at offset.
 
-class PKCS8PrivateKey(univ.Sequence):
-    """ASN1 structure for recording PKCS8 private keys."""
+    Returns:
+        (int, int): The start and end offsets of the element's contents.
 
-    componentType = namedtype.NamedTypes(
-        namedtype.NamedType("version", univ.Integer()),
-        namedtype.NamedType("privateKeyAlgorithm", RsaAlgorithmIdentifier()),
-        namedtype.NamedType("privateKey", univ.OctetString()),
-    )
+    Raises:
+        ValueError: If the element has another tag or does not fit in der.
+    """
+    if offset + 2 > len(der) or der[offset] != tag:
+        raise ValueError("Invalid DER encoding")
+    length = der[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if not 0 < size <= 4 or offset + size > len(der):
+            raise ValueError("Invalid DER encoding")
+        length = int.from_bytes(der[offset : offset + size], "big")
+        offset += size
+    if offset + length > len(der):
+        raise ValueError("Invalid DER encoding")
+    return offset, offset + length
 
 
-class PublicKeyInfo(univ.Sequence):
-    """ASN1 structure for recording PKCS8 public keys."""
+def _read_sequence(der):
+    """Read the SEQUENCE that der consists of.
 
-    componentType = namedtype.NamedTypes(
-        namedtype.NamedType("algorithm", RsaAlgorithmIdentifier()), namedtype.NamedType("publicKey", univ.BitString())
-    )
+    Returns:
+        (int, int): The start and end offsets of the sequence's contents.
+    """
+    start, end = _read(der, 0, _SEQUENCE)
+    if end != len(der):
+        raise ValueError("Invalid DER encoding")
+    return start, end
 
 
-def rsa_private_key_pkcs8_to_pkcs1(pkcs8_key):
-    """Convert a PKCS8-encoded RSA private key to PKCS1."""
-    decoded_values = decoder.decode(pkcs8_key, asn1Spec=PKCS8PrivateKey())
+def _read_integers(der, offset, end, count):
+    """Read count INTEGERs from offset.
 
-    try:
-        decoded_key = decoded_values[0]
-    except IndexError:
+    Returns:
+        (list, int): The integers, and the offset after them.
+    """
+    values = []
+    for _ in range(count):
+        start, offset = _read(der, offset, _INTEGER)
+        if offset > end or start == offset:
+            raise ValueError("Invalid DER encoding")
+        values.append(int.from_bytes(der[start:offset], "big", signed=True))
+    return values, offset
+
+
+def _encode(tag, contents):
+    length = len(contents)
+    if length < 0x80:
+        return bytes((tag, length)) + contents
+    length = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes((tag, 0x80 | len(length))) + length + contents
+
+
+def _encode_integer(value):
+    # One byte more than the magnitude needs whenever its top bit is set, for the sign.
+    return _encode(_INTEGER, value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True))
+
+
+def rsa_public_key_from_pkcs1(pkcs1_key):
+    """Decode a PKCS1 RSAPublicKey.
+
+    Returns:
+        (int, int): The modulus n and the public exponent e.
+
+    Raises:
+        ValueError: If the key is not a DER-encoded RSAPublicKey.
+    """
+    offset, end = _read_sequence(pkcs1_key)
+    (n, e), offset = _read_integers(pkcs1_key, offset, end, 2)
+    if offset != end:
+        raise ValueError("Invalid public key encoding")
+    return n, e
+
+
+def rsa_public_key_to_pkcs1(n, e):
+    """Encode a PKCS1 RSAPublicKey."""
+    return _encode(_SEQUENCE, _encode_integer(n) + _encode_integer(e))
+
+
+def rsa_private_key_from_pkcs1(pkcs1_key):
+    """Decode a PKCS1 RSAPrivateKey of two primes.
+
+    Returns:
+        tuple: n, e, d, p, q, exponent1, exponent2 and coefficient.
+
+    Raises:
+        ValueError: If the key is not a DER-encoded two-prime RSAPrivateKey.
+    """
+    offset, end = _read_sequence(pkcs1_key)
+    values, offset = _read_integers(pkcs1_key, offset, end, 9)
+    if values[0] != 0 or offset != end:
         raise ValueError("Invalid private key encoding")
+    return tuple(values[1:])
 
-    return decoded_key["privateKey"]
 
+def rsa_private_key_to_pkcs1(n, e, d, p, q, exp1, exp2, coef):
+    """Encode a PKCS1 RSAPrivateKey of two primes."""
+    values = (0, n, e, d, p, q, exp1, exp2, coef)
+    return _encode(_SEQUENCE, b"".join(_encode_integer(value) for value in values))
 
-def rsa_private_key_pkcs1_to_pkcs8(pkcs1_key):
-    """Convert a PKCS1-encoded RSA private key to PKCS8."""
-    algorithm = RsaAlgorithmIdentifier()
-    algorithm["rsaEncryption"] = RSA_ENCRYPTION_ASN1_OID
 
-    pkcs8_key = PKCS8PrivateKey()
-    pkcs8_key["version"] = 0
-    pkcs8_key["privateKeyAlgorithm"] = algorithm
-    pkcs8_key["privateKey"] = pkcs1_key
+def rsa_key_der_label(der):
+    """Tell which RSA key structure DER encodes, without decoding it fully.
 
-    return encoder.encode(pkcs8_key)
+    Returns:
+        str: The PEM label of the structure, e.g. "RSA PRIVATE KEY".
 
+    Raises:
+        ValueError: If der is not one of the RSA key structures.
+    """
+    offset, end = _read_sequence(der)
+    if offset < end and der[offset] == _SEQUENCE:
+        return "PUBLIC KEY"
+    start, offset = _read(der, offset, _INTEGER)
+    if offset < end and der[offset] == _INTEGER:
+        # RSAPrivateKey starts with a one octet version and goes on after
+        # the modulus, RSAPublicKey ends with the exponent.
+        if offset - start == 1 and _read(der, offset, _INTEGER)[1] < end:
+            return "RSA PRIVATE KEY"
+        return "RSA PUBLIC KEY"
+    if offset < end and der[offset] == _SEQUENCE:
+        return "PRIVATE KEY"
+    raise ValueError("Invalid DER encoding")
 
-def rsa_public_key_pkcs1_to_pkcs8(pkcs1_key):
+
+def rsa_private_key_pkcs8_to_pkcs1(pkcs8_key):
+    """Convert a PKCS8-encoded RSA private key to PKCS1."""
+    try:
+        offset, end = _read_sequence(pkcs8_key)
+        version, offset = _read_integers(pkcs8_key, offset, end, 1)
+        start, offset = _read(pkcs8_key, offset, _SEQUENCE)
+        if pkcs8_key[start - 2 : offset] != _RSA_ALGORITHM_IDENTIFIER:
+            raise ValueError("Not an RSA private key")
+        start, offset = _read(pkcs8_key, offset, _OCTET_STRING)
+    except ValueError:
+        raise ValueError("Invalid private key encoding")
+    if version != [0] or offset != end:
+        raise ValueError("Invalid private key encoding")
+    return pkcs8_key[start:offset]
+
+
+def rsa_private_key_pkcs1_to_pkcs8(pkcs1_key):
     """Convert a PKCS1-encoded RSA private key to PKCS8."""
-    algorithm = RsaAlgorithmIdentifier()
-    algorithm["rsaEncryption"] = RSA_ENCRYPTION_ASN1_OID
+    return _encode(_SEQUENCE, _encode_integer(0) + _RSA_ALGORITHM_IDENTIFIER + _encode(_OCTET_STRING, pkcs1_key))
 
-    pkcs8_key = PublicKeyInfo()
-    pkcs8_key["algorithm"] = algorithm
-    pkcs8_key["publicKey"] = univ.BitString.fromOctetString(pkcs1_key)
 
-    return encoder.encode(pkcs8_key)
+def rsa_public_key_pkcs1_to_pkcs8(pkcs1_key):
+    """Convert a PKCS1-encoded RSA public key to PKCS8."""
+    return _encode(_SEQUENCE, _RSA_ALGORITHM_IDENTIFIER + _encode(_BIT_STRING, b"\x00" + pkcs1_key))
 
 
 def rsa_public_key_pkcs8_to_pkcs1(pkcs8_key):
-    """Convert a PKCS8-encoded RSA private key to PKCS1."""
-    decoded_values = decoder.decode(pkcs8_key, asn1Spec=PublicKeyInfo())
-
+    """Convert a PKCS8-encoded RSA public key to PKCS1."""
     try:
-        decoded_key = decoded_values[0]
-    except IndexError:
+        offset, end = _read_sequence(pkcs8_key)
+        start, offset = _read(pkcs8_key, offset, _SEQUENCE)
+        if pkcs8_key[start - 2 : offset] != _RSA_ALGORITHM_IDENTIFIER:
+            raise ValueError("Not an RSA public key")
+        start, offset = _read(pkcs8_key, offset, _BIT_STRING)
+    except ValueError:
         raise ValueError("Invalid public key encoding.")
-
-    return decoded_key["publicKey"].asOctets()
+    # The key is a whole number of octets, so no bits of the BIT STRING are unused.
+    if offset != end or offset == start or pkcs8_key[start] != 0:
+        raise ValueError("Invalid public key encoding.")
+    return pkcs8_key[start + 1 : offset]
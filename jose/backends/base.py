@@ -1,11 +1,32 @@
-from ..utils import base64url_encode, ensure_binary
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from ..utils import base64url_decode, base64url_encode, calculate_jwk_thumbprint, ensure_binary
+
+
+def _restore_key(key_class, data):
+    return key_class.from_bytes(data)
+
+
+def _encode_bytes(value):
+    # Some keys return the "k" member of their JWK as bytes.
+    if isinstance(value, bytes):
+        return value.decode("ascii")
+    raise TypeError("%r is not JSON serializable" % (value,))
 
 
 class Key:
     """
     A simple interface for implementing JWK keys.
+
+    Keys are slotted, since applications may hold very many of them, so
+    subclasses should declare ``__slots__`` for the attributes they set.
     """
 
+    __slots__ = ("_thumbprints", "_serialized")
+
     def __init__(self, key, algorithm):
         pass
 
@@ -24,6 +45,76 @@ class Key:
     def to_dict(self):
         raise NotImplementedError()
 
+    def thumbprint(self, hash_alg=hashlib.sha256):
+        """
+        Get the RFC 7638 thumbprint of the key, e.g. to use as its ``kid``
+
+        The thumbprint only covers the public members of the key, so a
+        private key and its public key have the same thumbprint. It is
+        computed once per hash algorithm and key.
+
+        Args:
+            hash_alg (callable): A callable returning a hash object, e.g. hashlib.sha256
+
+        Returns:
+            bytes: The thumbprint digest
+        """
+        try:
+            thumbprints = self._thumbprints
+        except AttributeError:
+            thumbprints = self._thumbprints = {}
+        thumbprint = thumbprints.get(hash_alg)
+        if thumbprint is None:
+            thumbprint = thumbprints[hash_alg] = calculate_jwk_thumbprint(self.to_dict(), hash_alg)
+        return thumbprint
+
+    def to_bytes(self):
+        """
+        Serialize the key compactly, e.g. to send it to another process
+
+        The key is written as its JWK, which includes the algorithm, in
+        compact JSON. It is serialized once per key. Keys are pickled in
+        this form too.
+
+        Returns:
+            bytes: The serialized key
+        """
+        try:
+            return self._serialized
+        except AttributeError:
+            data = json.dumps(self.to_dict(), separators=(",", ":"), sort_keys=True, default=_encode_bytes)
+            self._serialized = data.encode("utf-8")
+            return self._serialized
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Load a key serialized by ``to_bytes``
+
+        Keys loaded before are kept in a bounded per-process cache, so a
+        process loading the same key for every task only parses it once.
+        The cached key object is shared by all the callers.
+
+        Args:
+            data (bytes): The serialized key
+
+        Returns:
+            Key: The key
+        """
+        data = bytes(data)
+        key = _loaded_keys.get((cls, data))
+        if key is None:
+            key = cls._from_jwk(json.loads(data))
+            _loaded_keys.set((cls, data), key)
+        return key
+
+    @classmethod
+    def _from_jwk(cls, jwk_dict):
+        return cls(jwk_dict, jwk_dict["alg"])
+
+    def __reduce__(self):
+        return _restore_key, (type(self), self.to_bytes())
+
     def encrypt(self, plain_text, aad=None):
         """
         Encrypt the plain text and generate an auth tag if appropriate
@@ -75,15 +166,85 @@ class Key:
         """
         raise NotImplementedError()
 
+    def exchange(self, public_key):
+        """
+        Agree on a shared secret with the owner of public_key
+
+        Args:
+            public_key (Key): The other party's public key
+
+        Returns:
+            bytes: The shared secret
+        """
+        raise NotImplementedError()
+
+    def generate_ephemeral_key(self):
+        """
+        Generate a new private key of the same type and size as this key,
+        e.g. for the sender's side of a key agreement
+
+        Returns:
+            Key: The generated private key
+        """
+        raise NotImplementedError()
+
 
 class DIRKey(Key):
+    __slots__ = ("_key", "_alg")
+
     def __init__(self, key_data, algorithm):
         self._key = ensure_binary(key_data)
         self._alg = algorithm
 
+    @classmethod
+    def _from_jwk(cls, jwk_dict):
+        return cls(base64url_decode(jwk_dict["k"].encode("ascii")), jwk_dict["alg"])
+
     def to_dict(self):
         return {
             "alg": self._alg,
             "kty": "oct",
             "k": base64url_encode(self._key),
         }
+
+
+class PreparedKeyCache:
+    """
+    A bounded, thread safe cache of prepared backend keys, shared by the Key
+    instances of a backend so that keys constructed again, e.g. by
+    ``jwk.construct`` for every token, skip parsing and precomputation.
+    The least recently used key is evicted once ``maxsize`` keys are held.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, cache_key):
+        return cache_key in self._keys
+
+    def get(self, cache_key):
+        with self._lock:
+            prepared_key = self._keys.get(cache_key)
+            if prepared_key is not None:
+                self._keys.move_to_end(cache_key)
+            return prepared_key
+
+    def set(self, cache_key, prepared_key):
+        with self._lock:
+            self._keys[cache_key] = prepared_key
+            self._keys.move_to_end(cache_key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+# Keys loaded by Key.from_bytes in this process.
+_loaded_keys = PreparedKeyCache(maxsize=256)
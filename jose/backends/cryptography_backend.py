@@ -3,8 +3,8 @@ import warnings
 
 from cryptography.exceptions import InvalidSignature, InvalidTag
 from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes, hmac, serialization
-from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, padding, rsa
 from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
 from cryptography.hazmat.primitives.ciphers import Cipher, aead, algorithms, modes
 from cryptography.hazmat.primitives.keywrap import InvalidUnwrap, aes_key_unwrap, aes_key_wrap
@@ -19,31 +19,30 @@ from ..utils import (
     base64_to_long,
     base64url_decode,
     base64url_encode,
+    calculate_jwk_thumbprint,
     ensure_binary,
-    is_pem_format,
-    is_ssh_key,
     long_to_base64,
 )
 from . import get_random_bytes
-from .base import Key
+from .base import Key, PreparedKeyCache
+from .cryptography_hmac import CryptographyHMACKey  # noqa: F401
 
 _binding = None
 
 
 class CryptographyECKey(Key):
+    __slots__ = ("_algorithm", "cryptography_backend", "prepared_key")
+
     SHA256 = hashes.SHA256
     SHA384 = hashes.SHA384
     SHA512 = hashes.SHA512
 
+    HASH_ALGS = {ALGORITHMS.ES256: SHA256, ALGORITHMS.ES384: SHA384, ALGORITHMS.ES512: SHA512}
+
     def __init__(self, key, algorithm, cryptography_backend=default_backend):
         if algorithm not in ALGORITHMS.EC:
             raise JWKError("hash_alg: %s is not a valid hash algorithm" % algorithm)
 
-        self.hash_alg = {
-            ALGORITHMS.ES256: self.SHA256,
-            ALGORITHMS.ES384: self.SHA384,
-            ALGORITHMS.ES512: self.SHA512,
-        }.get(algorithm)
         self._algorithm = algorithm
 
         self.cryptography_backend = cryptography_backend
@@ -80,6 +79,10 @@ class CryptographyECKey(Key):
 
         raise JWKError("Unable to parse an ECKey from key: %s" % key)
 
+    @property
+    def hash_alg(self):
+        return self.HASH_ALGS.get(self._algorithm)
+
     def _process_jwk(self, jwk_dict):
         if not jwk_dict.get("kty") == "EC":
             raise JWKError("Incorrect key type. Expected: 'EC', Received: %s" % jwk_dict.get("kty"))
@@ -199,8 +202,160 @@ class CryptographyECKey(Key):
 
         return data
 
+    def exchange(self, public_key):
+        if self.is_public():
+            raise JWKError("Key agreement requires a private key")
+        if not isinstance(public_key, CryptographyECKey):
+            raise JWKError("Key agreement requires an EC public key")
+        peer_key = public_key.public_key().prepared_key
+        if peer_key.curve.name != self.prepared_key.curve.name:
+            raise JWKError("Key agreement requires keys on the same curve")
+        return self.prepared_key.exchange(ec.ECDH(), peer_key)
+
+    def generate_ephemeral_key(self):
+        private_key = ec.generate_private_key(self.prepared_key.curve, self.cryptography_backend())
+        return self.__class__(private_key, self._algorithm)
+
+
+class CryptographyOKPKey(Key):
+    """
+    Performs signing and verification operations using EdDSA with the
+    Ed25519 and Ed448 curves, for keys of the OKP key type (RFC 8037).
+    """
+
+    __slots__ = ("_algorithm", "cryptography_backend", "prepared_key")
+
+    CURVES = {
+        "Ed25519": (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey),
+        "Ed448": (ed448.Ed448PrivateKey, ed448.Ed448PublicKey),
+    }
+
+    def __init__(self, key, algorithm, cryptography_backend=default_backend):
+        if algorithm not in ALGORITHMS.OKP:
+            raise JWKError("hash_alg: %s is not a valid hash algorithm" % algorithm)
+
+        self._algorithm = algorithm
+
+        self.cryptography_backend = cryptography_backend
+
+        if isinstance(
+            key,
+            (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey, ed448.Ed448PrivateKey, ed448.Ed448PublicKey),
+        ):
+            self.prepared_key = key
+            return
+
+        if isinstance(key, dict):
+            self.prepared_key = self._process_jwk(key)
+            return
+
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+
+        if isinstance(key, bytes):
+            try:
+                try:
+                    key = load_pem_public_key(key, self.cryptography_backend())
+                except ValueError:
+                    key = load_pem_private_key(key, password=None, backend=self.cryptography_backend())
+            except Exception as e:
+                raise JWKError(e)
+
+            if self._get_curve(key) is None:
+                raise JWKError("Unable to parse an OKPKey from key: not an Ed25519 or Ed448 key")
+            self.prepared_key = key
+            return
+
+        raise JWKError("Unable to parse an OKPKey from key: %s" % key)
+
+    def _process_jwk(self, jwk_dict):
+        if not jwk_dict.get("kty") == "OKP":
+            raise JWKError("Incorrect key type. Expected: 'OKP', Received: %s" % jwk_dict.get("kty"))
+
+        if not all(k in jwk_dict for k in ["x", "crv"]):
+            raise JWKError("Mandatory parameters are missing")
+
+        if jwk_dict["crv"] not in self.CURVES:
+            raise JWKError("Unsupported curve: %s" % jwk_dict["crv"])
+        private_cls, public_cls = self.CURVES[jwk_dict["crv"]]
+
+        try:
+            public = public_cls.from_public_bytes(base64url_decode(ensure_binary(jwk_dict["x"])))
+            if "d" not in jwk_dict:
+                return public
+
+            private = private_cls.from_private_bytes(base64url_decode(ensure_binary(jwk_dict["d"])))
+        except ValueError as e:
+            raise JWKError(e)
+
+        raw = (serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        if private.public_key().public_bytes(*raw) != public.public_bytes(*raw):
+            raise JWKError("Private key does not match public key")
+        return private
+
+    def _get_curve(self, key):
+        for crv, classes in self.CURVES.items():
+            if isinstance(key, classes):
+                return crv
+        return None
+
+    def sign(self, msg):
+        return self.prepared_key.sign(msg)
+
+    def verify(self, msg, sig):
+        key = self.prepared_key if self.is_public() else self.prepared_key.public_key()
+        try:
+            key.verify(sig, msg)
+            return True
+        except InvalidSignature:
+            return False
+
+    def is_public(self):
+        return isinstance(self.prepared_key, (ed25519.Ed25519PublicKey, ed448.Ed448PublicKey))
+
+    def public_key(self):
+        if self.is_public():
+            return self
+        return self.__class__(self.prepared_key.public_key(), self._algorithm)
+
+    def to_pem(self):
+        if self.is_public():
+            return self.prepared_key.public_bytes(
+                encoding=serialization.Encoding.PEM, format=serialization.PublicFormat.SubjectPublicKeyInfo
+            )
+        return self.prepared_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+
+    def to_dict(self):
+        public_key = self.prepared_key if self.is_public() else self.prepared_key.public_key()
+
+        data = {
+            "alg": self._algorithm,
+            "kty": "OKP",
+            "crv": self._get_curve(self.prepared_key),
+            "x": base64url_encode(
+                public_key.public_bytes(encoding=serialization.Encoding.Raw, format=serialization.PublicFormat.Raw)
+            ).decode("ASCII"),
+        }
+
+        if not self.is_public():
+            data["d"] = base64url_encode(
+                self.prepared_key.private_bytes(
+                    encoding=serialization.Encoding.Raw,
+                    format=serialization.PrivateFormat.Raw,
+                    encryption_algorithm=serialization.NoEncryption(),
+                )
+            ).decode("ASCII")
+
+        return data
+
 
 class CryptographyRSAKey(Key):
+    __slots__ = ("_algorithm", "cryptography_backend", "prepared_key")
+
     SHA256 = hashes.SHA256
     SHA384 = hashes.SHA384
     SHA512 = hashes.SHA512
@@ -209,23 +364,20 @@ class CryptographyRSAKey(Key):
     RSA_OAEP = padding.OAEP(padding.MGF1(hashes.SHA1()), hashes.SHA1(), None)
     RSA_OAEP_256 = padding.OAEP(padding.MGF1(hashes.SHA256()), hashes.SHA256(), None)
 
+    HASH_ALGS = {ALGORITHMS.RS256: SHA256, ALGORITHMS.RS384: SHA384, ALGORITHMS.RS512: SHA512}
+    PADDINGS = {ALGORITHMS.RSA1_5: RSA1_5, ALGORITHMS.RSA_OAEP: RSA_OAEP, ALGORITHMS.RSA_OAEP_256: RSA_OAEP_256}
+
+    # Private keys built from JWKs, keyed by thumbprint and private exponent.
+    _private_keys = PreparedKeyCache()
+
+    # The public keys of PEM certificates, so that each is only parsed once.
+    _certificate_keys = PreparedKeyCache()
+
     def __init__(self, key, algorithm, cryptography_backend=default_backend):
         if algorithm not in ALGORITHMS.RSA:
             raise JWKError("hash_alg: %s is not a valid hash algorithm" % algorithm)
 
-        self.hash_alg = {
-            ALGORITHMS.RS256: self.SHA256,
-            ALGORITHMS.RS384: self.SHA384,
-            ALGORITHMS.RS512: self.SHA512,
-        }.get(algorithm)
         self._algorithm = algorithm
-
-        self.padding = {
-            ALGORITHMS.RSA1_5: self.RSA1_5,
-            ALGORITHMS.RSA_OAEP: self.RSA_OAEP,
-            ALGORITHMS.RSA_OAEP_256: self.RSA_OAEP_256,
-        }.get(algorithm)
-
         self.cryptography_backend = cryptography_backend
 
         # if it conforms to RSAPublicKey or RSAPrivateKey interface
@@ -256,6 +408,14 @@ class CryptographyRSAKey(Key):
 
         raise JWKError("Unable to parse an RSA_JWK from key: %s" % key)
 
+    @property
+    def hash_alg(self):
+        return self.HASH_ALGS.get(self._algorithm)
+
+    @property
+    def padding(self):
+        return self.PADDINGS.get(self._algorithm)
+
     def _process_jwk(self, jwk_dict):
         if not jwk_dict.get("kty") == "RSA":
             raise JWKError("Incorrect key type. Expected: 'RSA', Received: %s" % jwk_dict.get("kty"))
@@ -267,39 +427,63 @@ class CryptographyRSAKey(Key):
         if "d" not in jwk_dict:
             return public.public_key(self.cryptography_backend())
         else:
-            # This is a private key.
-            d = base64_to_long(jwk_dict.get("d"))
-
-            extra_params = ["p", "q", "dp", "dq", "qi"]
-
-            if any(k in jwk_dict for k in extra_params):
-                # Precomputed private key parameters are available.
-                if not all(k in jwk_dict for k in extra_params):
-                    # These values must be present when 'p' is according to
-                    # Section 6.3.2 of RFC7518, so if they are not we raise
-                    # an error.
-                    raise JWKError("Precomputed private key parameters are incomplete.")
-
-                p = base64_to_long(jwk_dict["p"])
-                q = base64_to_long(jwk_dict["q"])
-                dp = base64_to_long(jwk_dict["dp"])
-                dq = base64_to_long(jwk_dict["dq"])
-                qi = base64_to_long(jwk_dict["qi"])
-            else:
-                # The precomputed private key parameters are not available,
-                # so we use cryptography's API to fill them in.
-                p, q = rsa.rsa_recover_prime_factors(n, e, d)
-                dp = rsa.rsa_crt_dmp1(d, p)
-                dq = rsa.rsa_crt_dmq1(d, q)
-                qi = rsa.rsa_crt_iqmp(p, q)
+            # This is a private key. Recovering its factors and checking the
+            # CRT parameters is expensive, so it is only done once per key.
+            cache_key = self._private_cache_key(jwk_dict)
+            private_key = self._private_keys.get(cache_key) if cache_key is not None else None
+            if private_key is None:
+                private_key = self._process_private_jwk(jwk_dict, public)
+                if cache_key is not None:
+                    self._private_keys.set(cache_key, private_key)
+            return private_key
+
+    @staticmethod
+    def _private_cache_key(jwk_dict):
+        try:
+            members = tuple(jwk_dict.get(name) for name in ("d", "p", "q", "dp", "dq", "qi"))
+            cache_key = calculate_jwk_thumbprint(jwk_dict), members
+            hash(cache_key)
+        except (KeyError, TypeError, ValueError):
+            return None
+        return cache_key
+
+    def _process_private_jwk(self, jwk_dict, public):
+        e, n = public.e, public.n
+        d = base64_to_long(jwk_dict.get("d"))
+
+        extra_params = ["p", "q", "dp", "dq", "qi"]
+
+        if any(k in jwk_dict for k in extra_params):
+            # Precomputed private key parameters are available.
+            if not all(k in jwk_dict for k in extra_params):
+                # These values must be present when 'p' is according to
+                # Section 6.3.2 of RFC7518, so if they are not we raise
+                # an error.
+                raise JWKError("Precomputed private key parameters are incomplete.")
+
+            p = base64_to_long(jwk_dict["p"])
+            q = base64_to_long(jwk_dict["q"])
+            dp = base64_to_long(jwk_dict["dp"])
+            dq = base64_to_long(jwk_dict["dq"])
+            qi = base64_to_long(jwk_dict["qi"])
+        else:
+            # The precomputed private key parameters are not available,
+            # so we use cryptography's API to fill them in.
+            p, q = rsa.rsa_recover_prime_factors(n, e, d)
+            dp = rsa.rsa_crt_dmp1(d, p)
+            dq = rsa.rsa_crt_dmq1(d, q)
+            qi = rsa.rsa_crt_iqmp(p, q)
 
-            private = rsa.RSAPrivateNumbers(p, q, d, dp, dq, qi, public)
+        private = rsa.RSAPrivateNumbers(p, q, d, dp, dq, qi, public)
 
-            return private.private_key(self.cryptography_backend())
+        return private.private_key(self.cryptography_backend())
 
     def _process_cert(self, key):
-        key = load_pem_x509_certificate(key, self.cryptography_backend())
-        self.prepared_key = key.public_key()
+        public_key = self._certificate_keys.get(key)
+        if public_key is None:
+            public_key = load_pem_x509_certificate(key, self.cryptography_backend()).public_key()
+            self._certificate_keys.set(key, public_key)
+        self.prepared_key = public_key
 
     def sign(self, msg):
         try:
@@ -392,6 +576,8 @@ class CryptographyRSAKey(Key):
 
 
 class CryptographyAESKey(Key):
+    __slots__ = ("_algorithm", "_mode", "_key")
+
     KEY_128 = (ALGORITHMS.A128GCM, ALGORITHMS.A128GCMKW, ALGORITHMS.A128KW, ALGORITHMS.A128CBC)
     KEY_192 = (ALGORITHMS.A192GCM, ALGORITHMS.A192GCMKW, ALGORITHMS.A192KW, ALGORITHMS.A192CBC)
     KEY_256 = (
@@ -448,6 +634,10 @@ class CryptographyAESKey(Key):
 
         self._key = key
 
+    @classmethod
+    def _from_jwk(cls, jwk_dict):
+        return cls(base64url_decode(jwk_dict["k"].encode("ascii")), jwk_dict["alg"])
+
     def to_dict(self):
         data = {"alg": self._algorithm, "kty": "oct", "k": base64url_encode(self._key)}
         return data
@@ -514,73 +704,3 @@ class CryptographyAESKey(Key):
         except InvalidUnwrap as cause:
             raise JWEError(cause)
         return plain_text
-
-
-class CryptographyHMACKey(Key):
-    """
-    Performs signing and verification operations using HMAC
-    and the specified hash function.
-    """
-
-    ALG_MAP = {ALGORITHMS.HS256: hashes.SHA256(), ALGORITHMS.HS384: hashes.SHA384(), ALGORITHMS.HS512: hashes.SHA512()}
-
-    def __init__(self, key, algorithm):
-        if algorithm not in ALGORITHMS.HMAC:
-            raise JWKError("hash_alg: %s is not a valid hash algorithm" % algorithm)
-        self._algorithm = algorithm
-        self._hash_alg = self.ALG_MAP.get(algorithm)
-
-        if isinstance(key, dict):
-            self.prepared_key = self._process_jwk(key)
-            return
-
-        if not isinstance(key, str) and not isinstance(key, bytes):
-            raise JWKError("Expecting a string- or bytes-formatted key.")
-
-        if isinstance(key, str):
-            key = key.encode("utf-8")
-
-        if is_pem_format(key) or is_ssh_key(key):
-            raise JWKError(
-                "The specified key is an asymmetric key or x509 certificate and"
-                " should not be used as an HMAC secret."
-            )
-
-        self.prepared_key = key
-
-    def _process_jwk(self, jwk_dict):
-        if not jwk_dict.get("kty") == "oct":
-            raise JWKError("Incorrect key type. Expected: 'oct', Received: %s" % jwk_dict.get("kty"))
-
-        k = jwk_dict.get("k")
-        k = k.encode("utf-8")
-        k = bytes(k)
-        k = base64url_decode(k)
-
-        return k
-
-    def to_dict(self):
-        return {
-            "alg": self._algorithm,
-            "kty": "oct",
-            "k": base64url_encode(self.prepared_key).decode("ASCII"),
-        }
-
-    def sign(self, msg):
-        msg = ensure_binary(msg)
-        h = hmac.HMAC(self.prepared_key, self._hash_alg, backend=default_backend())
-        h.update(msg)
-        signature = h.finalize()
-        return signature
-
-    def verify(self, msg, sig):
-        msg = ensure_binary(msg)
-        sig = ensure_binary(sig)
-        h = hmac.HMAC(self.prepared_key, self._hash_alg, backend=default_backend())
-        h.update(msg)
-        try:
-            h.verify(sig)
-            verified = True
-        except InvalidSignature:
-            verified = False
-        return verified
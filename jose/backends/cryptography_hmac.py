@@ -0,0 +1,88 @@
+"""HMAC keys on pyca/cryptography.
+
+Kept apart from cryptography_backend so that using HMAC alone does not
+import cryptography's asymmetric and x509 modules. For the same reason no
+backend is passed to cryptography, since looking up its default backend
+imports them too.
+"""
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, hmac
+
+from ..constants import ALGORITHMS
+from ..exceptions import JWKError
+from ..utils import base64url_decode, base64url_encode, ensure_binary, is_pem_format, is_ssh_key
+from .base import Key
+
+
+class CryptographyHMACKey(Key):
+    """
+    Performs signing and verification operations using HMAC
+    and the specified hash function.
+    """
+
+    __slots__ = ("_algorithm", "_hash_alg", "_hmac", "prepared_key")
+
+    ALG_MAP = {ALGORITHMS.HS256: hashes.SHA256(), ALGORITHMS.HS384: hashes.SHA384(), ALGORITHMS.HS512: hashes.SHA512()}
+
+    def __init__(self, key, algorithm):
+        if algorithm not in ALGORITHMS.HMAC:
+            raise JWKError("hash_alg: %s is not a valid hash algorithm" % algorithm)
+        self._algorithm = algorithm
+        self._hash_alg = self.ALG_MAP.get(algorithm)
+
+        if isinstance(key, dict):
+            key = self._process_jwk(key)
+        else:
+            if not isinstance(key, str) and not isinstance(key, bytes):
+                raise JWKError("Expecting a string- or bytes-formatted key.")
+
+            if isinstance(key, str):
+                key = key.encode("utf-8")
+
+            if is_pem_format(key) or is_ssh_key(key):
+                raise JWKError(
+                    "The specified key is an asymmetric key or x509 certificate and"
+                    " should not be used as an HMAC secret."
+                )
+
+        self.prepared_key = key
+        # Never updated or finalized itself, only copied per message.
+        self._hmac = hmac.HMAC(key, self._hash_alg)
+
+    def _process_jwk(self, jwk_dict):
+        if not jwk_dict.get("kty") == "oct":
+            raise JWKError("Incorrect key type. Expected: 'oct', Received: %s" % jwk_dict.get("kty"))
+
+        k = jwk_dict.get("k")
+        k = k.encode("utf-8")
+        k = bytes(k)
+        k = base64url_decode(k)
+
+        return k
+
+    def to_dict(self):
+        return {
+            "alg": self._algorithm,
+            "kty": "oct",
+            "k": base64url_encode(self.prepared_key).decode("ASCII"),
+        }
+
+    def sign(self, msg):
+        msg = ensure_binary(msg)
+        h = self._hmac.copy()
+        h.update(msg)
+        signature = h.finalize()
+        return signature
+
+    def verify(self, msg, sig):
+        msg = ensure_binary(msg)
+        sig = ensure_binary(sig)
+        h = self._hmac.copy()
+        h.update(msg)
+        try:
+            h.verify(sig)
+            verified = True
+        except InvalidSignature:
+            verified = False
+        return verified
@@ -2,7 +2,7 @@ import hashlib
 
 import ecdsa
 
-from jose.backends.base import Key
+from jose.backends.base import Key, PreparedKeyCache
 from jose.constants import ALGORITHMS
 from jose.exceptions import JWKError
 from jose.utils import base64_to_long, long_to_base64
@@ -16,8 +16,15 @@ class ECDSAECKey(Key):
     This class requires the ecdsa package to be installed.
 
     This is based off of the implementation in PyJWT 0.3.2
+
+    Keys parsed from a JWK or PEM are kept in a bounded cache shared by all
+    instances, and verifying keys get a precomputed point table on first
+    use.  Constructing the same key again, as ``jwk.construct`` does for
+    every token, reuses the prepared key and its table.
     """
 
+    __slots__ = ("_algorithm", "curve", "hash_alg", "prepared_key")
+
     SHA256 = hashlib.sha256
     SHA384 = hashlib.sha384
     SHA512 = hashlib.sha512
@@ -33,6 +40,8 @@ class ECDSAECKey(Key):
         (ecdsa.curves.NIST521p, "P-521"),
     )
 
+    _prepared_keys = PreparedKeyCache()
+
     def __init__(self, key, algorithm):
         if algorithm not in ALGORITHMS.EC:
             raise JWKError("hash_alg: %s is not a valid hash algorithm" % algorithm)
@@ -50,28 +59,77 @@ class ECDSAECKey(Key):
             self.prepared_key = key
             return
 
-        if isinstance(key, dict):
-            self.prepared_key = self._process_jwk(key)
-            return
-
         if isinstance(key, str):
             key = key.encode("utf-8")
 
-        if isinstance(key, bytes):
+        if not isinstance(key, (dict, bytes)):
+            raise JWKError("Unable to parse an ECKey from key: %s" % key)
+
+        cache_key = self._cache_key(key)
+        prepared_key = self._prepared_keys.get(cache_key) if cache_key is not None else None
+        if prepared_key is None:
+            prepared_key = self._prepare(key)
+            if cache_key is not None:
+                self._prepared_keys.set(cache_key, prepared_key)
+        self.prepared_key = prepared_key
+
+    def _prepare(self, key):
+        if isinstance(key, dict):
+            prepared_key = self._process_jwk(key)
+        else:
             # Attempt to load key. We don't know if it's
             # a Signing Key or a Verifying Key, so we try
             # the Verifying Key first.
             try:
-                key = ecdsa.VerifyingKey.from_pem(key)
+                prepared_key = ecdsa.VerifyingKey.from_pem(key)
             except ecdsa.der.UnexpectedDER:
-                key = ecdsa.SigningKey.from_pem(key)
+                prepared_key = ecdsa.SigningKey.from_pem(key)
             except Exception as e:
                 raise JWKError(e)
 
-            self.prepared_key = key
-            return
+        # Signing only multiplies the curve generator, which ecdsa already
+        # precomputes.  Verifying also multiplies the public point, so give
+        # that its own table, built lazily on the first verify.
+        if isinstance(prepared_key, ecdsa.VerifyingKey):
+            verifying_key = prepared_key
+        else:
+            verifying_key = prepared_key.get_verifying_key()
+        if hasattr(verifying_key, "precompute"):
+            try:
+                verifying_key = self._precompute(verifying_key)
+            except Exception:
+                # The key works without a table, verifying is just slower.
+                pass
+            else:
+                if isinstance(prepared_key, ecdsa.VerifyingKey):
+                    prepared_key = verifying_key
+        return prepared_key
+
+    @staticmethod
+    def _precompute(verifying_key):
+        point = verifying_key.pubkey.point
+        if not point.order():
+            # Points read from PEM or DER do not know their order, which the
+            # table needs. The JOSE curves have a cofactor of 1, so every
+            # point has the order of the curve.
+            curve = verifying_key.curve
+            point = ecdsa.ellipticcurve.PointJacobi(curve.curve, point.x(), point.y(), 1, curve.order)
+            verifying_key = ecdsa.VerifyingKey.from_public_point(point, curve, verifying_key.default_hashfunc)
+        try:
+            verifying_key.precompute(lazy=True)
+        except TypeError:
+            verifying_key.precompute()
+        return verifying_key
 
-        raise JWKError("Unable to parse an ECKey from key: %s" % key)
+    def _cache_key(self, key):
+        if isinstance(key, dict):
+            try:
+                material = tuple((name, key[name]) for name in ("kty", "crv", "x", "y", "d") if name in key)
+                hash(material)
+            except TypeError:
+                return None
+            return self._algorithm, material
+        return self._algorithm, key
 
     def _process_jwk(self, jwk_dict):
         if not jwk_dict.get("kty") == "EC":
@@ -1,15 +1,78 @@
 import hashlib
 import hmac
+import io
 import os
+import weakref
 
 from jose.backends.base import Key
 from jose.constants import ALGORITHMS
 from jose.exceptions import JWKError
 from jose.utils import base64url_decode, base64url_encode, is_pem_format, is_ssh_key
 
+_random_source = os.urandom
+
 
 def get_random_bytes(num_bytes):
-    return bytes(os.urandom(num_bytes))
+    return bytes(_random_source(num_bytes))
+
+
+def set_random_source(source=None):
+    """
+    Set where get_random_bytes gets its random bytes from.
+
+    Args:
+        source (callable, optional): Called with the number of bytes wanted
+            and returning that many cryptographically secure random bytes,
+            e.g. a BufferedRandom. Defaults to os.urandom.
+    """
+    global _random_source
+    _random_source = source if source is not None else os.urandom
+
+
+class BufferedRandom:
+    """
+    Serves random bytes from a buffer filled by large os.urandom reads.
+
+    Generating IVs and CEKs normally costs one os.urandom system call each;
+    this hands out slices of a single larger read instead. Requests larger
+    than the buffer are passed straight to os.urandom. After a fork the
+    child discards the buffer it inherited, so parent and child never hand
+    out the same bytes.
+
+    Args:
+        buffer_size (int, optional): Number of bytes read from os.urandom
+            at a time.
+    """
+
+    def __init__(self, buffer_size=4096):
+        self.buffer_size = buffer_size
+        self._reset()
+
+        if hasattr(os, "register_at_fork"):
+            ref = weakref.ref(self)
+
+            def reset_in_child():
+                random = ref()
+                if random is not None:
+                    random._reset()
+
+            os.register_at_fork(after_in_child=reset_in_child)
+
+    def _reset(self):
+        self._stream = io.BytesIO()
+
+    def __call__(self, num_bytes):
+        if num_bytes > self.buffer_size:
+            return os.urandom(num_bytes)
+
+        # BytesIO.read consumes bytes atomically, so concurrent callers can
+        # never be handed the same bytes. Bytes left over when the buffer
+        # runs short are discarded rather than reused.
+        random_bytes = self._stream.read(num_bytes)
+        if len(random_bytes) < num_bytes:
+            self._stream = io.BytesIO(os.urandom(self.buffer_size))
+            random_bytes = self._stream.read(num_bytes)
+        return random_bytes
 
 
 class HMACKey(Key):
@@ -18,6 +81,8 @@ class HMACKey(Key):
     and the specified hash function.
     """
 
+    __slots__ = ("_algorithm", "_hash_alg", "_hmac", "prepared_key")
+
     HASHES = {ALGORITHMS.HS256: hashlib.sha256, ALGORITHMS.HS384: hashlib.sha384, ALGORITHMS.HS512: hashlib.sha512}
 
     def __init__(self, key, algorithm):
@@ -27,22 +92,25 @@ class HMACKey(Key):
         self._hash_alg = self.HASHES.get(algorithm)
 
         if isinstance(key, dict):
-            self.prepared_key = self._process_jwk(key)
-            return
-
-        if not isinstance(key, str) and not isinstance(key, bytes):
-            raise JWKError("Expecting a string- or bytes-formatted key.")
+            key = self._process_jwk(key)
+        else:
+            if not isinstance(key, str) and not isinstance(key, bytes):
+                raise JWKError("Expecting a string- or bytes-formatted key.")
 
-        if isinstance(key, str):
-            key = key.encode("utf-8")
+            if isinstance(key, str):
+                key = key.encode("utf-8")
 
-        if is_pem_format(key) or is_ssh_key(key):
-            raise JWKError(
-                "The specified key is an asymmetric key or x509 certificate and"
-                " should not be used as an HMAC secret."
-            )
+            if is_pem_format(key) or is_ssh_key(key):
+                raise JWKError(
+                    "The specified key is an asymmetric key or x509 certificate and"
+                    " should not be used as an HMAC secret."
+                )
 
         self.prepared_key = key
+        # Keyed once, the padded key's inner and outer hash states are then
+        # copied for every message.  The template itself is never updated,
+        # so copies can be taken from any number of threads at once.
+        self._hmac = hmac.new(key, digestmod=self._hash_alg)
 
     def _process_jwk(self, jwk_dict):
         if not jwk_dict.get("kty") == "oct":
@@ -56,7 +124,9 @@ class HMACKey(Key):
         return k
 
     def sign(self, msg):
-        return hmac.new(self.prepared_key, msg, self._hash_alg).digest()
+        h = self._hmac.copy()
+        h.update(msg)
+        return h.digest()
 
     def verify(self, msg, sig):
         return hmac.compare_digest(sig, self.sign(msg))
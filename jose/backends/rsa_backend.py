@@ -1,22 +1,26 @@
 import binascii
+import re
 import warnings
 
 import rsa as pyrsa
 import rsa.pem as pyrsa_pem
-from pyasn1.error import PyAsn1Error
 from rsa import DecryptionError
 
 from jose.backends._asn1 import (
+    rsa_key_der_label,
+    rsa_private_key_from_pkcs1,
     rsa_private_key_pkcs1_to_pkcs8,
     rsa_private_key_pkcs8_to_pkcs1,
+    rsa_private_key_to_pkcs1,
+    rsa_public_key_from_pkcs1,
     rsa_public_key_pkcs1_to_pkcs8,
+    rsa_public_key_pkcs8_to_pkcs1,
+    rsa_public_key_to_pkcs1,
 )
-from jose.backends.base import Key
+from jose.backends.base import Key, PreparedKeyCache
 from jose.constants import ALGORITHMS
 from jose.exceptions import JWEError, JWKError
-from jose.utils import base64_to_long, long_to_base64
-
-ALGORITHMS.SUPPORTED.remove(ALGORITHMS.RSA_OAEP)  # RSA OAEP not supported
+from jose.utils import base64_to_long, calculate_jwk_thumbprint, long_to_base64
 
 LEGACY_INVALID_PKCS8_RSA_HEADER = binascii.unhexlify(
     "30"  # sequence
@@ -117,11 +121,66 @@ def _legacy_private_key_pkcs8_to_pkcs1(pkcs8_key):
     return pkcs8_key[len(LEGACY_INVALID_PKCS8_RSA_HEADER) :]
 
 
+def _private_key_from_pkcs1(pkcs1_key):
+    n, e, d, p, q, exp1, exp2, coef = rsa_private_key_from_pkcs1(pkcs1_key)
+    # python-rsa computes the CRT values again, so encoded values that do not
+    # match the key are rejected rather than silently replaced.
+    if p <= 1 or q <= 1 or n != p * q or exp1 != d % (p - 1) or exp2 != d % (q - 1) or coef * q % p != 1:
+        raise ValueError("Invalid private key encoding")
+    return pyrsa.PrivateKey(n, e, d, p, q)
+
+
+def _private_key_pkcs8_to_pkcs1(pkcs8_key):
+    try:
+        return rsa_private_key_pkcs8_to_pkcs1(pkcs8_key)
+    except ValueError:
+        # If the key was encoded using the old, invalid, encoding then it
+        # cannot be parsed as PKCS8.
+        return _legacy_private_key_pkcs8_to_pkcs1(pkcs8_key)
+
+
+_PEM_LABEL = re.compile(rb"-----BEGIN ([A-Z0-9 ]+)-----")
+
+# How to load the DER of each kind of RSA key, by its PEM label.
+_DER_LOADERS = {
+    "RSA PUBLIC KEY": lambda der: pyrsa.PublicKey(*rsa_public_key_from_pkcs1(der)),
+    "PUBLIC KEY": lambda der: pyrsa.PublicKey(*rsa_public_key_from_pkcs1(rsa_public_key_pkcs8_to_pkcs1(der))),
+    "RSA PRIVATE KEY": _private_key_from_pkcs1,
+    "PRIVATE KEY": lambda der: _private_key_from_pkcs1(_private_key_pkcs8_to_pkcs1(der)),
+}
+
+
+def _load_key(data):
+    """Load a PEM or DER encoded RSA key.
+
+    The PEM label, or for DER the shape of the structure, tells which kind
+    of key it is, so that only the parser for that kind runs.
+
+    Raises:
+        ValueError: If data is not an RSA key in a supported encoding.
+    """
+    match = _PEM_LABEL.search(data)
+    if match is None:
+        label, der = rsa_key_der_label(data), data
+    else:
+        label = match.group(1).decode("ascii")
+        if label not in _DER_LOADERS:
+            raise ValueError("Unsupported RSA key format: %s" % label)
+        der = pyrsa_pem.load_pem(data, label)
+    return _DER_LOADERS[label](der)
+
+
 class RSAKey(Key):
+    __slots__ = ("_algorithm", "_prepared_key", "hash_alg")
+
     SHA256 = "SHA-256"
     SHA384 = "SHA-384"
     SHA512 = "SHA-512"
 
+    # Private keys built from JWKs, keyed by thumbprint and private exponent,
+    # so that recovering p and q from d happens once per key.
+    _private_keys = PreparedKeyCache()
+
     def __init__(self, key, algorithm):
         if algorithm not in ALGORITHMS.RSA:
             raise JWKError("hash_alg: %s is not a valid hash algorithm" % algorithm)
@@ -149,26 +208,9 @@ class RSAKey(Key):
 
         if isinstance(key, bytes):
             try:
-                self._prepared_key = pyrsa.PublicKey.load_pkcs1(key)
-            except ValueError:
-                try:
-                    self._prepared_key = pyrsa.PublicKey.load_pkcs1_openssl_pem(key)
-                except ValueError:
-                    try:
-                        self._prepared_key = pyrsa.PrivateKey.load_pkcs1(key)
-                    except ValueError:
-                        try:
-                            der = pyrsa_pem.load_pem(key, b"PRIVATE KEY")
-                            try:
-                                pkcs1_key = rsa_private_key_pkcs8_to_pkcs1(der)
-                            except PyAsn1Error:
-                                # If the key was encoded using the old, invalid,
-                                # encoding then pyasn1 will throw an error attempting
-                                # to parse the key.
-                                pkcs1_key = _legacy_private_key_pkcs8_to_pkcs1(der)
-                            self._prepared_key = pyrsa.PrivateKey.load_pkcs1(pkcs1_key, format="DER")
-                        except ValueError as e:
-                            raise JWKError(e)
+                self._prepared_key = _load_key(key)
+            except ValueError as e:
+                raise JWKError(e)
             return
         raise JWKError("Unable to parse an RSA_JWK from key: %s" % key)
 
@@ -181,24 +223,35 @@ class RSAKey(Key):
 
         if "d" not in jwk_dict:
             return pyrsa.PublicKey(e=e, n=n)
+
+        try:
+            cache_key = calculate_jwk_thumbprint(jwk_dict), tuple(jwk_dict.get(name) for name in ("d", "p", "q"))
+            private_key = self._private_keys.get(cache_key)
+        except (KeyError, TypeError, ValueError):
+            cache_key = private_key = None
+        if private_key is not None:
+            return private_key
+
+        d = base64_to_long(jwk_dict.get("d"))
+        extra_params = ["p", "q", "dp", "dq", "qi"]
+
+        if any(k in jwk_dict for k in extra_params):
+            # Precomputed private key parameters are available.
+            if not all(k in jwk_dict for k in extra_params):
+                # These values must be present when 'p' is according to
+                # Section 6.3.2 of RFC7518, so if they are not we raise
+                # an error.
+                raise JWKError("Precomputed private key parameters are incomplete.")
+
+            p = base64_to_long(jwk_dict["p"])
+            q = base64_to_long(jwk_dict["q"])
         else:
-            d = base64_to_long(jwk_dict.get("d"))
-            extra_params = ["p", "q", "dp", "dq", "qi"]
-
-            if any(k in jwk_dict for k in extra_params):
-                # Precomputed private key parameters are available.
-                if not all(k in jwk_dict for k in extra_params):
-                    # These values must be present when 'p' is according to
-                    # Section 6.3.2 of RFC7518, so if they are not we raise
-                    # an error.
-                    raise JWKError("Precomputed private key parameters are incomplete.")
-
-                p = base64_to_long(jwk_dict["p"])
-                q = base64_to_long(jwk_dict["q"])
-                return pyrsa.PrivateKey(e=e, n=n, d=d, p=p, q=q)
-            else:
-                p, q = _rsa_recover_prime_factors(n, e, d)
-                return pyrsa.PrivateKey(n=n, e=e, d=d, p=p, q=q)
+            p, q = _rsa_recover_prime_factors(n, e, d)
+
+        private_key = pyrsa.PrivateKey(n=n, e=e, d=d, p=p, q=q)
+        if cache_key is not None:
+            self._private_keys.set(cache_key, private_key)
+        return private_key
 
     def sign(self, msg):
         return pyrsa.sign(msg, self._prepared_key, self.hash_alg)
@@ -221,8 +274,9 @@ class RSAKey(Key):
         return self.__class__(pyrsa.PublicKey(n=self._prepared_key.n, e=self._prepared_key.e), self._algorithm)
 
     def to_pem(self, pem_format="PKCS8"):
-        if isinstance(self._prepared_key, pyrsa.PrivateKey):
-            der = self._prepared_key.save_pkcs1(format="DER")
+        key = self._prepared_key
+        if isinstance(key, pyrsa.PrivateKey):
+            der = rsa_private_key_to_pkcs1(key.n, key.e, key.d, key.p, key.q, key.exp1, key.exp2, key.coef)
             if pem_format == "PKCS8":
                 pkcs8_der = rsa_private_key_pkcs1_to_pkcs8(der)
                 pem = pyrsa_pem.save_pem(pkcs8_der, pem_marker="PRIVATE KEY")
@@ -231,12 +285,11 @@ class RSAKey(Key):
             else:
                 raise ValueError(f"Invalid pem format specified: {pem_format!r}")
         else:
+            der = rsa_public_key_to_pkcs1(key.n, key.e)
             if pem_format == "PKCS8":
-                pkcs1_der = self._prepared_key.save_pkcs1(format="DER")
-                pkcs8_der = rsa_public_key_pkcs1_to_pkcs8(pkcs1_der)
+                pkcs8_der = rsa_public_key_pkcs1_to_pkcs8(der)
                 pem = pyrsa_pem.save_pem(pkcs8_der, pem_marker="PUBLIC KEY")
             elif pem_format == "PKCS1":
-                der = self._prepared_key.save_pkcs1(format="DER")
                 pem = pyrsa_pem.save_pem(der, pem_marker="RSA PUBLIC KEY")
             else:
                 raise ValueError(f"Invalid pem format specified: {pem_format!r}")
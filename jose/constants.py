@@ -13,6 +13,7 @@ class Algorithms:
     ES256 = "ES256"
     ES384 = "ES384"
     ES512 = "ES512"
+    EdDSA = "EdDSA"
 
     # Content Encryption Algorithms
     A128CBC_HS256 = "A128CBC-HS256"
@@ -56,18 +57,31 @@ class Algorithms:
     EC_DS = {ES256, ES384, ES512}
     EC_KW = {ECDH_ES, ECDH_ES_A128KW, ECDH_ES_A192KW, ECDH_ES_A256KW}
     EC = EC_DS.union(EC_KW)
+    OKP = {EdDSA}
     AES_PSEUDO = {A128CBC, A192CBC, A256CBC, A128GCM, A192GCM, A256GCM}
     AES_JWE_ENC = {A128CBC_HS256, A192CBC_HS384, A256CBC_HS512, A128GCM, A192GCM, A256GCM}
     AES_ENC = AES_JWE_ENC.union(AES_PSEUDO)
     AES_KW = {A128KW, A192KW, A256KW}
     AEC_GCM_KW = {A128GCMKW, A192GCMKW, A256GCMKW}
-    AES = AES_ENC.union(AES_KW)
+    AES = AES_ENC.union(AES_KW).union(AEC_GCM_KW)
     PBES2_KW = {PBES2_HS256_A128KW, PBES2_HS384_A192KW, PBES2_HS512_A256KW}
+    # Key management algorithms only apply to JWE and cannot sign.
+    KEY_MANAGEMENT = {DIR}.union(RSA_KW, AES_KW, AEC_GCM_KW, EC_KW, PBES2_KW)
 
     HMAC_AUTH_TAG = {A128CBC_HS256, A192CBC_HS384, A256CBC_HS512}
     GCM = {A128GCM, A192GCM, A256GCM}
 
-    SUPPORTED = HMAC.union(RSA_DS).union(EC_DS).union([DIR]).union(AES_JWE_ENC).union(RSA_KW).union(AES_KW)
+    SUPPORTED = (
+        HMAC.union(RSA_DS)
+        .union(EC_DS)
+        .union(OKP)
+        .union([DIR])
+        .union(AES_JWE_ENC)
+        .union(RSA_KW)
+        .union(AES_KW)
+        .union(AEC_GCM_KW)
+        .union(EC_KW)
+    )
 
     ALL = SUPPORTED.union([NONE]).union(AEC_GCM_KW).union(EC_KW).union(PBES2_KW)
 
@@ -81,6 +95,7 @@ class Algorithms:
         ES256: hashlib.sha256,
         ES384: hashlib.sha384,
         ES512: hashlib.sha512,
+        EdDSA: hashlib.sha512,
     }
 
     KEYS = {}
@@ -98,3 +113,9 @@ class Zips:
 ZIPS = Zips()
 
 JWE_SIZE_LIMIT = 250 * 1024
+
+# PBKDF2 iteration count used when encrypting with PBES2, and the largest
+# count a token may ask the recipient to compute when decrypting. The sender
+# chooses the count, so the limit bounds the work a forged token can cause.
+PBES2_COUNT = 8192
+PBES2_MAX_COUNT = 16384
@@ -1,15 +1,23 @@
 import binascii
+import hashlib
+import hmac
 import json
+import threading
 import zlib
+from collections import OrderedDict
 from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from struct import pack
 
 from . import jwk
 from .backends import get_random_bytes
-from .constants import ALGORITHMS, JWE_SIZE_LIMIT, ZIPS
-from .exceptions import JWEError, JWEParseError
+from .constants import ALGORITHMS, JWE_SIZE_LIMIT, PBES2_COUNT, PBES2_MAX_COUNT, ZIPS
+from .exceptions import JOSEError, JWEError, JWEParseError, JWKError
 from .utils import base64url_decode, base64url_encode, ensure_binary
 
+_URLSAFE_TO_STANDARD = bytes.maketrans(b"-_", b"+/")
+_STANDARD_TO_URLSAFE = bytes.maketrans(b"+/", b"-_")
+
 
 def encrypt(plaintext, key, encryption=ALGORITHMS.A256GCM, algorithm=ALGORITHMS.DIR, zip=None, cty=None, kid=None):
     """Encrypts plaintext and returns a JWE compact serialization string.
@@ -43,27 +51,148 @@ def encrypt(plaintext, key, encryption=ALGORITHMS.A256GCM, algorithm=ALGORITHMS.
 
     """
     plaintext = ensure_binary(plaintext)  # Make sure it's bytes
-    if algorithm not in ALGORITHMS.SUPPORTED:
-        raise JWEError("Algorithm %s not supported." % algorithm)
-    if encryption not in ALGORITHMS.SUPPORTED:
-        raise JWEError("Algorithm %s not supported." % encryption)
-    key = jwk.construct(key, algorithm)
-    encoded_header = _encoded_header(algorithm, encryption, zip, cty, kid)
+    encryptor = Encryptor(key, algorithm, encryption, zip, cty, kid)
+    return encryptor.encrypt(plaintext)
+
+
+class Encryptor:
+    """Encrypts any number of plaintexts to the same recipient.
+
+    Everything :func:`encrypt` does that only depends on the recipient is done
+    once, when the Encryptor is created: the algorithms are validated, the key
+    is constructed and the protected header is serialized and encoded.  For
+    direct encryption the content encryption key is prepared up front as well,
+    so each call to :meth:`encrypt` only has to generate an IV (and a CEK when
+    key wrapping is used), compress, encrypt and serialize.
+
+    Args:
+        key (str or dict): The key(s) to use for encrypting the content. Can be
+            individual JWK or JWK set.
+        algorithm (str, optional): The cryptographic algorithm used
+            to encrypt or determine the value of the CEK.  Defaults to dir.
+        encryption (str, optional): The content encryption algorithm used to
+            perform authenticated encryption on the plaintext to produce the
+            ciphertext and the Authentication Tag.  Defaults to A256GCM.
+        zip (str, optional): The compression algorithm) applied to the
+            plaintext before encryption. Defaults to None.
+        cty (str, optional): The media type for the secured content.
+            See http://www.iana.org/assignments/media-types/media-types.xhtml
+        kid (str, optional): Key ID for the provided key
+        p2c (int, optional): The PBKDF2 iteration count used with the PBES2
+            algorithms, for which the key is the password.  Defaults to
+            PBES2_COUNT.
 
-    plaintext = _compress(zip, plaintext)
-    enc_cek, iv, cipher_text, auth_tag = _encrypt_and_auth(key, algorithm, encryption, zip, plaintext, encoded_header)
+    Raises:
+        JWEError: If the algorithms are not supported or the key cannot be
+            used with them.
 
-    jwe_string = _jwe_compact_serialize(encoded_header, enc_cek, iv, cipher_text, auth_tag)
-    return jwe_string
+    Examples:
+        >>> from jose import jwe
+        >>> encryptor = jwe.Encryptor('asecret128bitkey', algorithm='dir', encryption='A128GCM')
+        >>> encryptor.encrypt('Hello, World!')
+        'eyJhbGciOiJkaXIiLCJlbmMiOiJBMTI4R0NNIn0..McILMB3dYsNJSuhcDzQshA.OfX9H_mcUpHDeRM4IA.CcnTWqaqxNsjT4eCaUABSg'
 
+    """
 
-def decrypt(jwe_str, key):
+    def __init__(
+        self,
+        key,
+        algorithm=ALGORITHMS.DIR,
+        encryption=ALGORITHMS.A256GCM,
+        zip=None,
+        cty=None,
+        kid=None,
+        p2c=PBES2_COUNT,
+    ):
+        if algorithm not in ALGORITHMS.SUPPORTED and algorithm not in ALGORITHMS.PBES2_KW:
+            raise JWEError("Algorithm %s not supported." % algorithm)
+        if encryption not in ALGORITHMS.SUPPORTED:
+            raise JWEError("Algorithm %s not supported." % encryption)
+
+        self.algorithm = algorithm
+        self.encryption = encryption
+        self.zip = zip
+        self.cty = cty
+        self.kid = kid
+        self.p2c = p2c
+        if algorithm in ALGORITHMS.PBES2_KW:
+            self._key = _get_password(key)
+        else:
+            self._key = jwk.construct(key, algorithm)
+        self._codec = _get_codec(zip)
+        self._encoded_header = _encoded_header(algorithm, encryption, zip, cty, kid)
+        self._uncompressed_header = _encoded_header(algorithm, encryption, None, cty, kid)
+
+        # With direct encryption the CEK never changes, so the content
+        # encryption (and MAC) keys can be built once and reused.
+        self._content_keys = None
+        if algorithm == ALGORITHMS.DIR:
+            try:
+                cek_bytes, _ = _get_direct_key_wrap_cek(self._key)
+                self._content_keys = _get_content_keys(cek_bytes, encryption)
+            except NotImplementedError:
+                raise JWEError(f"alg {algorithm} is not implemented")
+
+    def encrypt(self, plaintext):
+        """Encrypts plaintext and returns a JWE compact serialization string.
+
+        Args:
+            plaintext (bytes): A bytes object to encrypt
+
+        Returns:
+            bytes: The string representation of the header, encrypted key,
+                initialization vector, ciphertext, and authentication tag.
+
+        Raises:
+            JWEError: If there is an error encrypting the plaintext.
+        """
+        plaintext = ensure_binary(plaintext)
+        zip = None
+        encoded_header = self._uncompressed_header
+        if self._codec is not None:
+            compressed = self._codec.compress(plaintext)
+            if not (self._codec.skip_incompressible and len(compressed) >= len(plaintext)):
+                zip = self.zip
+                encoded_header = self._encoded_header
+                plaintext = compressed
+
+        if self._content_keys is not None:
+            enc_cek = b""
+            content_keys = self._content_keys
+        else:
+            try:
+                cek_bytes, enc_cek, header_params = _get_cek(self.encryption, self.algorithm, self._key, self.p2c)
+            except NotImplementedError:
+                raise JWEError(f"alg {self.algorithm} is not implemented")
+            if header_params:
+                # Key management produced per message header parameters,
+                # so this header cannot be shared with other messages.
+                encoded_header = _encoded_header(
+                    self.algorithm, self.encryption, zip, self.cty, self.kid, header_params
+                )
+            content_keys = _get_content_keys(cek_bytes, self.encryption)
+
+        iv, cipher_text, auth_tag = _encrypt_content(content_keys, plaintext, encoded_header)
+        return _jwe_compact_serialize(encoded_header, enc_cek, iv, cipher_text, auth_tag)
+
+
+def decrypt(jwe_str, key, max_decompressed_size=None, max_p2c=PBES2_MAX_COUNT, kek_cache=None, algorithms=None):
     """Decrypts a JWE compact serialized string and returns the plaintext.
 
     Args:
         jwe_str (str): A JWE to be decrypt.
         key (str or dict): A key to attempt to decrypt the payload with. Can be
-            individual JWK or JWK set.
+            individual JWK or JWK set, or a ``jwk.KeyResolver`` such as the
+            keys of a tenant from ``jwk.KeyStore.tenant``.
+        max_decompressed_size (int, optional): The largest plaintext a
+            compressed payload may decompress to. Defaults to JWE_SIZE_LIMIT.
+        max_p2c (int, optional): The largest PBES2 iteration count a token
+            may ask for. Defaults to PBES2_MAX_COUNT.
+        kek_cache (PBES2KeyCache, optional): A cache of key encryption keys
+            derived with PBES2.  Defaults to None, no caching.
+        algorithms (str or list, optional): The key management algorithms
+            a token may use.  Defaults to None, any supported algorithm but
+            PBES2, which has to be allowed explicitly.
 
     Returns:
         bytes: The plaintext bytes, assuming the authentication tag is valid.
@@ -76,124 +205,520 @@ def decrypt(jwe_str, key):
         >>> jwe.decrypt(jwe_string, 'asecret128bitkey')
         'Hello, World!'
     """
+    return Decryptor(key, max_decompressed_size, max_p2c, kek_cache, algorithms).decrypt(jwe_str)
 
-    # Limit the token size - if the data is compressed then decompressing the
-    # data could lead to large memory usage. This helps address This addresses
-    # CVE-2024-33664. Also see _decompress()
-    if len(jwe_str) > JWE_SIZE_LIMIT:
-        raise JWEError(f"JWE string {len(jwe_str)} bytes exceeds {JWE_SIZE_LIMIT} bytes")
-
-    header, encoded_header, encrypted_key, iv, cipher_text, auth_tag = _jwe_compact_deserialize(jwe_str)
 
-    # Verify that the implementation understands and can process all
-    # fields that it is required to support, whether required by this
-    # specification, by the algorithms being used, or by the "crit"
-    # Header Parameter value, and that the values of those parameters
-    # are also understood and supported.
+class Decryptor:
+    """Decrypts any number of JWEs addressed to the same recipient key.
 
-    try:
-        # Determine the Key Management Mode employed by the algorithm
-        # specified by the "alg" (algorithm) Header Parameter.
-        alg = header["alg"]
-        enc = header["enc"]
-        if alg not in ALGORITHMS.SUPPORTED:
-            raise JWEError("Algorithm %s not supported." % alg)
-        if enc not in ALGORITHMS.SUPPORTED:
-            raise JWEError("Algorithm %s not supported." % enc)
+    The key is only constructed once per key management algorithm.  For
+    direct encryption the raw CEK is resolved once and the content
+    encryption (and MAC) keys are built once per content encryption
+    algorithm, so decrypting a ``dir`` token is reduced to a single AEAD
+    operation.  Protected headers that have been decoded and validated
+    before are remembered, so tokens sharing a header are only parsed once.
 
-    except KeyError:
-        raise JWEParseError("alg and enc headers are required!")
+    Args:
+        key (str or dict): A key to attempt to decrypt payloads with. Can be
+            individual JWK or JWK set, or a ``jwk.KeyResolver`` such as the
+            keys of a tenant from ``jwk.KeyStore.tenant``.
+        max_decompressed_size (int, optional): The largest plaintext a
+            compressed payload may decompress to. Defaults to JWE_SIZE_LIMIT.
+        max_p2c (int, optional): The largest PBES2 iteration count a token
+            may ask for. Defaults to PBES2_MAX_COUNT.
+        kek_cache (PBES2KeyCache, optional): A cache of key encryption keys
+            derived with PBES2, which can be shared between Decryptors.
+            Defaults to None, no caching.
+        algorithms (str or list, optional): The key management algorithms
+            a token may use.  Defaults to None, any supported algorithm but
+            PBES2, which has to be allowed explicitly.
 
-    # Verify that the JWE uses a key known to the recipient.
-    key = jwk.construct(key, alg)
+    Examples:
+        >>> from jose import jwe
+        >>> decryptor = jwe.Decryptor('asecret128bitkey')
+        >>> decryptor.decrypt(jwe_string)
+        'Hello, World!'
+    """
 
-    # When Direct Key Agreement or Key Agreement with Key Wrapping are
-    # employed, use the key agreement algorithm to compute the value
-    # of the agreed upon key.  When Direct Key Agreement is employed,
-    # let the CEK be the agreed upon key.  When Key Agreement with Key
-    # Wrapping is employed, the agreed upon key will be used to
-    # decrypt the JWE Encrypted Key.
-    #
-    # When Key Wrapping, Key Encryption, or Key Agreement with Key
-    # Wrapping are employed, decrypt the JWE Encrypted Key to produce
-    # the CEK.  The CEK MUST have a length equal to that required for
-    # the content encryption algorithm.  Note that when there are
-    # multiple recipients, each recipient will only be able to decrypt
-    # JWE Encrypted Key values that were encrypted to a key in that
-    # recipient's possession.  It is therefore normal to only be able
-    # to decrypt one of the per-recipient JWE Encrypted Key values to
-    # obtain the CEK value.  Also, see Section 11.5 for security
-    # considerations on mitigating timing attacks.
-    if alg == ALGORITHMS.DIR:
-        # When Direct Key Agreement or Direct Encryption are employed,
-        # verify that the JWE Encrypted Key value is an empty octet
-        # sequence.
+    # Bound on the number of distinct protected headers remembered.
+    HEADER_CACHE_SIZE = 64
+
+    def __init__(self, key, max_decompressed_size=None, max_p2c=PBES2_MAX_COUNT, kek_cache=None, algorithms=None):
+        self._key_data = key
+        self.max_decompressed_size = max_decompressed_size
+        self.max_p2c = max_p2c
+        self.kek_cache = kek_cache
+        if isinstance(algorithms, str):
+            algorithms = [algorithms]
+        self.algorithms = None if algorithms is None else frozenset(algorithms)
+        self._keys = {}
+        self._headers = {}
+        self._headers_lock = threading.Lock()
+        self._direct_cek = None
+        self._direct_content_keys = {}
+
+    def decrypt(self, jwe_str):
+        """Decrypts a JWE compact serialized string and returns the plaintext.
+
+        Args:
+            jwe_str (str): A JWE to be decrypt.
+
+        Returns:
+            bytes: The plaintext bytes, assuming the authentication tag is valid.
+
+        Raises:
+            JWEError: If there is an exception verifying the token.
+        """
+
+        # Limit the token size - if the data is compressed then decompressing the
+        # data could lead to large memory usage. This helps address This addresses
+        # CVE-2024-33664. Also see _decompress()
+        if len(jwe_str) > JWE_SIZE_LIMIT:
+            raise JWEError(f"JWE string {len(jwe_str)} bytes exceeds {JWE_SIZE_LIMIT} bytes")
+
+        header, encoded_header, encrypted_key, iv, cipher_text, auth_tag = _jwe_compact_deserialize(
+            jwe_str, self._headers
+        )
 
-        # Record whether the CEK could be successfully determined for this
-        # recipient or not.
-        cek_valid = encrypted_key == b""
+        # Verify that the implementation understands and can process all
+        # fields that it is required to support, whether required by this
+        # specification, by the algorithms being used, or by the "crit"
+        # Header Parameter value, and that the values of those parameters
+        # are also understood and supported.
 
-        # When Direct Encryption is employed, let the CEK be the shared
-        # symmetric key.
-        cek_bytes = _get_key_bytes_from_key(key)
-    else:
         try:
-            cek_bytes = key.unwrap_key(encrypted_key)
+            # Determine the Key Management Mode employed by the algorithm
+            # specified by the "alg" (algorithm) Header Parameter.
+            alg = header["alg"]
+            enc = header["enc"]
+            if alg not in ALGORITHMS.SUPPORTED and alg not in ALGORITHMS.PBES2_KW:
+                raise JWEError("Algorithm %s not supported." % alg)
+            if enc not in ALGORITHMS.SUPPORTED:
+                raise JWEError("Algorithm %s not supported." % enc)
+
+        except KeyError:
+            raise JWEParseError("alg and enc headers are required!")
+
+        # With PBES2 the token sets the work the recipient does, so it is
+        # only accepted when the caller allows it.
+        if self.algorithms is None:
+            allowed = alg not in ALGORITHMS.PBES2_KW
+        else:
+            allowed = alg in self.algorithms
+        if not allowed:
+            raise JWEError("The specified alg value is not allowed")
+
+        self._remember_header(encoded_header, header)
+
+        # Verify that the JWE uses a key known to the recipient.
+        key = self._get_key(alg, header)
+
+        # When Direct Key Agreement or Key Agreement with Key Wrapping are
+        # employed, use the key agreement algorithm to compute the value
+        # of the agreed upon key.  When Direct Key Agreement is employed,
+        # let the CEK be the agreed upon key.  When Key Agreement with Key
+        # Wrapping is employed, the agreed upon key will be used to
+        # decrypt the JWE Encrypted Key.
+        #
+        # When Key Wrapping, Key Encryption, or Key Agreement with Key
+        # Wrapping are employed, decrypt the JWE Encrypted Key to produce
+        # the CEK.  The CEK MUST have a length equal to that required for
+        # the content encryption algorithm.  Note that when there are
+        # multiple recipients, each recipient will only be able to decrypt
+        # JWE Encrypted Key values that were encrypted to a key in that
+        # recipient's possession.  It is therefore normal to only be able
+        # to decrypt one of the per-recipient JWE Encrypted Key values to
+        # obtain the CEK value.  Also, see Section 11.5 for security
+        # considerations on mitigating timing attacks.
+        if alg in ALGORITHMS.EC_KW:
+            try:
+                agreed_key = _get_agreed_key(key, header, alg, enc)
+            except NotImplementedError:
+                raise JWEError(f"alg {alg} is not implemented")
+            except JWEError:
+                raise
+            except Exception as e:
+                raise JWEError(e)
+        elif alg in ALGORITHMS.PBES2_KW:
+            key = _get_pbes2_key(key, header, alg, self.max_p2c, self.kek_cache)
+
+        if alg in (ALGORITHMS.DIR, ALGORITHMS.ECDH_ES):
+            # When Direct Key Agreement or Direct Encryption are employed,
+            # verify that the JWE Encrypted Key value is an empty octet
+            # sequence.
 
             # Record whether the CEK could be successfully determined for this
             # recipient or not.
-            cek_valid = True
+            cek_valid = encrypted_key == b""
+
+            # When Direct Encryption is employed, let the CEK be the shared
+            # symmetric key. It is resolved and split into content keys
+            # only once per enc, see _get_direct_content_keys(). When
+            # Direct Key Agreement is employed, the CEK is the agreed key.
+            cek_bytes = agreed_key if alg == ALGORITHMS.ECDH_ES else None
+        else:
+            if alg in ALGORITHMS.EC_KW:
+                key = agreed_key
+
+            try:
+                if alg in ALGORITHMS.AEC_GCM_KW:
+                    cek_bytes = _gcm_key_unwrap(key, header, encrypted_key)
+                else:
+                    cek_bytes = key.unwrap_key(encrypted_key)
+
+                # Record whether the CEK could be successfully determined for this
+                # recipient or not.
+                cek_valid = True
+            except NotImplementedError:
+                raise JWEError(f"alg {alg} is not implemented")
+            except Exception:
+                # Record whether the CEK could be successfully determined for this
+                # recipient or not.
+                cek_valid = False
+
+                # To mitigate the attacks described in RFC 3218 [RFC3218], the
+                # recipient MUST NOT distinguish between format, padding, and length
+                # errors of encrypted keys.  It is strongly recommended, in the event
+                # of receiving an improperly formatted key, that the recipient
+                # substitute a randomly generated CEK and proceed to the next step, to
+                # mitigate timing attacks.
+                cek_bytes = _get_random_cek_bytes_for_enc(enc)
+
+        # Compute the Encoded Protected Header value BASE64URL(UTF8(JWE
+        # Protected Header)).  If the JWE Protected Header is not present
+        # (which can only happen when using the JWE JSON Serialization and
+        # no "protected" member is present), let this value be the empty
+        # string.
+        protected_header = encoded_header
+
+        # Let the Additional Authenticated Data encryption parameter be
+        # ASCII(Encoded Protected Header).  However, if a JWE AAD value is
+        # present (which can only be the case when using the JWE JSON
+        # Serialization), instead let the Additional Authenticated Data
+        # encryption parameter be ASCII(Encoded Protected Header || '.' ||
+        # BASE64URL(JWE AAD)).
+        aad = protected_header
+
+        # Decrypt the JWE Ciphertext using the CEK, the JWE Initialization
+        # Vector, the Additional Authenticated Data value, and the JWE
+        # Authentication Tag (which is the Authentication Tag input to the
+        # calculation) using the specified content encryption algorithm,
+        # returning the decrypted plaintext and validating the JWE
+        # Authentication Tag in the manner specified for the algorithm,
+        # rejecting the input without emitting any decrypted output if the
+        # JWE Authentication Tag is incorrect.
+        try:
+            if cek_bytes is None:
+                content_keys = self._get_direct_content_keys(key, enc)
+            else:
+                content_keys = _get_content_keys(cek_bytes, enc)
+            plain_text = _decrypt_content(content_keys, cipher_text, iv, aad, auth_tag)
         except NotImplementedError:
-            raise JWEError(f"alg {alg} is not implemented")
-        except Exception:
-            # Record whether the CEK could be successfully determined for this
-            # recipient or not.
-            cek_valid = False
-
-            # To mitigate the attacks described in RFC 3218 [RFC3218], the
-            # recipient MUST NOT distinguish between format, padding, and length
-            # errors of encrypted keys.  It is strongly recommended, in the event
-            # of receiving an improperly formatted key, that the recipient
-            # substitute a randomly generated CEK and proceed to the next step, to
-            # mitigate timing attacks.
-            cek_bytes = _get_random_cek_bytes_for_enc(enc)
-
-    # Compute the Encoded Protected Header value BASE64URL(UTF8(JWE
-    # Protected Header)).  If the JWE Protected Header is not present
-    # (which can only happen when using the JWE JSON Serialization and
-    # no "protected" member is present), let this value be the empty
-    # string.
-    protected_header = encoded_header
-
-    # Let the Additional Authenticated Data encryption parameter be
-    # ASCII(Encoded Protected Header).  However, if a JWE AAD value is
-    # present (which can only be the case when using the JWE JSON
-    # Serialization), instead let the Additional Authenticated Data
-    # encryption parameter be ASCII(Encoded Protected Header || '.' ||
-    # BASE64URL(JWE AAD)).
-    aad = protected_header
-
-    # Decrypt the JWE Ciphertext using the CEK, the JWE Initialization
-    # Vector, the Additional Authenticated Data value, and the JWE
-    # Authentication Tag (which is the Authentication Tag input to the
-    # calculation) using the specified content encryption algorithm,
-    # returning the decrypted plaintext and validating the JWE
-    # Authentication Tag in the manner specified for the algorithm,
-    # rejecting the input without emitting any decrypted output if the
-    # JWE Authentication Tag is incorrect.
-    try:
-        plain_text = _decrypt_and_auth(cek_bytes, enc, cipher_text, iv, aad, auth_tag)
-    except NotImplementedError:
-        raise JWEError(f"enc {enc} is not implemented")
-    except Exception as e:
-        raise JWEError(e)
+            raise JWEError(f"enc {enc} is not implemented")
+        except Exception as e:
+            raise JWEError(e)
+
+        # If a "zip" parameter was included, uncompress the decrypted
+        # plaintext using the specified compression algorithm.
+        if plain_text is not None:
+            plain_text = _decompress(header.get("zip"), plain_text, self.max_decompressed_size)
+
+        return plain_text if cek_valid else None
+
+    def _get_key(self, alg, header):
+        if isinstance(self._key_data, jwk.KeyResolver):
+            try:
+                keys = self._key_data.keys_for(header)
+            except JWKError as e:
+                raise JWEError(e)
+            if len(keys) != 1:
+                raise JWEError("No key matches the header of the JWE")
+            # The token must not choose how a key is used, e.g. a signing
+            # key for key agreement, or a key as a PBES2 password.
+            if keys[0].to_dict().get("alg") != alg:
+                raise JWEError("The key of the JWE cannot be used with alg %s" % alg)
+            return keys[0]
+
+        key = self._keys.get(alg)
+        if key is None:
+            if alg in ALGORITHMS.PBES2_KW:
+                key = _get_password(self._key_data)
+            else:
+                key = jwk.construct(self._key_data, alg)
+            self._keys[alg] = key
+        return key
+
+    def _get_direct_content_keys(self, key, enc):
+        if isinstance(self._key_data, jwk.KeyResolver):
+            # The key differs per token.
+            return _get_content_keys(_get_key_bytes_from_key(key), enc)
+        content_keys = self._direct_content_keys.get(enc)
+        if content_keys is None:
+            if self._direct_cek is None:
+                self._direct_cek = _get_key_bytes_from_key(key)
+            content_keys = self._direct_content_keys[enc] = _get_content_keys(self._direct_cek, enc)
+        return content_keys
+
+    def _remember_header(self, encoded_header, header):
+        if encoded_header in self._headers:
+            return
+        with self._headers_lock:
+            if len(self._headers) >= self.HEADER_CACHE_SIZE:
+                del self._headers[next(iter(self._headers))]
+            self._headers[encoded_header] = header
+
+
+def decrypt_many(
+    tokens,
+    key,
+    max_workers=None,
+    max_decompressed_size=None,
+    max_p2c=PBES2_MAX_COUNT,
+    kek_cache=None,
+    algorithms=None,
+):
+    """Decrypts a batch of JWE compact serialized strings.
+
+    Tokens are grouped by their ``alg``, ``enc`` and ``kid`` headers, and
+    every group is decrypted with one shared :class:`Decryptor`, so keys are
+    constructed and headers are validated once per group rather than once
+    per token.  A failing token does not stop the batch, its error takes its
+    place in the results.
+
+    Args:
+        tokens (iterable): The JWEs to decrypt.
+        key (str or dict): A key to attempt to decrypt the payloads with, a
+            dict mapping ``kid`` header values to such keys, or a JWK set in
+            which each token's key is found by its ``kid``.
+        max_workers (int, optional): When given, keys are unwrapped and
+            content is decrypted on a pool of this many threads.  Defaults to
+            None, decrypting in the calling thread.
+        max_decompressed_size (int, optional): The largest plaintext a
+            compressed payload may decompress to. Defaults to JWE_SIZE_LIMIT.
+        max_p2c (int, optional): The largest PBES2 iteration count a token
+            may ask for. Defaults to PBES2_MAX_COUNT.
+        kek_cache (PBES2KeyCache, optional): A cache of key encryption keys
+            derived with PBES2.  Defaults to None, no caching.
+        algorithms (str or list, optional): The key management algorithms
+            a token may use.  Defaults to None, any supported algorithm but
+            PBES2, which has to be allowed explicitly.
+
+    Returns:
+        list: For each token, in order, either its plaintext bytes or the
+            JOSEError raised while decrypting it.  Other errors are wrapped
+            in a JWEError.
+
+    Raises:
+        JWEError: If a JWK set is given whose keys do not all have a kid.
+        ValueError: If max_workers is not greater than 0.
+
+    Examples:
+        >>> from jose import jwe
+        >>> jwe.decrypt_many([jwe_string, 'not a jwe'], 'asecret128bitkey')
+        [b'Hello, World!', JWEParseError('Not enough segments')]
+    """
+    if max_workers is not None and max_workers <= 0:
+        raise ValueError("max_workers must be greater than 0")
+    tokens = list(tokens)
+    results = [None] * len(tokens)
+    if isinstance(key, Mapping) and "keys" in key:
+        try:
+            key = {jwk_dict["kid"]: jwk_dict for jwk_dict in key["keys"]}
+        except (KeyError, TypeError):
+            raise JWEError("Every key of a JWK set must have a kid")
+        keys_by_kid = True
+    else:
+        keys_by_kid = isinstance(key, Mapping) and "kty" not in key
+    decryptors = {}
+    headers = {}
+    groups = {}
+
+    for index, token in enumerate(tokens):
+        try:
+            header = _peek_header(token, headers)
+            group = tuple(header.get(name) for name in ("alg", "enc", "kid"))
+            if not all(value is None or isinstance(value, str) for value in group):
+                raise JWEParseError("alg, enc and kid headers must be strings")
+            kid = group[2] if keys_by_kid else None
+            decryptor = decryptors.get(kid)
+            if decryptor is None:
+                if keys_by_kid and kid not in key:
+                    raise JWEError(f"No key found for kid {kid}")
+                recipient_key = key[kid] if keys_by_kid else key
+                decryptor = decryptors[kid] = Decryptor(
+                    recipient_key, max_decompressed_size, max_p2c, kek_cache, algorithms
+                )
+        except Exception as e:
+            results[index] = _as_jose_error(e)
+            continue
+        groups.setdefault(group, []).append((index, decryptor))
+
+    def decrypt_group(items):
+        for index, decryptor in items:
+            try:
+                results[index] = decryptor.decrypt(tokens[index])
+            except Exception as e:
+                results[index] = _as_jose_error(e)
+
+    if max_workers is None:
+        for items in groups.values():
+            decrypt_group(items)
+    else:
+        # Split the groups into chunks so that a large group is spread over
+        # the pool, while every chunk still shares its group's Decryptor.
+        chunk_size = max(1, len(tokens) // (max_workers * 4))
+        chunks = [items[i : i + chunk_size] for items in groups.values() for i in range(0, len(items), chunk_size)]
+        with ThreadPoolExecutor(max_workers) as executor:
+            list(executor.map(decrypt_group, chunks))
+
+    return results
+
+
+def _as_jose_error(error):
+    # A malformed token can make parsing or decompressing raise something
+    # else than a JOSEError, which must not abort the rest of a batch.
+    if isinstance(error, JOSEError):
+        return error
+    jwe_error = JWEError(error)
+    jwe_error.__cause__ = error
+    return jwe_error
+
+
+def _peek_header(jwe_str, headers):
+    """
+    Decode the protected header of a JWE without decoding its other segments
+
+    Args:
+        jwe_str (str): A compact serialized JWE
+        headers (dict): Already decoded headers keyed by their encoded header
+            segment, updated with this header
+
+    Returns:
+        dict: The JWE protected header
+
+    Raises:
+        JWEParseError: If the header cannot be decoded.
+    """
+    jwe_bytes = ensure_binary(jwe_str)
+    end = jwe_bytes.find(b".")
+    if end < 0:
+        raise JWEParseError("Not enough segments")
+    encoded_header = jwe_bytes[:end]
+    header = headers.get(encoded_header)
+    if header is None:
+        try:
+            header = json.loads(base64url_decode(encoded_header))
+        except (TypeError, ValueError, binascii.Error):
+            raise JWEParseError("Invalid header")
+        if not isinstance(header, Mapping):
+            raise JWEParseError("Invalid header string: must be a json object")
+        headers[encoded_header] = header
+    return header
+
+
+class Codec:
+    """
+    A simple interface for implementing JWE compression algorithms.
+
+    Codecs are registered for a ``zip`` header value with :func:`register_zip`.
+    """
+
+    #: Send the plaintext uncompressed (and without a ``zip`` header) when
+    #: compressing it does not make it any smaller.
+    skip_incompressible = False
 
-    # If a "zip" parameter was included, uncompress the decrypted
-    # plaintext using the specified compression algorithm.
-    if plain_text is not None:
-        plain_text = _decompress(header.get("zip"), plain_text)
+    def compress(self, data):
+        """
+        Compress the data
 
-    return plain_text if cek_valid else None
+        Args:
+            data (bytes): Data to compress
+
+        Returns:
+            bytes: Compressed data
+        """
+        raise NotImplementedError()
+
+    def decompress(self, data, max_length):
+        """
+        Decompress the data, refusing to produce more than max_length bytes
+
+        Args:
+            data (bytes): Data to decompress
+            max_length (int): Maximum size of the decompressed data
+
+        Returns:
+            bytes: Decompressed data
+
+        Raises:
+            JWEError: If the decompressed data would exceed max_length.
+        """
+        raise NotImplementedError()
+
+
+class DeflateCodec(Codec):
+    """
+    DEFLATE compression for ``zip=DEF`` using zlib.
+
+    Args:
+        level (int, optional): zlib compression level from 0 to 9, or -1 for
+            zlib's default.
+        skip_incompressible (bool, optional): Send the plaintext uncompressed
+            when compressing it does not make it smaller.
+        chunk_size (int, optional): Number of bytes decompressed at a time.
+    """
+
+    def __init__(self, level=-1, skip_incompressible=False, chunk_size=16 * 1024):
+        self.level = level
+        self.skip_incompressible = skip_incompressible
+        self.chunk_size = chunk_size
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data, max_length):
+        # Decompress chunk by chunk and stop as soon as the output grows past
+        # max_length, so a small token can never be inflated into a large
+        # amount of memory. This addresses CVE-2024-33664
+        decompressor = zlib.decompressobj()
+        chunks = []
+        size = 0
+        while data:
+            chunk = decompressor.decompress(data, self.chunk_size)
+            size += len(chunk)
+            if size > max_length:
+                raise JWEError(f"Decompressed JWE string exceeds {max_length} bytes")
+            chunks.append(chunk)
+            data = decompressor.unconsumed_tail
+        chunk = decompressor.flush()
+        if size + len(chunk) > max_length:
+            raise JWEError(f"Decompressed JWE string exceeds {max_length} bytes")
+        chunks.append(chunk)
+        return b"".join(chunks)
+
+
+_CODECS = {ZIPS.DEF: DeflateCodec()}
+
+
+def register_zip(zip, codec):
+    """Registers a codec for a compression algorithm.
+
+    This can be used to change the settings of a built in algorithm, e.g.
+    ``register_zip(ZIPS.DEF, DeflateCodec(level=9))``, or to add a private
+    algorithm understood by both parties.
+
+    Args:
+        zip (str): The ``zip`` header value the codec handles.
+        codec (Codec): The codec to use.
+
+    Returns:
+        bool: True when the codec was registered.
+    """
+    if not isinstance(codec, Codec):
+        raise TypeError("Codec is not an instance of jwe.Codec")
+    _CODECS[zip] = codec
+    ZIPS.SUPPORTED.add(zip)
+    return True
 
 
 def get_unverified_header(jwe_str):
@@ -212,42 +737,68 @@ def get_unverified_header(jwe_str):
     return header
 
 
-def _decrypt_and_auth(cek_bytes, enc, cipher_text, iv, aad, auth_tag):
+def _get_content_keys(cek_bytes, enc):
     """
-    Decrypt and verify the data
+    Build the keys used to encrypt and authenticate content from the cek
 
     Args:
-        cek_bytes (bytes): cek to derive encryption and possible auth key to
-            verify the auth tag
-        cipher_text (bytes): Encrypted data
-        iv (bytes): Initialization vector (iv) used to encrypt data
-        aad (bytes): Additional Authenticated Data used to verify the data
-        auth_tag (bytes): Authentication ntag to verify the data
+        cek_bytes (bytes): The content encryption key
+        enc (str): Encryption algorithm
 
     Returns:
-        (bytes): Decrypted data
+        (Key, hmac.HMAC, int): The encryption key, and for the CBC-HS
+            algorithms the keyed HMAC and auth tag length (None otherwise)
     """
-    # Decrypt the JWE Ciphertext using the CEK, the JWE Initialization
-    # Vector, the Additional Authenticated Data value, and the JWE
-    # Authentication Tag (which is the Authentication Tag input to the
-    # calculation) using the specified content encryption algorithm,
-    # returning the decrypted plaintext
-    # and validating the JWE
-    # Authentication Tag in the manner specified for the algorithm,
     if enc in ALGORITHMS.HMAC_AUTH_TAG:
-        encryption_key, mac_key, key_len = _get_encryption_key_mac_key_and_key_length_from_cek(cek_bytes, enc)
-        auth_tag_check = _auth_tag(cipher_text, iv, aad, mac_key, key_len)
+        return _get_encryption_key_mac_key_and_key_length_from_cek(cek_bytes, enc)
     elif enc in ALGORITHMS.GCM:
-        encryption_key = jwk.construct(cek_bytes, enc)
-        auth_tag_check = auth_tag  # GCM check auth on decrypt
+        return jwk.construct(cek_bytes, enc), None, None
     else:
         raise NotImplementedError(f"enc {enc} is not implemented!")
 
-    plaintext = encryption_key.decrypt(cipher_text, iv, aad, auth_tag)
-    if auth_tag != auth_tag_check:
-        raise JWEError("Invalid JWE Auth Tag")
 
-    return plaintext
+def _encrypt_content(content_keys, plaintext, aad):
+    """
+    Encrypt and authenticate the data with keys from _get_content_keys
+
+    Args:
+        content_keys (tuple): Keys returned by _get_content_keys
+        plaintext (bytes): The data to encrypt
+        aad (bytes): Additional Authenticated Data
+
+    Returns:
+        (bytes, bytes, bytes): IV, cipher text, and auth tag
+    """
+    encryption_key, mac_key, key_len = content_keys
+    iv, cipher_text, auth_tag = encryption_key.encrypt(plaintext, aad)
+    if mac_key is not None:
+        auth_tag = _auth_tag(cipher_text, iv, aad, mac_key, key_len)
+    return iv, cipher_text, auth_tag
+
+
+def _decrypt_content(content_keys, cipher_text, iv, aad, auth_tag):
+    """
+    Verify and decrypt the data with keys from _get_content_keys
+
+    Args:
+        content_keys (tuple): Keys returned by _get_content_keys
+        cipher_text (bytes): Encrypted data
+        iv (bytes): Initialization vector (iv) used to encrypt data
+        aad (bytes): Additional Authenticated Data used to verify the data
+        auth_tag (bytes): Authentication tag to verify the data
+
+    Returns:
+        (bytes): Decrypted data
+    """
+    encryption_key, mac_key, key_len = content_keys
+    if mac_key is not None:
+        # Validate the auth tag before touching the cipher text so forged
+        # tokens are rejected without running the block cipher at all.
+        auth_tag_check = _auth_tag(cipher_text, iv, aad, mac_key, key_len)
+        if not hmac.compare_digest(auth_tag, auth_tag_check):
+            raise JWEError("Invalid JWE Auth Tag")
+
+    return encryption_key.decrypt(cipher_text, iv, aad, auth_tag)
 
 
 def _get_encryption_key_mac_key_and_key_length_from_cek(cek_bytes, enc):
@@ -260,12 +811,14 @@ def _get_encryption_key_mac_key_and_key_length_from_cek(cek_bytes, enc):
     return encryption_key, mac_key, derived_key_len
 
 
-def _jwe_compact_deserialize(jwe_bytes):
+def _jwe_compact_deserialize(jwe_bytes, headers=None):
     """
     Deserialize and verify the header and segments are appropriate.
 
     Args:
         jwe_bytes (bytes): The compact serialized JWE
+        headers (dict, optional): Already decoded headers keyed by their
+            encoded header segment, used instead of decoding them again
     Returns:
         (dict, bytes, bytes, bytes, bytes, bytes)
     """
@@ -275,16 +828,30 @@ def _jwe_compact_deserialize(jwe_bytes):
     # Vector, the JWE Ciphertext, the JWE Authentication Tag, and the
     # JWE AAD, following the restriction that no line breaks,
     # whitespace, or other additional characters have been used.
+    #
+    # The whole token is translated to the standard base64 alphabet once
+    # and every segment is decoded straight from a view into it, rather
+    # than splitting the token into new objects first.
     jwe_bytes = ensure_binary(jwe_bytes)
     try:
-        header_segment, encrypted_key_segment, iv_segment, cipher_text_segment, auth_tag_segment = jwe_bytes.split(
-            b".", 4
-        )
-        header_data = base64url_decode(header_segment)
+        bounds = []
+        start = 0
+        for _ in range(4):
+            end = jwe_bytes.index(b".", start)
+            bounds.append((start, end))
+            start = end + 1
+        bounds.append((start, len(jwe_bytes)))
     except ValueError:
         raise JWEParseError("Not enough segments")
-    except (TypeError, binascii.Error):
-        raise JWEParseError("Invalid header")
+
+    header_segment = jwe_bytes[: bounds[0][1]]
+    segments = memoryview(jwe_bytes.translate(_URLSAFE_TO_STANDARD))
+    header = headers.get(header_segment) if headers else None
+    if header is None:
+        try:
+            header_data = _b64decode_segment(segments, *bounds[0])
+        except (TypeError, binascii.Error):
+            raise JWEParseError("Invalid header")
 
     # Verify that the octet sequence resulting from decoding the
     # encoded JWE Protected Header is a UTF-8-encoded representation
@@ -302,39 +869,75 @@ def _jwe_compact_deserialize(jwe_bytes):
     # Serialization, this restriction includes that the same Header
     # Parameter name also MUST NOT occur in distinct JSON object
     # values that together comprise the JOSE Header.
+    if header is None:
+        try:
+            header = json.loads(header_data)
+        except ValueError as e:
+            raise JWEParseError(f"Invalid header string: {e}")
 
-    try:
-        header = json.loads(header_data)
-    except ValueError as e:
-        raise JWEParseError(f"Invalid header string: {e}")
-
-    if not isinstance(header, Mapping):
-        raise JWEParseError("Invalid header string: must be a json object")
+        if not isinstance(header, Mapping):
+            raise JWEParseError("Invalid header string: must be a json object")
 
     try:
-        encrypted_key = base64url_decode(encrypted_key_segment)
+        encrypted_key = _b64decode_segment(segments, *bounds[1])
     except (TypeError, binascii.Error):
         raise JWEParseError("Invalid encrypted key")
 
     try:
-        iv = base64url_decode(iv_segment)
+        iv = _b64decode_segment(segments, *bounds[2])
     except (TypeError, binascii.Error):
         raise JWEParseError("Invalid IV")
 
     try:
-        ciphertext = base64url_decode(cipher_text_segment)
+        ciphertext = _b64decode_segment(segments, *bounds[3])
     except (TypeError, binascii.Error):
         raise JWEParseError("Invalid cyphertext")
 
     try:
-        auth_tag = base64url_decode(auth_tag_segment)
+        auth_tag = _b64decode_segment(segments, *bounds[4])
     except (TypeError, binascii.Error):
         raise JWEParseError("Invalid auth tag")
 
     return header, header_segment, encrypted_key, iv, ciphertext, auth_tag
 
 
-def _encoded_header(alg, enc, zip, cty, kid):
+def _b64decode_segment(segments, start, end):
+    """
+    Decode one unpadded segment of a token already translated to the
+    standard base64 alphabet
+
+    Args:
+        segments (memoryview): The translated token
+        start (int): Offset of the first character of the segment
+        end (int): Offset just past the last character of the segment
+
+    Returns:
+        bytes: The decoded segment
+    """
+    # Whole four character groups decode straight from the view, only the
+    # final partial group is copied to be padded.
+    full = end - (end - start) % 4
+    decoded = binascii.a2b_base64(segments[start:full])
+    if full != end:
+        decoded += binascii.a2b_base64(bytes(segments[full:end]) + b"=" * (4 - (end - full)))
+    return decoded
+
+
+def _b64encode_segment(data):
+    """
+    Base64url encode one segment of a token, without padding
+
+    Args:
+        data (bytes): The segment to encode
+
+    Returns:
+        memoryview: The encoded segment
+    """
+    encoded = binascii.b2a_base64(data, newline=False).translate(_STANDARD_TO_URLSAFE)
+    return memoryview(encoded)[: (len(data) * 4 + 2) // 3]
+
+
+def _encoded_header(alg, enc, zip, cty, kid, params=None):
     """
     Generate an appropriate JOSE header based on the values provided
     Args:
@@ -343,6 +946,8 @@ def _encoded_header(alg, enc, zip, cty, kid):
         zip (str): Compression method
         cty (str): Content type of the encrypted data
         kid (str): ID for the key used for the operation
+        params (dict, optional): Header parameters produced by the key
+            management algorithm, e.g. epk
 
     Returns:
         bytes: JSON object of header based on input
@@ -354,6 +959,8 @@ def _encoded_header(alg, enc, zip, cty, kid):
         header["cty"] = cty
     if kid:
         header["kid"] = kid
+    if params:
+        header.update(params)
     json_header = json.dumps(
         header,
         separators=(",", ":"),
@@ -366,109 +973,66 @@ def _big_endian(int_val):
     return pack("!Q", int_val)
 
 
-def _encrypt_and_auth(key, alg, enc, zip, plaintext, aad):
-    """
-    Generate a content encryption key (cek) and initialization
-    vector (iv) based on enc and alg, compress the plaintext based on zip,
-    encrypt the compressed plaintext using the cek and iv based on enc
-
-    Args:
-        key (Key): The key provided for encryption
-        alg (str): The algorithm use for key wrap/negotiation
-        enc (str): The encryption algorithm with which to encrypt the plaintext
-        zip (str): The compression algorithm with which to compress the plaintext
-        plaintext (bytes): The data to encrypt
-        aad (str): Additional authentication data utilized for generating an
-                    auth tag
-
-    Returns:
-          (bytes, bytes, bytes, bytes): A tuple of the following data
-                                 (key wrapped cek, iv, cipher text, auth tag)
-    """
-    try:
-        cek_bytes, kw_cek = _get_cek(enc, alg, key)
-    except NotImplementedError:
-        raise JWEError(f"alg {alg} is not implemented")
-
-    if enc in ALGORITHMS.HMAC_AUTH_TAG:
-        encryption_key, mac_key, key_len = _get_encryption_key_mac_key_and_key_length_from_cek(cek_bytes, enc)
-        iv, ciphertext, tag = encryption_key.encrypt(plaintext, aad)
-        auth_tag = _auth_tag(ciphertext, iv, aad, mac_key, key_len)
-    elif enc in ALGORITHMS.GCM:
-        encryption_key = jwk.construct(cek_bytes, enc)
-        iv, ciphertext, auth_tag = encryption_key.encrypt(plaintext, aad)
-    else:
-        raise NotImplementedError(f"enc {enc} is not implemented!")
-
-    return kw_cek, iv, ciphertext, auth_tag
-
-
 def _get_hmac_key(enc, mac_key_bytes):
     """
-    Get an HMACKey for the provided encryption algorithm and key bytes
+    Get a keyed HMAC object for the provided encryption algorithm and key bytes
+
+    The returned object is never updated directly; callers take a ``copy()``
+    of it per message so the key schedule is only computed once.
 
     Args:
         enc (str): Encryption algorithm
-        mac_key_bytes (bytes): vytes for the HMAC key
+        mac_key_bytes (bytes): bytes for the HMAC key
 
     Returns:
-         (HMACKey): The key to perform HMAC actions
+         (hmac.HMAC): The keyed HMAC used to compute auth tags
     """
     _, hash_alg = enc.split("-")
-    mac_key = jwk.construct(mac_key_bytes, hash_alg)
-    return mac_key
+    return hmac.new(mac_key_bytes, digestmod=ALGORITHMS.HASHES[hash_alg])
 
 
-def _compress(zip, plaintext):
+def _get_codec(zip):
     """
-    Compress the plaintext based on the algorithm supplied
+    Get the registered codec for the compression algorithm supplied
 
     Args:
         zip (str): Compression Algorithm
-        plaintext (bytes): plaintext to compress
 
     Returns:
-        (bytes): Compressed plaintext
+        (Codec): The codec, or None when no compression is applied
     """
     if zip not in ZIPS.SUPPORTED:
         raise NotImplementedError(f"ZIP {zip} is not supported!")
     if zip is None:
-        compressed = plaintext
-    elif zip == ZIPS.DEF:
-        compressed = zlib.compress(plaintext)
-    else:
+        return None
+    try:
+        return _CODECS[zip]
+    except KeyError:
         raise NotImplementedError(f"ZIP {zip} is not implemented!")
-    return compressed
 
 
-def _decompress(zip, compressed):
+def _decompress(zip, compressed, max_length=None):
     """
     Decompress the plaintext based on the algorithm supplied
 
     Args:
         zip (str): Compression Algorithm
-        plaintext (bytes): plaintext to decompress
+        compressed (bytes): plaintext to decompress
+        max_length (int, optional): Maximum size of the decompressed
+            plaintext. Defaults to JWE_SIZE_LIMIT.
 
     Returns:
-        (bytes): Compressed plaintext
+        (bytes): Decompressed plaintext
     """
-    if zip not in ZIPS.SUPPORTED:
-        raise NotImplementedError(f"ZIP {zip} is not supported!")
-    if zip is None:
-        decompressed = compressed
-    elif zip == ZIPS.DEF:
-        # If, during decompression, there is more data than expected, the
-        # decompression halts and raise an error. This addresses CVE-2024-33664
-        decompressor = zlib.decompressobj()
-        decompressed = decompressor.decompress(compressed, max_length=JWE_SIZE_LIMIT)
-        if decompressor.unconsumed_tail:
-            raise JWEError(f"Decompressed JWE string exceeds {JWE_SIZE_LIMIT} bytes")
-    else:
-        raise NotImplementedError(f"ZIP {zip} is not implemented!")
-    return decompressed
+    codec = _get_codec(zip)
+    if codec is None:
+        return compressed
+    if max_length is None:
+        max_length = JWE_SIZE_LIMIT
+    return codec.decompress(compressed, max_length)
 
 
-def _get_cek(enc, alg, key):
+def _get_cek(enc, alg, key, p2c=PBES2_COUNT):
     """
     Get the content encryption key
 
@@ -476,16 +1040,138 @@ def _get_cek(enc, alg, key):
         enc (str): Encryption algorithm
         alg (str): kwy wrap/negotiation algorithm
         key (Key): Key provided to encryption method
+        p2c (int, optional): PBKDF2 iteration count for the PBES2 algorithms
 
     Return:
-        (bytes, bytes): Tuple of (cek bytes and wrapped cek)
+        (bytes, bytes, dict): Tuple of (cek bytes, wrapped cek and the
+            header parameters the recipient needs to recover the cek)
     """
     if alg == ALGORITHMS.DIR:
         cek, wrapped_cek = _get_direct_key_wrap_cek(key)
+        header_params = {}
+    elif alg in ALGORITHMS.EC_KW:
+        cek, wrapped_cek, header_params = _get_key_agreement_cek(enc, alg, key)
+    elif alg in ALGORITHMS.AEC_GCM_KW:
+        cek, wrapped_cek, header_params = _get_gcm_key_wrap_cek(enc, key)
+    elif alg in ALGORITHMS.PBES2_KW:
+        cek, wrapped_cek, header_params = _get_pbes2_cek(enc, alg, key, p2c)
     else:
         cek, wrapped_cek = _get_key_wrap_cek(enc, key)
+        header_params = {}
+
+    return cek, wrapped_cek, header_params
+
+
+def _get_key_agreement_cek(enc, alg, key):
+    """
+    Get the content encryption key for ECDH-ES key agreement
+
+    An ephemeral key pair is generated and used to agree on a key with the
+    recipient's public key. With ECDH-ES the agreed key is the cek, with
+    ECDH-ES+AxxxKW it wraps a random cek.
+
+    Args:
+        enc (str): Encryption algorithm
+        alg (str): Key agreement algorithm
+        key (Key): The recipient's public key
+
+    Returns:
+        (bytes, bytes, dict): Tuple of (cek bytes, wrapped cek and the epk
+            header parameter)
+    """
+    ephemeral_key = key.generate_ephemeral_key()
+    shared_secret = ephemeral_key.exchange(key)
+    epk = {k: v for k, v in ephemeral_key.public_key().to_dict().items() if k in ("kty", "crv", "x", "y")}
+
+    if alg == ALGORITHMS.ECDH_ES:
+        cek_bytes = _concat_kdf(shared_secret, enc, _get_cek_bit_length_for_enc(enc) // 8)
+        wrapped_cek = b""
+    else:
+        wrapping_key = _get_key_agreement_wrapping_key(shared_secret, alg)
+        cek_bytes, wrapped_cek = _get_key_wrap_cek(enc, wrapping_key)
+
+    return cek_bytes, wrapped_cek, {"epk": epk}
+
+
+def _get_agreed_key(key, header, alg, enc):
+    """
+    Recover the key agreed with ECDH-ES from the epk header parameter
+
+    Args:
+        key (Key): The recipient's private key
+        header (dict): The JWE header
+        alg (str): Key agreement algorithm
+        enc (str): Encryption algorithm
+
+    Returns:
+        (bytes or Key): With ECDH-ES the cek bytes, with ECDH-ES+AxxxKW the
+            Key used to unwrap the cek
+    """
+    epk = header.get("epk")
+    if not isinstance(epk, Mapping) or epk.get("kty") != "EC":
+        raise JWEError("ECDH-ES requires an EC epk header parameter")
+    try:
+        ephemeral_key = jwk.construct(dict(epk), alg)
+        apu = base64url_decode(ensure_binary(header.get("apu", "")))
+        apv = base64url_decode(ensure_binary(header.get("apv", "")))
+    except Exception as e:
+        raise JWEError(e)
+    shared_secret = key.exchange(ephemeral_key)
+
+    if alg == ALGORITHMS.ECDH_ES:
+        return _concat_kdf(shared_secret, enc, _get_cek_bit_length_for_enc(enc) // 8, apu, apv)
+    return _get_key_agreement_wrapping_key(shared_secret, alg, apu, apv)
+
+
+def _get_key_agreement_wrapping_key(shared_secret, alg, apu=b"", apv=b""):
+    """
+    Derive the AES key wrap key for ECDH-ES+AxxxKW from the shared secret
+
+    Args:
+        shared_secret (bytes): The output of the key agreement
+        alg (str): Key agreement algorithm
+        apu (bytes, optional): Agreement PartyUInfo
+        apv (bytes, optional): Agreement PartyVInfo
+
+    Returns:
+        (Key): The AES key wrap key
+    """
+    _, wrap_alg = alg.split("+")
+    key_len = int(wrap_alg[1:4]) // 8
+    return jwk.construct(_concat_kdf(shared_secret, alg, key_len, apu, apv), wrap_alg)
 
-    return cek, wrapped_cek
+
+def _concat_kdf(shared_secret, algorithm_id, key_len, apu=b"", apv=b""):
+    """
+    Derive a key using the Concat KDF of NIST SP 800-56A with SHA-256, as
+    profiled for ECDH-ES by section 4.6.2 of RFC 7518
+
+    Args:
+        shared_secret (bytes): The output of the key agreement (Z)
+        algorithm_id (str): The enc value for ECDH-ES, the alg value otherwise
+        key_len (int): Length of the derived key in bytes
+        apu (bytes, optional): Agreement PartyUInfo
+        apv (bytes, optional): Agreement PartyVInfo
+
+    Returns:
+        (bytes) The derived key
+    """
+    algorithm_id = algorithm_id.encode("ascii")
+    other_info = b"".join(
+        [
+            pack("!I", len(algorithm_id)),
+            algorithm_id,
+            pack("!I", len(apu)),
+            apu,
+            pack("!I", len(apv)),
+            apv,
+            pack("!I", key_len * 8),
+        ]
+    )
+    derived = []
+    for counter in range(1, -(-key_len // hashlib.sha256().digest_size) + 1):
+        derived.append(hashlib.sha256(pack("!I", counter) + shared_secret + other_info).digest())
+    return b"".join(derived)[:key_len]
 
 
 def _get_direct_key_wrap_cek(key):
@@ -540,6 +1226,200 @@ def _get_key_wrap_cek(enc, key):
     return cek_bytes, wrapped_cek
 
 
+def _get_gcm_key_wrap_cek(enc, key):
+    """
+    Get the content encryption key for AES GCM key wrap
+
+    Args:
+        enc (str): Encryption algorithm
+        key (Key): AES key provided to encryption method
+
+    Returns:
+        (bytes, bytes, dict): Tuple of (cek bytes, wrapped cek and the iv
+            and tag header parameters)
+    """
+    cek_bytes = _get_random_cek_bytes_for_enc(enc)
+    iv, wrapped_cek, tag = key.encrypt(cek_bytes)
+    header_params = {
+        "iv": base64url_encode(iv).decode("ascii"),
+        "tag": base64url_encode(tag).decode("ascii"),
+    }
+    return cek_bytes, wrapped_cek, header_params
+
+
+def _gcm_key_unwrap(key, header, wrapped_cek):
+    """
+    Unwrap a content encryption key wrapped with AES GCM key wrap
+
+    Args:
+        key (Key): AES key provided to decryption method
+        header (dict): The JWE header holding the iv and tag parameters
+        wrapped_cek (bytes): The JWE Encrypted Key
+
+    Returns:
+        (bytes): The cek bytes
+
+    Raises:
+        JWEError: If the header parameters are missing or the key cannot
+            be unwrapped.
+    """
+    iv = header.get("iv")
+    tag = header.get("tag")
+    if not isinstance(iv, str) or not isinstance(tag, str):
+        raise JWEError("AES GCM key wrap requires iv and tag header parameters")
+    return key.decrypt(wrapped_cek, base64url_decode(iv.encode("ascii")), tag=base64url_decode(tag.encode("ascii")))
+
+
+def _get_password(key):
+    """
+    Get the password used with the PBES2 algorithms
+
+    Args:
+        key (str or bytes or dict): The password, or an oct JWK holding it
+
+    Returns:
+        (bytes): The password bytes
+
+    Raises:
+        JWEError: If a password cannot be taken from the key.
+    """
+    if isinstance(key, Mapping):
+        if key.get("kty") != "oct" or "k" not in key:
+            raise JWEError("PBES2 requires a password or an oct JWK")
+        return base64url_decode(ensure_binary(key["k"]))
+    if isinstance(key, (str, bytes)):
+        return ensure_binary(key)
+    raise JWEError("PBES2 requires a password or an oct JWK")
+
+
+def _get_pbes2_cek(enc, alg, password, p2c):
+    """
+    Get the content encryption key for PBES2 key wrap
+
+    Args:
+        enc (str): Encryption algorithm
+        alg (str): PBES2 algorithm
+        password (bytes): The password
+        p2c (int): The PBKDF2 iteration count
+
+    Returns:
+        (bytes, bytes, dict): Tuple of (cek bytes, wrapped cek and the p2s
+            and p2c header parameters)
+    """
+    p2s = get_random_bytes(16)
+    wrapping_key = _pbes2_derive_key(password, p2s, p2c, alg)
+    cek_bytes, wrapped_cek = _get_key_wrap_cek(enc, wrapping_key)
+    return cek_bytes, wrapped_cek, {"p2s": base64url_encode(p2s).decode("ascii"), "p2c": p2c}
+
+
+def _get_pbes2_key(password, header, alg, max_p2c, cache=None):
+    """
+    Recover the PBES2 key encryption key from the p2s and p2c header
+    parameters
+
+    Args:
+        password (bytes): The password
+        header (dict): The JWE header
+        alg (str): PBES2 algorithm
+        max_p2c (int): The largest iteration count that will be computed
+        cache (PBES2KeyCache, optional): Cache of derived keys
+
+    Returns:
+        (Key): The AES key used to unwrap the cek
+
+    Raises:
+        JWEError: If the header parameters are missing or invalid, or the
+            iteration count exceeds max_p2c.
+    """
+    p2s = header.get("p2s")
+    p2c = header.get("p2c")
+    if not isinstance(p2s, str) or type(p2c) is not int or p2c < 1:
+        raise JWEError("PBES2 requires p2s and p2c header parameters")
+    if p2c > max_p2c:
+        raise JWEError(f"PBES2 iteration count {p2c} exceeds {max_p2c}")
+    try:
+        p2s = base64url_decode(p2s.encode("ascii"))
+    except Exception as e:
+        raise JWEError(e)
+    if len(p2s) < 8:
+        raise JWEError("PBES2 salt input must be at least 8 octets")
+
+    if cache is None:
+        return _pbes2_derive_key(password, p2s, p2c, alg)
+    cache_key = (hashlib.sha256(password).digest(), p2s, p2c, alg)
+    key = cache.get(cache_key)
+    if key is None:
+        key = _pbes2_derive_key(password, p2s, p2c, alg)
+        cache.set(cache_key, key)
+    return key
+
+
+def _pbes2_derive_key(password, p2s, p2c, alg):
+    """
+    Derive the PBES2 key encryption key as specified in section 4.8 of
+    RFC 7518
+
+    Args:
+        password (bytes): The password
+        p2s (bytes): The salt input
+        p2c (int): The PBKDF2 iteration count
+        alg (str): PBES2 algorithm
+
+    Returns:
+        (Key): The AES key wrap key
+    """
+    hash_alg, wrap_alg = alg[len("PBES2-") :].split("+")
+    salt = alg.encode("utf-8") + b"\x00" + p2s
+    derived = hashlib.pbkdf2_hmac(ALGORITHMS.HASHES[hash_alg]().name, password, salt, p2c, int(wrap_alg[1:4]) // 8)
+    return jwk.construct(derived, wrap_alg)
+
+
+class PBES2KeyCache:
+    """A bounded, thread safe cache of key encryption keys derived with PBES2.
+
+    Deriving a PBES2 key runs the whole PBKDF2 iteration count, so a sender
+    that reuses its salt pays for it only once per recipient process.  Keys
+    are looked up by a digest of the password together with the p2s, p2c
+    and alg header parameters, the least recently used one is evicted once
+    ``maxsize`` keys are held.
+
+    Args:
+        maxsize (int, optional): The most keys held at once. Defaults to 128.
+
+    Examples:
+        >>> from jose import jwe
+        >>> cache = jwe.PBES2KeyCache()
+        >>> jwe.decrypt(jwe_string, 'a password', kek_cache=cache)
+        'Hello, World!'
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, cache_key):
+        with self._lock:
+            key = self._keys.get(cache_key)
+            if key is not None:
+                self._keys.move_to_end(cache_key)
+            return key
+
+    def set(self, cache_key, key):
+        with self._lock:
+            self._keys[cache_key] = key
+            self._keys.move_to_end(cache_key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
 def _get_random_cek_bytes_for_enc(enc):
     """
     Get the random cek bytes based on the encryption algorithm
@@ -550,6 +1430,21 @@ def _get_random_cek_bytes_for_enc(enc):
     Returns:
         (bytes) random bytes for cek key
     """
+    num_bits = _get_cek_bit_length_for_enc(enc)
+    cek_bytes = get_random_bytes(num_bits // 8)
+    return cek_bytes
+
+
+def _get_cek_bit_length_for_enc(enc):
+    """
+    Get the length of the cek required by the encryption algorithm
+
+    Args:
+        enc (str): Encryption algorithm
+
+    Returns:
+        (int) cek length in bits
+    """
     if enc == ALGORITHMS.A128GCM:
         num_bits = 128
     elif enc == ALGORITHMS.A192GCM:
@@ -562,29 +1457,33 @@ def _get_random_cek_bytes_for_enc(enc):
         num_bits = 512
     else:
         raise NotImplementedError(f"{enc} not supported")
-    cek_bytes = get_random_bytes(num_bits // 8)
-    return cek_bytes
+    return num_bits
 
 
 def _auth_tag(ciphertext, iv, aad, mac_key, tag_length):
     """
     Get ann auth tag from the provided data
 
+    The MAC input ``aad || iv || ciphertext || al`` is fed to the HMAC
+    piece by piece rather than being concatenated into a new buffer.
+
     Args:
         ciphertext (bytes): Encrypted value
         iv (bytes): Initialization vector
         aad (bytes): Additional Authenticated Data
-        mac_key (bytes): Key to use in generating the MAC
+        mac_key (hmac.HMAC): Keyed HMAC to use in generating the MAC
         tag_length (int): How log the tag should be
 
     Returns:
         (bytes) Auth tag
     """
     al = _big_endian(len(aad) * 8)
-    auth_tag_input = aad + iv + ciphertext + al
-    signature = mac_key.sign(auth_tag_input)
-    auth_tag = signature[0:tag_length]
-    return auth_tag
+    mac = mac_key.copy()
+    mac.update(aad)
+    mac.update(iv)
+    mac.update(ciphertext)
+    mac.update(al)
+    return mac.digest()[:tag_length]
 
 
 def _jwe_compact_serialize(encoded_header, encrypted_cek, iv, cipher_text, auth_tag):
@@ -601,19 +1500,14 @@ def _jwe_compact_serialize(encoded_header, encrypted_cek, iv, cipher_text, auth_
     Returns:
         (str): JWE compact serialized string
     """
-    cipher_text = ensure_binary(cipher_text)
-    encoded_encrypted_cek = base64url_encode(encrypted_cek)
-    encoded_iv = base64url_encode(iv)
-    encoded_cipher_text = base64url_encode(cipher_text)
-    encoded_auth_tag = base64url_encode(auth_tag)
-    return (
-        encoded_header
-        + b"."
-        + encoded_encrypted_cek
-        + b"."
-        + encoded_iv
-        + b"."
-        + encoded_cipher_text
-        + b"."
-        + encoded_auth_tag
+    # Each segment is encoded once, unpadded views of them are joined into
+    # an output allocated at its exact size.
+    return b".".join(
+        (
+            encoded_header,
+            _b64encode_segment(encrypted_cek),
+            _b64encode_segment(iv),
+            _b64encode_segment(ensure_binary(cipher_text)),
+            _b64encode_segment(auth_tag),
+        )
     )
@@ -1,55 +1,31 @@
-from jose.backends.base import Key
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from jose import backends
+from jose.backends.base import DIRKey, Key  # noqa: F401
 from jose.constants import ALGORITHMS
 from jose.exceptions import JWKError
+from jose.utils import base64url_encode, calculate_jwk_thumbprint
 
-try:
-    from jose.backends import RSAKey  # noqa: F401
-except ImportError:
-    pass
-
-try:
-    from jose.backends import ECKey  # noqa: F401
-except ImportError:
-    pass
-
-try:
-    from jose.backends import AESKey  # noqa: F401
-except ImportError:
-    pass
-
-try:
-    from jose.backends import DIRKey  # noqa: F401
-except ImportError:
-    pass
 
-try:
-    from jose.backends import HMACKey  # noqa: F401
-except ImportError:
-    pass
+def __getattr__(name):
+    # The key classes of the backends, e.g. jwk.RSAKey, are looked up on
+    # first use so that importing jwk does not import every backend.
+    if name in ("RSAKey", "ECKey", "OKPKey", "AESKey", "HMACKey"):
+        return getattr(backends, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
 def get_key(algorithm):
     if algorithm in ALGORITHMS.KEYS:
         return ALGORITHMS.KEYS[algorithm]
-    elif algorithm in ALGORITHMS.HMAC:  # noqa: F811
-        return HMACKey
-    elif algorithm in ALGORITHMS.RSA:
-        from jose.backends import RSAKey  # noqa: F811
-
-        return RSAKey
-    elif algorithm in ALGORITHMS.EC:
-        from jose.backends import ECKey  # noqa: F811
-
-        return ECKey
-    elif algorithm in ALGORITHMS.AES:
-        from jose.backends import AESKey  # noqa: F811
-
-        return AESKey
-    elif algorithm == ALGORITHMS.DIR:
-        from jose.backends import DIRKey  # noqa: F811
-
-        return DIRKey
-    return None
+    return backends.get_key_class(algorithm)
 
 
 def register_key(algorithm, key_class):
@@ -77,3 +53,528 @@ def construct(key_data, algorithm=None):
     if not key_class:
         raise JWKError("Unable to find an algorithm for key")
     return key_class(key_data, algorithm)
+
+
+class JWKSet:
+    """
+    A set of keys to publish as a JWKS document, e.g. at a
+    ``/.well-known/jwks.json`` endpoint.
+
+    The public JWK of each key is exported once, when the key is added, and
+    the document is rendered once per change of the set's members, so
+    serving it only costs an attribute lookup.
+
+    Args:
+        keys (iterable, optional): Keys to add, as Key objects.
+    """
+
+    def __init__(self, keys=()):
+        self._jwks = {}
+        self._document = None
+        self._lock = threading.Lock()
+        for key in keys:
+            self.add(key)
+
+    def __len__(self):
+        return len(self._jwks)
+
+    def __contains__(self, kid):
+        return kid in self._jwks
+
+    def add(self, key, kid=None):
+        """
+        Add the public part of a key to the set.
+
+        Args:
+            key (Key): A public or private asymmetric key.
+            kid (str, optional): The key ID. Defaults to the base64url
+                encoded RFC 7638 thumbprint of the key.
+
+        Returns:
+            str: The key ID.
+
+        Raises:
+            JWKError: If the key has no public part, e.g. an HMAC key.
+        """
+        try:
+            public_key = key if key.is_public() else key.public_key()
+        except (AttributeError, NotImplementedError):
+            raise JWKError("Only asymmetric keys can be published in a JWKS")
+        if kid is None:
+            kid = base64url_encode(public_key.thumbprint()).decode("ascii")
+
+        jwk_dict = dict(public_key.to_dict(), kid=kid)
+        with self._lock:
+            self._jwks[kid] = jwk_dict
+            self._document = None
+        return kid
+
+    def remove(self, kid):
+        """
+        Remove a key from the set.
+
+        Args:
+            kid (str): The key ID returned by ``add``.
+
+        Raises:
+            KeyError: If no key in the set has this ID.
+        """
+        with self._lock:
+            del self._jwks[kid]
+            self._document = None
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: The JWKS, as ``{"keys": [...]}``.
+        """
+        return json.loads(self.to_json())
+
+    def to_json(self):
+        """
+        Returns:
+            bytes: The JWKS as compact JSON.
+        """
+        return self._render()[0]
+
+    @property
+    def etag(self):
+        """
+        str: A strong HTTP ETag of the JSON returned by ``to_json``.
+        """
+        return self._render()[1]
+
+    def _render(self):
+        document = self._document
+        if document is None:
+            with self._lock:
+                document = self._document
+                if document is None:
+                    body = json.dumps(
+                        {"keys": list(self._jwks.values())}, separators=(",", ":"), sort_keys=True
+                    ).encode("utf-8")
+                    etag = '"%s"' % base64url_encode(hashlib.sha256(body).digest()).decode("ascii")
+                    document = self._document = body, etag
+        return document
+
+
+# The file signature of a KeyStore snapshot, followed by the length of its index.
+_SNAPSHOT_MAGIC = b"JOSEKS\x00\x01"
+_SNAPSHOT_HEADER = struct.Struct(">8sQ")
+
+
+def _serialize_jwk(key, algorithm=None):
+    if isinstance(key, Key):
+        return key.to_bytes(), None
+    if isinstance(key, (str, bytes)):
+        try:
+            key = json.loads(key)
+        except ValueError:
+            raise JWKError("Only keys and JWKs can be added to a key store")
+    if not isinstance(key, Mapping):
+        raise JWKError("Only keys and JWKs can be added to a key store")
+
+    jwk_dict = dict(key)
+    jwk_dict.setdefault("alg", algorithm)
+    if not jwk_dict["alg"] or "kty" not in jwk_dict:
+        raise JWKError("A JWK in a key store needs a kty and an alg")
+    if get_key(jwk_dict["alg"]) is None:
+        raise JWKError("Unable to find an algorithm for key: %s" % jwk_dict["alg"])
+    return json.dumps(jwk_dict, separators=(",", ":"), sort_keys=True).encode("utf-8"), jwk_dict
+
+
+def _load_jwk(data):
+    try:
+        jwk_dict = json.loads(bytes(data))
+        key_class = get_key(jwk_dict["alg"])
+        if key_class is None:
+            raise JWKError("Unable to find an algorithm for key: %s" % jwk_dict["alg"])
+        return key_class._from_jwk(jwk_dict)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise JWKError("Invalid serialized JWK: %s" % e)
+
+
+def _is_snapshot_index(index, data_size):
+    # The index maps tenants to {kid: [offset, size]} within the key data.
+    if not isinstance(index, dict):
+        return False
+    for keys in index.values():
+        if not isinstance(keys, dict):
+            return False
+        for entry in keys.values():
+            if not (isinstance(entry, list) and len(entry) == 2 and all(type(n) is int for n in entry)):
+                return False
+            offset, size = entry
+            if offset < 0 or size < 0 or offset + size > data_size:
+                return False
+    return True
+
+
+class KeyStore:
+    """
+    The keys of many tenants, e.g. the JWKS of every customer of a service,
+    looked up by tenant and key ID.
+
+    Keys are held as compact serialized JWKs and only constructed when a
+    token first needs them. The most recently used constructed keys are
+    kept, up to ``maxsize`` keys and, if ``max_bytes`` is given, up to that
+    many bytes of serialized key data, so the keys of busy tenants are
+    constructed once while idle tenants only cost their JWK bytes.
+
+    ``tenant()`` returns the keys of one tenant in a form ``jws.verify``,
+    ``jwt.decode`` and ``jwe.decrypt`` accept as their key, which picks the
+    key by the ``kid`` header of each token.
+
+    A store can be saved to a snapshot file and loaded from it without
+    parsing its keys, e.g. when workers start.
+
+    Args:
+        maxsize (int, optional): How many constructed keys to keep.
+        max_bytes (int, optional): How many bytes of serialized key data the
+            constructed keys may add up to. Unbounded by default.
+
+    Examples:
+
+        >>> store = KeyStore(maxsize=10000)
+        >>> store.set_jwks('acme', acme_jwks)
+        >>> jwt.decode(token, store.tenant('acme'), algorithms=['RS256'])
+    """
+
+    def __init__(self, maxsize=1024, max_bytes=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        # The serialized keys of each tenant, by kid.
+        self._tenants = {}
+        # The constructed keys and their serialized size by (tenant, kid),
+        # least recently used first.
+        self._keys = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, tenant):
+        return tenant in self._tenants
+
+    def kids(self, tenant):
+        """
+        Args:
+            tenant: The tenant.
+
+        Returns:
+            list: The IDs of the tenant's keys, empty for an unknown tenant.
+        """
+        return list(self._tenants.get(tenant, ()))
+
+    def add(self, tenant, key, kid=None, algorithm=None):
+        """
+        Add a key of a tenant, replacing any key it has with the same ID.
+
+        JWKs are stored as they are, they are not constructed until used.
+
+        Args:
+            tenant: The tenant, any hashable value.
+            key: A Key object, or a JWK as a dict or JSON.
+            kid (str, optional): The key ID. Defaults to the ``kid`` of the
+                JWK, or else the base64url encoded RFC 7638 thumbprint.
+            algorithm (str, optional): The algorithm of a JWK without ``alg``.
+
+        Returns:
+            str: The key ID.
+
+        Raises:
+            JWKError: If the key is not a Key or JWK, or its algorithm is
+                not known.
+        """
+        data, jwk_dict = _serialize_jwk(key, algorithm)
+        if kid is None:
+            if jwk_dict is None:
+                kid = base64url_encode(key.thumbprint()).decode("ascii")
+            else:
+                kid = jwk_dict.get("kid") or base64url_encode(calculate_jwk_thumbprint(jwk_dict)).decode("ascii")
+
+        with self._lock:
+            self._tenants.setdefault(tenant, {})[kid] = data
+            self._forget(tenant, kid)
+        return kid
+
+    def set_jwks(self, tenant, jwks, algorithm=None):
+        """
+        Replace all keys of a tenant, e.g. with a freshly fetched JWKS.
+
+        Args:
+            tenant: The tenant, any hashable value.
+            jwks (dict or str): A JWKS, as ``{"keys": [...]}`` or its JSON.
+                Every JWK needs a ``kid``.
+            algorithm (str, optional): The algorithm of JWKs without ``alg``.
+
+        Returns:
+            list: The key IDs.
+
+        Raises:
+            JWKError: If a JWK is invalid or has no ``kid``.
+        """
+        if isinstance(jwks, (str, bytes)):
+            jwks = json.loads(jwks)
+
+        keys = {}
+        for key in jwks.get("keys", ()):
+            data, jwk_dict = _serialize_jwk(key, algorithm)
+            if jwk_dict is None or not jwk_dict.get("kid"):
+                raise JWKError("Every JWK of a JWKS in a key store needs a kid")
+            keys[jwk_dict["kid"]] = data
+
+        with self._lock:
+            previous = self._tenants.get(tenant, {})
+            self._tenants[tenant] = keys
+            for kid, data in previous.items():
+                if keys.get(kid) != data:
+                    self._forget(tenant, kid)
+        return list(keys)
+
+    def remove(self, tenant, kid=None):
+        """
+        Remove a key of a tenant, or without ``kid`` the tenant and all its keys.
+
+        Args:
+            tenant: The tenant.
+            kid (str, optional): The key ID.
+
+        Raises:
+            KeyError: If the tenant or the key is not known.
+        """
+        with self._lock:
+            if kid is None:
+                kids = self._tenants.pop(tenant)
+            else:
+                del self._tenants[tenant][kid]
+                kids = (kid,)
+            for kid in kids:
+                self._forget(tenant, kid)
+
+    def get(self, tenant, kid):
+        """
+        Get a key of a tenant, constructing it unless it is cached.
+
+        Args:
+            tenant: The tenant.
+            kid (str): The key ID.
+
+        Returns:
+            Key: The key.
+
+        Raises:
+            KeyError: If the tenant or the key is not known.
+            JWKError: If the key cannot be constructed.
+        """
+        cache_key = (tenant, kid)
+        with self._lock:
+            cached = self._keys.get(cache_key)
+            if cached is not None:
+                self._keys.move_to_end(cache_key)
+                return cached[0]
+            data = self._tenants[tenant][kid]
+
+        # Construct outside the lock, so that lookups of other keys do not wait.
+        key = _load_jwk(data)
+
+        with self._lock:
+            if self._tenants.get(tenant, {}).get(kid) is not data:
+                return key  # Replaced or removed meanwhile, do not cache.
+            self._forget(tenant, kid)
+            self._keys[cache_key] = key, len(data)
+            self._size += len(data)
+            while len(self._keys) > self.maxsize or (self.max_bytes is not None and self._size > self.max_bytes):
+                self._size -= self._keys.popitem(last=False)[1][1]
+        return key
+
+    def warmup(self):
+        """
+        Construct every key now, e.g. in the parent process of pre-forked
+        workers, so that the workers share the constructed keys copy-on-write
+        instead of each constructing them on first use. ``maxsize`` and
+        ``max_bytes`` should leave room for all keys. Calling ``gc.freeze()``
+        afterwards keeps the garbage collector from touching, and so
+        copying, the shared objects.
+
+        Returns:
+            int: The number of keys.
+
+        Raises:
+            JWKError: If a key cannot be constructed.
+        """
+        count = 0
+        for tenant, keys in list(self._tenants.items()):
+            for kid in list(keys):
+                self.get(tenant, kid)
+                count += 1
+        return count
+
+    def save(self, path):
+        """
+        Write the keys of all tenants to a snapshot file for ``load``.
+
+        The file holds the serialized keys and an index of them by tenant
+        and key ID. It is written to a temporary file first and then moved
+        into place, so readers never see a partial snapshot.
+
+        Args:
+            path (str): The file to write.
+
+        Raises:
+            JWKError: If a tenant is not a string.
+        """
+        with self._lock:
+            tenants = {tenant: dict(keys) for tenant, keys in self._tenants.items()}
+
+        index = {}
+        chunks = []
+        offset = 0
+        for tenant, keys in tenants.items():
+            if not isinstance(tenant, str):
+                raise JWKError("Only key stores with string tenants can be saved")
+            entries = index[tenant] = {}
+            for kid, data in keys.items():
+                entries[kid] = (offset, len(data))
+                chunks.append(data)
+                offset += len(data)
+        index = json.dumps(index, separators=(",", ":")).encode("utf-8")
+
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, len(index)))
+            f.write(index)
+            f.writelines(chunks)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, maxsize=1024, max_bytes=None):
+        """
+        Open a snapshot written by ``save``.
+
+        The file is memory mapped, so only its index is read up front and
+        the serialized keys stay in the page cache, shared by all processes
+        that load the same snapshot. Keys are constructed on first use, or
+        by ``warmup``.
+
+        Args:
+            path (str): The snapshot file.
+            maxsize (int, optional): How many constructed keys to keep.
+            max_bytes (int, optional): How many bytes of serialized key data
+                the constructed keys may add up to.
+
+        Returns:
+            KeyStore: The keys of the snapshot.
+
+        Raises:
+            JWKError: If the file is not a snapshot or its index is corrupt.
+        """
+        with open(path, "rb") as f:
+            try:
+                snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise JWKError("%s is not a key store snapshot" % path)
+
+        magic, index_size = _SNAPSHOT_HEADER.unpack_from(snapshot) if len(snapshot) >= 16 else (None, 0)
+        if magic != _SNAPSHOT_MAGIC:
+            snapshot.close()
+            raise JWKError("%s is not a key store snapshot" % path)
+
+        start = _SNAPSHOT_HEADER.size + index_size
+        try:
+            index = json.loads(snapshot[_SNAPSHOT_HEADER.size : start])
+        except ValueError:
+            index = None
+        if start > len(snapshot) or not _is_snapshot_index(index, len(snapshot) - start):
+            snapshot.close()
+            raise JWKError("%s is not a valid key store snapshot" % path)
+        data = memoryview(snapshot)[start:]
+
+        store = cls(maxsize=maxsize, max_bytes=max_bytes)
+        store._tenants = {
+            tenant: {kid: data[offset : offset + size] for kid, (offset, size) in keys.items()}
+            for tenant, keys in index.items()
+        }
+        return store
+
+    def tenant(self, tenant):
+        """
+        Args:
+            tenant: The tenant.
+
+        Returns:
+            TenantKeys: The keys of the tenant, to pass as the key argument
+            of ``jws.verify``, ``jwt.decode`` or ``jwe.decrypt``.
+        """
+        return TenantKeys(self, tenant)
+
+    def _forget(self, tenant, kid):
+        cached = self._keys.pop((tenant, kid), None)
+        if cached is not None:
+            self._size -= cached[1]
+
+
+class KeyResolver:
+    """
+    Base class of key arguments for ``jws.verify``, ``jwt.decode`` and
+    ``jwe.decrypt`` that pick the keys for each token from its header.
+    """
+
+    __slots__ = ()
+
+    def keys_for(self, header):
+        """
+        Get the keys to check a token with.
+
+        Args:
+            header (dict): The protected header of the token.
+
+        Returns:
+            list: The matching keys, possibly none.
+
+        Raises:
+            JWKError: If the keys the header refers to cannot be used.
+        """
+        raise NotImplementedError()
+
+
+class TenantKeys(KeyResolver):
+    """
+    The keys of one tenant of a KeyStore, to pass as the key argument of
+    ``jws.verify``, ``jwt.decode`` or ``jwe.decrypt``.
+
+    A token with a ``kid`` header is only checked against the key with that
+    ID, and fails if the tenant has none, so that unknown key IDs cannot
+    make the store construct keys. A token without a ``kid`` is checked
+    against all keys of the tenant.
+    """
+
+    __slots__ = ("store", "tenant")
+
+    def __init__(self, store, tenant):
+        self.store = store
+        self.tenant = tenant
+
+    def get(self, kid):
+        """
+        Args:
+            kid (str): The key ID.
+
+        Returns:
+            Key: The key.
+
+        Raises:
+            KeyError: If the tenant or the key is not known.
+        """
+        return self.store.get(self.tenant, kid)
+
+    def keys_for(self, header):
+        kid = header.get("kid")
+        if kid is not None and not isinstance(kid, str):
+            raise JWKError("The kid header must be a string")
+        kids = self.store.kids(self.tenant) if kid is None else (kid,)
+        keys = []
+        for kid in kids:
+            try:
+                keys.append(self.get(kid))
+            except KeyError:
+                pass
+        return keys
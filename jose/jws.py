@@ -9,7 +9,7 @@ except ImportError:
 from jose import jwk
 from jose.backends.base import Key
 from jose.constants import ALGORITHMS
-from jose.exceptions import JWSError, JWSSignatureError
+from jose.exceptions import JWKError, JWSError, JWSSignatureError
 from jose.utils import base64url_decode, base64url_encode
 
 
@@ -39,7 +39,7 @@ def sign(payload, key, headers=None, algorithm=ALGORITHMS.HS256):
 
     """
 
-    if algorithm not in ALGORITHMS.SUPPORTED:
+    if algorithm not in ALGORITHMS.SUPPORTED or algorithm in ALGORITHMS.KEY_MANAGEMENT:
         raise JWSError("Algorithm %s not supported." % algorithm)
 
     encoded_header = _encode_header(algorithm, additional_headers=headers)
@@ -55,7 +55,8 @@ def verify(token, key, algorithms, verify=True):
     Args:
         token (str): A signed JWS to be verified.
         key (str or dict): A key to attempt to verify the payload with. Can be
-            individual JWK or JWK set.
+            individual JWK or JWK set, or a ``jwk.KeyResolver`` such as the
+            keys of a tenant from ``jwk.KeyStore.tenant``.
         algorithms (str or list): Valid algorithms that should be used to verify the JWS.
 
     Returns:
@@ -258,7 +259,13 @@ def _verify_signature(signing_input, header, signature, key="", algorithms=None)
     if algorithms is not None and alg not in algorithms:
         raise JWSError("The specified alg value is not allowed")
 
-    keys = _get_keys(key)
+    if isinstance(key, jwk.KeyResolver):
+        try:
+            keys = key.keys_for(header)
+        except JWKError as e:
+            raise JWSError(e)
+    else:
+        keys = _get_keys(key)
     try:
         if not _sig_matches_keys(keys, signing_input, signature, alg):
             raise JWSSignatureError()
@@ -76,7 +76,8 @@ def decode(token, key, algorithms=None, options=None, audience=None, issuer=None
             a dict or JSON string for a JWK set as defined by RFC 7517 (e.g.
                 {'keys': [{'kty': 'oct', 'k': 'YTEyMzQ'}, {'kty': 'oct', 'k':'YjM1Nzk'}]} or
                 '{"keys": [{"kty":"oct","k":"YTEyMzQ"},{"kty":"oct","k":"YjM1Nzk"}]}'
-            ) in which case the keys must be base64 url safe encoded (with optional padding).
+            ) in which case the keys must be base64 url safe encoded (with optional padding), or
+            a ``jwk.KeyResolver`` such as the keys of a tenant from ``jwk.KeyStore.tenant``.
         algorithms (str or list): Valid algorithms that should be used to verify the JWS.
         audience (str): The intended audience of the token.  If the "aud" claim is
             included in the claim set, then the audience must be included and must equal
@@ -0,0 +1,216 @@
+import threading
+import time
+from calendar import timegm
+from datetime import datetime
+
+from jose import jwk, jws, jwt
+from jose.backends.base import Key
+from jose.constants import ALGORITHMS
+from jose.exceptions import JWKError
+from jose.utils import base64url_encode
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return timegm(value.utctimetuple())
+    return value
+
+
+class _RotatingKey:
+    def __init__(self, kid, key, verifying_key, activates_at, expires_at):
+        self.kid = kid
+        self.key = key
+        self.verifying_key = verifying_key
+        self.activates_at = activates_at
+        self.expires_at = expires_at
+
+
+class KeyRotation:
+    """
+    Rotates signing keys while tokens signed with earlier keys stay valid.
+
+    Each key is added ahead of time with the time it becomes active. The
+    key that became active last signs new tokens, stamped with its ``kid``.
+    A key that has been superseded keeps verifying tokens for ``overlap``
+    seconds, so that tokens it signed can expire first, and keys that are
+    not active yet already verify, so that instances whose clocks run
+    ahead do not cause verification misses.
+
+    Keys are constructed, exercised once and exported when they are added,
+    so none of that cost falls on the first requests after a rotation.
+
+    Args:
+        algorithm (str, optional): The algorithm of the keys. Defaults to RS256.
+        overlap (int, optional): Seconds a superseded key keeps verifying.
+            Defaults to one hour.
+        clock (callable, optional): Returns the current time in seconds
+            since the epoch. Defaults to time.time.
+
+    Examples:
+
+        >>> rotation = KeyRotation(algorithm='RS256')
+        >>> rotation.add(current_pem)
+        >>> rotation.add(next_pem, activates_at=datetime(2030, 1, 1))
+        >>> token = rotation.encode({'sub': 'frodo'})
+        >>> jwt.decode(token, rotation.key_for(token), algorithms=['RS256'])
+    """
+
+    def __init__(self, algorithm=ALGORITHMS.RS256, overlap=3600, clock=time.time):
+        self.algorithm = algorithm
+        self.overlap = overlap
+        self.clock = clock
+        self.jwks = jwk.JWKSet()
+        self._keys = {}
+        self._lock = threading.Lock()
+        # The signing key, the verification keys by kid, and until when they hold.
+        self._state = None
+
+    def add(self, key, activates_at=None, expires_at=None, kid=None):
+        """
+        Add a key to the rotation.
+
+        Args:
+            key: A Key object, or key data for ``jwk.construct``.
+            activates_at (int or datetime, optional): When the key starts
+                signing. Defaults to now.
+            expires_at (int or datetime, optional): When the key stops
+                verifying. Defaults to ``overlap`` seconds after the next
+                key becomes active.
+            kid (str, optional): The key ID. Defaults to the base64url
+                encoded RFC 7638 thumbprint of the key.
+
+        Returns:
+            str: The key ID.
+
+        Raises:
+            JWKError: If the key cannot be used to sign and verify.
+        """
+        if not isinstance(key, Key):
+            key = jwk.construct(key, self.algorithm)
+
+        # Warm the key up: sign and verify once, and export it.
+        try:
+            verifying_key = key.public_key()
+        except NotImplementedError:
+            verifying_key = key  # A symmetric key
+        try:
+            verified = verifying_key.verify(b"warmup", key.sign(b"warmup"))
+        except NotImplementedError:
+            raise JWKError("Only keys that can sign and verify can be rotated")
+        if not verified:
+            raise JWKError("The key does not verify its own signature")
+        if kid is None:
+            kid = base64url_encode(key.thumbprint()).decode("ascii")
+        if verifying_key is not key:
+            self.jwks.add(key, kid=kid)
+
+        activates_at = _timestamp(activates_at) if activates_at is not None else self.clock()
+        with self._lock:
+            self._keys[kid] = _RotatingKey(kid, key, verifying_key, activates_at, _timestamp(expires_at))
+            self._state = None
+        return kid
+
+    def retire(self, kid, at=None):
+        """
+        Stop verifying with a key, e.g. because it was compromised.
+
+        Args:
+            kid (str): The key ID returned by ``add``.
+            at (int or datetime, optional): When the key stops verifying.
+                Defaults to now.
+
+        Raises:
+            KeyError: If no key in the rotation has this ID.
+        """
+        with self._lock:
+            self._keys[kid].expires_at = _timestamp(at) if at is not None else self.clock()
+            self._state = None
+
+    def signing_key(self):
+        """
+        Returns:
+            (str, Key): The ID and key that new tokens are signed with.
+
+        Raises:
+            JWKError: If no key is active.
+        """
+        signing_key = self._current()[0]
+        if signing_key is None:
+            raise JWKError("No signing key is active")
+        return signing_key.kid, signing_key.key
+
+    def verification_keys(self):
+        """
+        Returns:
+            dict: The keys that verify tokens now, by key ID. These are the
+            public keys of asymmetric keys.
+        """
+        return self._current()[1]
+
+    def key_for(self, token):
+        """
+        Get the key to verify a token with, for ``jwt.decode`` or ``jws.verify``.
+
+        Args:
+            token (str): A signed token.
+
+        Returns:
+            The key matching the ``kid`` of the token, or all verification
+            keys if the token has no ``kid`` or it is not a known key ID.
+        """
+        keys = self._current()[1]
+        kid = jws.get_unverified_header(token).get("kid")
+        key = keys.get(kid) if isinstance(kid, str) else None
+        return key if key is not None else list(keys.values())
+
+    def encode(self, claims, headers=None, access_token=None):
+        """
+        Sign claims with the current key, as ``jwt.encode`` does.
+
+        Args:
+            claims (dict): The claims to sign.
+            headers (dict, optional): Headers added to the default headers.
+                The ``kid`` of the signing key is always added.
+            access_token (str, optional): Passed on to ``jwt.encode``.
+
+        Returns:
+            str: The JWT.
+        """
+        kid, key = self.signing_key()
+        headers = dict(headers or (), kid=kid)
+        return jwt.encode(claims, key, algorithm=self.algorithm, headers=headers, access_token=access_token)
+
+    def _current(self):
+        now = self.clock()
+        state = self._state
+        if state is None or now >= state[2]:
+            with self._lock:
+                state = self._state
+                if state is None or now >= state[2]:
+                    state = self._state = self._compute(now)
+        return state
+
+    def _compute(self, now):
+        keys = sorted(self._keys.values(), key=lambda k: k.activates_at)
+        signing_key = None
+        verification_keys = {}
+        changes = []
+        for i, entry in enumerate(keys):
+            expires_at = entry.expires_at
+            if expires_at is None and i + 1 < len(keys):
+                expires_at = keys[i + 1].activates_at + self.overlap
+            if expires_at is not None and expires_at <= now:
+                del self._keys[entry.kid]
+                if entry.kid in self.jwks:
+                    self.jwks.remove(entry.kid)
+                continue
+
+            verification_keys[entry.kid] = entry.verifying_key
+            if entry.activates_at <= now:
+                signing_key = entry
+            else:
+                changes.append(entry.activates_at)
+            if expires_at is not None:
+                changes.append(expires_at)
+
+        return signing_key, verification_keys, min(changes, default=float("inf"))
@@ -1,26 +1,11 @@
 import base64
+import hashlib
+import json
 import re
-import struct
 
-# Piggyback of the backends implementation of the function that converts a long
-# to a bytes stream. Some plumbing is necessary to have the signatures match.
-try:
-    from cryptography.utils import int_to_bytes as _long_to_bytes
 
-    def long_to_bytes(n, blocksize=0):
-        return _long_to_bytes(n, blocksize or None)
-
-except ImportError:
-    from ecdsa.ecdsa import int_to_string as _long_to_bytes
-
-    def long_to_bytes(n, blocksize=0):
-        ret = _long_to_bytes(n)
-        if blocksize == 0:
-            return ret
-        else:
-            assert len(ret) <= blocksize
-            padding = blocksize - len(ret)
-            return b"\x00" * padding + ret
+def long_to_bytes(n, blocksize=0):
+    return n.to_bytes(blocksize or (n.bit_length() + 7) // 8 or 1, "big")
 
 
 def long_to_base64(data, size=0):
@@ -37,7 +22,7 @@ def base64_to_long(data):
 
     # urlsafe_b64decode will happily convert b64encoded data
     _d = base64.urlsafe_b64decode(bytes(data) + b"==")
-    return int_arr_to_long(struct.unpack("%sB" % len(_d), _d))
+    return int.from_bytes(_d, "big")
 
 
 def calculate_at_hash(access_token, hash_alg):
@@ -63,6 +48,40 @@ def calculate_at_hash(access_token, hash_alg):
     return at_hash.decode("utf-8")
 
 
+# Members of each key type that its RFC 7638 thumbprint covers.
+THUMBPRINT_MEMBERS = {
+    "EC": ("crv", "kty", "x", "y"),
+    "OKP": ("crv", "kty", "x"),
+    "RSA": ("e", "kty", "n"),
+    "oct": ("k", "kty"),
+}
+
+
+def calculate_jwk_thumbprint(jwk_dict, hash_alg=hashlib.sha256):
+    """Helper method for calculating the thumbprint of a JWK, as described
+    in https://tools.ietf.org/html/rfc7638
+
+    The thumbprint is the hash of the JSON object holding only the required
+    members of the key, ordered lexicographically and without whitespace,
+    so it is the same for a public key and its private key.
+
+    Args:
+        jwk_dict (dict): A JWK.
+        hash_alg (callable): A callable returning a hash object, e.g. hashlib.sha256
+
+    Returns:
+        bytes: The thumbprint digest.
+
+    Raises:
+        KeyError: If the key type is not known or a required member is missing.
+    """
+    members = {}
+    for name in THUMBPRINT_MEMBERS[jwk_dict["kty"]]:
+        value = jwk_dict[name]
+        members[name] = value.decode("ascii") if isinstance(value, bytes) else value
+    return hash_alg(json.dumps(members, separators=(",", ":"), sort_keys=True).encode("utf-8")).digest()
+
+
 def base64url_decode(input):
     """Helper method to base64url_decode a string.
 
@@ -0,0 +1,284 @@
+import base64
+import binascii
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+from jose import jwk
+from jose.exceptions import JWKError
+from jose.utils import base64url_encode
+
+
+def _fingerprint(der):
+    return hashlib.sha256(der).digest()
+
+
+def _validity(certificate):
+    # The timezone aware properties only exist since cryptography 42.
+    try:
+        return certificate.not_valid_before_utc.timestamp(), certificate.not_valid_after_utc.timestamp()
+    except AttributeError:
+        not_before = certificate.not_valid_before.replace(tzinfo=timezone.utc)
+        not_after = certificate.not_valid_after.replace(tzinfo=timezone.utc)
+        return not_before.timestamp(), not_after.timestamp()
+
+
+def _is_ca(certificate):
+    try:
+        basic_constraints = certificate.extensions.get_extension_for_class(x509.BasicConstraints).value
+    except x509.ExtensionNotFound:
+        return False, None
+    return basic_constraints.ca, basic_constraints.path_length
+
+
+def _key_usage(certificate):
+    try:
+        return certificate.extensions.get_extension_for_class(x509.KeyUsage).value
+    except x509.ExtensionNotFound:
+        return None
+
+
+def _load_certificate(data):
+    if isinstance(data, x509.Certificate):
+        return data
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        if data.lstrip().startswith(b"-----BEGIN CERTIFICATE-----"):
+            return x509.load_pem_x509_certificate(data)
+        return x509.load_der_x509_certificate(data)
+    except ValueError as e:
+        raise JWKError(e)
+
+
+class _Chain:
+    __slots__ = ("leaf", "not_before", "not_after", "keys")
+
+    def __init__(self, leaf, not_before, not_after):
+        self.leaf = leaf
+        self.not_before = not_before
+        self.not_after = not_after
+        # The verification key of the leaf, by algorithm.
+        self.keys = {}
+
+
+class TrustStore(jwk.KeyResolver):
+    """
+    Verifies keys that come with an X.509 certificate chain (``x5c``), in a
+    JWK or in the header of a JWS or JWE, against trust anchors.
+
+    A chain is valid if every certificate is signed by the next one, the
+    certificates that sign are CAs within their path length, all of them
+    are valid at the time, and the last one is a trust anchor or is signed
+    by one. Where a certificate has a key usage extension, it must allow
+    signing certificates for the ones that sign, and digital signatures for
+    the first one. Revocation, name constraints and certificate policies
+    are not checked. An ``x5t#S256`` next to the chain must match its first
+    certificate.
+
+    Parsed certificates are cached by their SHA-256 fingerprint, and the
+    outcome of validating a chain by the fingerprints of its certificates,
+    until the first of them expires. Tokens that carry the same chain only
+    cost a dictionary lookup after the first one.
+
+    Pass a TrustStore as the key to ``jws.verify`` or ``jwt.decode`` to
+    verify tokens with the key of the ``x5c`` chain in their header.
+
+    Args:
+        trust_anchors (iterable): The trusted root certificates, as PEM or
+            DER bytes or cryptography Certificate objects.
+        clock (callable, optional): Returns the current time in seconds
+            since the epoch. Defaults to time.time.
+        maxsize (int, optional): How many certificates and chains to cache.
+
+    Examples:
+
+        >>> trust_store = TrustStore([root_ca_pem])
+        >>> jwt.decode(token, trust_store, algorithms=['RS256'])
+    """
+
+    __slots__ = ("clock", "maxsize", "_anchors", "_certificates", "_chains", "_lock")
+
+    def __init__(self, trust_anchors, clock=time.time, maxsize=1024):
+        self.clock = clock
+        self.maxsize = maxsize
+        # The trust anchors by fingerprint.
+        self._anchors = {}
+        for anchor in trust_anchors:
+            anchor = _load_certificate(anchor)
+            self._anchors[_fingerprint(anchor.public_bytes(serialization.Encoding.DER))] = anchor
+        # Parsed certificates and validated chains by fingerprint, least recently used first.
+        self._certificates = OrderedDict()
+        self._chains = OrderedDict()
+        self._lock = threading.Lock()
+
+    def certificate(self, der):
+        """
+        Parse a DER encoded certificate, or get it from the cache.
+
+        Args:
+            der (bytes): The certificate.
+
+        Returns:
+            cryptography.x509.Certificate: The certificate.
+
+        Raises:
+            JWKError: If it is not a certificate.
+        """
+        return self._certificate(_fingerprint(der), der)
+
+    def verify_chain(self, x5c, x5t_s256=None):
+        """
+        Validate a certificate chain.
+
+        Args:
+            x5c (list): The base64 encoded DER certificates, the one holding
+                the key first, as in the ``x5c`` member of a JWK or header.
+            x5t_s256 (str, optional): The base64url encoded SHA-256
+                fingerprint the first certificate must have.
+
+        Returns:
+            cryptography.x509.Certificate: The first certificate.
+
+        Raises:
+            JWKError: If the chain is not valid now.
+        """
+        return self._verify_chain(x5c, x5t_s256).leaf
+
+    def key_for(self, data, algorithm=None):
+        """
+        Get the key of a JWK or header with an ``x5c`` chain, if the chain
+        is valid.
+
+        Args:
+            data (dict): A JWK, or the header of a JWS or JWE.
+            algorithm (str, optional): The algorithm to use the key for.
+                Defaults to the ``alg`` of ``data``.
+
+        Returns:
+            Key: The public key of the first certificate.
+
+        Raises:
+            JWKError: If there is no chain, it is not valid, or a JWK holds
+                another key than its certificate.
+        """
+        if not data.get("x5c"):
+            raise JWKError("No x5c certificate chain")
+        algorithm = algorithm or data.get("alg")
+        if not algorithm:
+            raise JWKError("Unable to find an algorithm for key")
+
+        chain = self._verify_chain(data["x5c"], data.get("x5t#S256"))
+        key = chain.keys.get(algorithm)
+        if key is None:
+            public_key = chain.leaf.public_key().public_bytes(
+                serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+            )
+            key = chain.keys[algorithm] = jwk.construct(public_key, algorithm)
+
+        if "kty" in data and ("n" in data or "x" in data):
+            # A JWK must hold the key of its first certificate (RFC 7517, section 4.7).
+            if jwk.construct(data, algorithm).public_key().to_dict() != key.to_dict():
+                raise JWKError("The key of the JWK does not match its x5c certificate")
+        return key
+
+    def keys_for(self, header):
+        if not header.get("x5c"):
+            return []
+        return [self.key_for(header)]
+
+    def _certificate(self, fingerprint, der):
+        now = self.clock()
+        with self._lock:
+            cached = self._certificates.get(fingerprint)
+            if cached is not None and now < cached[1]:
+                self._certificates.move_to_end(fingerprint)
+                return cached[0]
+
+        certificate = _load_certificate(der)
+        with self._lock:
+            self._certificates[fingerprint] = certificate, _validity(certificate)[1]
+            self._certificates.move_to_end(fingerprint)
+            while len(self._certificates) > self.maxsize:
+                self._certificates.popitem(last=False)
+        return certificate
+
+    def _verify_chain(self, x5c, x5t_s256=None):
+        if isinstance(x5c, str) or not x5c:
+            raise JWKError("x5c must be a list of certificates")
+        try:
+            ders = [base64.b64decode(certificate, validate=True) for certificate in x5c]
+        except (TypeError, binascii.Error):
+            raise JWKError("x5c certificates must be base64 encoded")
+        fingerprints = tuple(_fingerprint(der) for der in ders)
+        if x5t_s256 is not None and x5t_s256 != base64url_encode(fingerprints[0]).decode("ascii"):
+            raise JWKError("x5t#S256 does not match the x5c certificate")
+
+        now = self.clock()
+        with self._lock:
+            chain = self._chains.get(fingerprints)
+            if chain is not None and chain.not_before <= now < chain.not_after:
+                self._chains.move_to_end(fingerprints)
+                return chain
+
+        certificates = [self._certificate(fingerprint, der) for fingerprint, der in zip(fingerprints, ders)]
+        chain = self._validate(certificates, fingerprints, now)
+        with self._lock:
+            self._chains[fingerprints] = chain
+            self._chains.move_to_end(fingerprints)
+            while len(self._chains) > self.maxsize:
+                self._chains.popitem(last=False)
+        return chain
+
+    def _validate(self, certificates, fingerprints, now):
+        if fingerprints[-1] not in self._anchors:
+            anchor = self._find_anchor(certificates[-1])
+            if anchor is None:
+                raise JWKError("The x5c certificate chain does not lead to a trust anchor")
+            certificates = certificates + [anchor]
+
+        key_usage = _key_usage(certificates[0])
+        if key_usage is not None and not key_usage.digital_signature:
+            raise JWKError("The key usage of the x5c certificate does not allow digital signatures")
+
+        for depth, (certificate, issuer) in enumerate(zip(certificates, certificates[1:])):
+            ca, path_length = _is_ca(issuer)
+            key_usage = _key_usage(issuer)
+            if (
+                not ca
+                or (path_length is not None and depth > path_length)
+                or (key_usage is not None and not key_usage.key_cert_sign)
+            ):
+                raise JWKError("An x5c certificate is issued by a certificate that may not issue it")
+            self._check_issued_by(certificate, issuer)
+
+        validity = [_validity(certificate) for certificate in certificates]
+        not_before = max(start for start, end in validity)
+        not_after = min(end for start, end in validity)
+        if not not_before <= now < not_after:
+            raise JWKError("An x5c certificate is expired or not yet valid")
+        return _Chain(certificates[0], not_before, not_after)
+
+    def _find_anchor(self, certificate):
+        for anchor in self._anchors.values():
+            if anchor.subject == certificate.issuer:
+                try:
+                    self._check_issued_by(certificate, anchor)
+                except JWKError:
+                    continue
+                return anchor
+        return None
+
+    @staticmethod
+    def _check_issued_by(certificate, issuer):
+        try:
+            certificate.verify_directly_issued_by(issuer)
+        except AttributeError:
+            raise JWKError("Validating x5c certificate chains requires cryptography 40 or later")
+        except Exception:
+            raise JWKError("An x5c certificate is not signed by the next certificate of the chain")
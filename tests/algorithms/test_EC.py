@@ -4,6 +4,7 @@ import re
 
 from jose import jwt
 from jose.backends import ECKey
+from jose.backends.base import PreparedKeyCache
 from jose.constants import ALGORITHMS
 from jose.exceptions import JOSEError, JWKError
 
@@ -95,6 +96,55 @@ def test_key_from_ecdsa():
     assert not ECKey(key, ALGORITHMS.ES256).is_public()
 
 
+@pytest.mark.ecdsa
+@pytest.mark.skipif(None in (ECDSAECKey, ecdsa), reason="python-ecdsa backend not available")
+class TestECDSAPreparedKeys:
+    @pytest.fixture(autouse=True)
+    def empty_cache(self, monkeypatch):
+        monkeypatch.setattr(ECDSAECKey, "_prepared_keys", PreparedKeyCache())
+
+    def test_pem_key_is_reused(self):
+        first = ECDSAECKey(private_key, ALGORITHMS.ES256)
+        second = ECDSAECKey(private_key.encode(), ALGORITHMS.ES256)
+        assert first.prepared_key is second.prepared_key
+
+    def test_jwk_is_reused(self):
+        public_jwk = ECDSAECKey(private_key, ALGORITHMS.ES256).public_key().to_dict()
+        first = ECDSAECKey(public_jwk, ALGORITHMS.ES256)
+        second = ECDSAECKey(dict(public_jwk), ALGORITHMS.ES256)
+        assert first.prepared_key is second.prepared_key
+
+    def test_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(ECDSAECKey, "_prepared_keys", PreparedKeyCache(maxsize=2))
+        keys = [ecdsa.SigningKey.generate(ecdsa.NIST256p).to_pem() for _ in range(3)]
+        for key in keys:
+            ECDSAECKey(key, ALGORITHMS.ES256)
+        assert len(ECDSAECKey._prepared_keys) == 2
+        assert (ALGORITHMS.ES256, keys[0]) not in ECDSAECKey._prepared_keys
+
+    def test_precomputed_verify(self):
+        key = ECDSAECKey(private_key, ALGORITHMS.ES256)
+        signature = key.sign(b"message")
+        public_key = ECDSAECKey(key.public_key().to_dict(), ALGORITHMS.ES256)
+        for _ in range(2):
+            assert public_key.verify(b"message", signature)
+            assert not public_key.verify(b"other message", signature)
+
+    @pytest.mark.parametrize(
+        "algorithm, curve",
+        [(ALGORITHMS.ES256, "NIST256p"), (ALGORITHMS.ES384, "NIST384p"), (ALGORITHMS.ES512, "NIST521p")],
+    )
+    def test_precomputed_verify_with_pem_key(self, algorithm, curve):
+        # The public point of a PEM key does not know its order.
+        signing_key = ecdsa.SigningKey.generate(getattr(ecdsa, curve))
+        key = ECDSAECKey(signing_key.to_pem(), algorithm)
+        signature = key.sign(b"message")
+        public_key = ECDSAECKey(signing_key.get_verifying_key().to_pem(), algorithm)
+        for _ in range(2):
+            assert public_key.verify(b"message", signature)
+            assert not public_key.verify(b"other message", signature)
+
+
 @pytest.mark.cryptography
 @pytest.mark.skipif(CryptographyECKey is None, reason="pyca/cryptography backend not available")
 @pytest.mark.parametrize(
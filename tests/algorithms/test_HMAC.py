@@ -1,4 +1,7 @@
+import hashlib
+import hmac
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
@@ -46,3 +49,23 @@ class TestHMACAlgorithm:
 
         # as_dict should be serializable to JSON
         json.dumps(as_dict)
+
+    @pytest.mark.parametrize("algorithm", sorted(ALGORITHMS.HMAC))
+    def test_sign_reuses_key(self, algorithm):
+        key = HMACKey(b"secret", algorithm)
+        digestmod = HMACKey.HASHES[algorithm]
+        for msg in (b"first message", b"second message", b""):
+            assert key.sign(msg) == hmac.new(b"secret", msg, digestmod).digest()
+            assert key.verify(msg, key.sign(msg))
+        assert not key.verify(b"first message", key.sign(b"second message"))
+
+    def test_jwk_key(self):
+        key = HMACKey({"kty": "oct", "k": "c2VjcmV0"}, ALGORITHMS.HS256)
+        assert key.sign(b"message") == hmac.new(b"secret", b"message", hashlib.sha256).digest()
+
+    def test_sign_from_threads(self):
+        key = HMACKey(b"secret", ALGORITHMS.HS256)
+        messages = [b"message %d" % i for i in range(200)]
+        expected = [hmac.new(b"secret", msg, hashlib.sha256).digest() for msg in messages]
+        with ThreadPoolExecutor(8) as executor:
+            assert list(executor.map(key.sign, messages)) == expected
@@ -23,6 +23,7 @@ except ImportError:
 import pytest
 
 from jose.backends import RSAKey
+from jose.backends.base import PreparedKeyCache
 from jose.constants import ALGORITHMS
 from jose.exceptions import JOSEError, JWKError
 
@@ -217,6 +218,43 @@ class TestPurePythonRsa:
 
         excinfo.match("Invalid private key encoding")
 
+    @pytest.mark.parametrize("private_key_pem", PRIVATE_KEYS)
+    def test_python_rsa_reads_every_encoding(self, private_key_pem):
+        key = PurePythonRSAKey(private_key_pem, ALGORITHMS.RS256)
+        public_key = key.public_key()
+        msg = b"test"
+        signature = key.sign(msg)
+
+        for pem_format in ("PKCS1", "PKCS8"):
+            for k in (key, public_key):
+                pem = k.to_pem(pem_format)
+                lines = pem.strip().split(b"\n")
+                der = base64.b64decode(b"".join(lines[1:-1]))
+                for data in (pem, der):
+                    loaded = PurePythonRSAKey(data, ALGORITHMS.RS256)
+                    assert loaded.is_public() == k.is_public()
+                    assert loaded.to_pem(pem_format) == pem
+                    assert loaded.public_key().verify(msg, signature)
+
+    def test_python_rsa_unsupported_pem_label(self):
+        pem = private_key_2048_pkcs1.replace(b"RSA PRIVATE KEY", b"EC PRIVATE KEY")
+        with pytest.raises(JWKError) as excinfo:
+            PurePythonRSAKey(pem, ALGORITHMS.RS256)
+
+        excinfo.match("Unsupported RSA key format: EC PRIVATE KEY")
+
+    def test_python_rsa_inconsistent_private_key(self):
+        key = PurePythonRSAKey(private_key_2048_pkcs1, ALGORITHMS.RS256)._prepared_key
+        der = rsa_backend.rsa_private_key_to_pkcs1(key.n, key.e, key.d, key.p, key.q, key.exp1, key.exp2, key.coef + 1)
+        with pytest.raises(JWKError):
+            PurePythonRSAKey(der, ALGORITHMS.RS256)
+
+    @pytest.mark.parametrize("p, q", [(1, 3233), (3233, 1), (0, 0)])
+    def test_python_rsa_degenerate_private_key(self, p, q):
+        der = rsa_backend.rsa_private_key_to_pkcs1(p * q, 17, 2753, p, q, 1, 1, 1)
+        with pytest.raises(JWKError):
+            PurePythonRSAKey(der, ALGORITHMS.RS256)
+
 
 @pytest.mark.cryptography
 @pytest.mark.skipif(
@@ -252,6 +290,50 @@ def test_cryptography_wrap_key_unencoded_cleartext(private_key_pem, algorithm):
     assert unwrapped == key
 
 
+RSA_BACKENDS = [backend for backend in (PurePythonRSAKey, CryptographyRSAKey) if backend is not None]
+
+
+def _prepared_key(key):
+    # The backends name the wrapped key differently.
+    return key.prepared_key if hasattr(key, "prepared_key") else key._prepared_key
+
+
+@pytest.mark.parametrize("backend", RSA_BACKENDS)
+class TestPreparedPrivateKeys:
+    @pytest.fixture
+    def private_jwk(self, backend):
+        return backend(private_key_2048_pkcs1, ALGORITHMS.RS256).to_dict()
+
+    def test_private_jwk_is_prepared_once(self, backend, private_jwk, monkeypatch):
+        monkeypatch.setattr(backend, "_private_keys", PreparedKeyCache())
+
+        first = backend(private_jwk, ALGORITHMS.RS256)
+        second = backend(dict(private_jwk), ALGORITHMS.RS512)
+
+        assert len(backend._private_keys) == 1
+        assert _prepared_key(first) is _prepared_key(second)
+        assert second.verify(b"msg", second.sign(b"msg"))
+
+    def test_recovered_factors_are_reused(self, backend, private_jwk, monkeypatch):
+        monkeypatch.setattr(backend, "_private_keys", PreparedKeyCache())
+        for name in ("p", "q", "dp", "dq", "qi"):
+            del private_jwk[name]
+
+        first = backend(private_jwk, ALGORITHMS.RS256)
+        second = backend(private_jwk, ALGORITHMS.RS256)
+
+        assert _prepared_key(first) is _prepared_key(second)
+        # The full CRT form is emitted, so the factors are not recovered again later.
+        assert second.to_dict() == backend(private_key_2048_pkcs1, ALGORITHMS.RS256).to_dict()
+
+    def test_public_jwk_is_not_cached(self, backend, private_jwk, monkeypatch):
+        monkeypatch.setattr(backend, "_private_keys", PreparedKeyCache())
+
+        backend(backend(private_jwk, ALGORITHMS.RS256).public_key().to_dict(), ALGORITHMS.RS256)
+
+        assert len(backend._private_keys) == 1
+
+
 @pytest.mark.skipif(RSAKey is None, reason="RSA is not available")
 class TestRSAAlgorithm:
     def test_RSA_key(self):
@@ -1,5 +1,6 @@
 import pytest
 
+from jose.backends.base import PreparedKeyCache
 from jose.jwk import Key
 
 
@@ -34,3 +35,35 @@ class TestBaseAlgorithm:
     def test_unwrap_key_is_interface(self, alg):
         with pytest.raises(NotImplementedError):
             alg.unwrap_key("plain text")
+
+    def test_exchange_is_interface(self, alg):
+        with pytest.raises(NotImplementedError):
+            alg.exchange(alg)
+
+    def test_generate_ephemeral_key_is_interface(self, alg):
+        with pytest.raises(NotImplementedError):
+            alg.generate_ephemeral_key()
+
+
+class TestPreparedKeyCache:
+    def test_get_and_set(self):
+        cache = PreparedKeyCache()
+        assert cache.get("key") is None
+
+        cache.set("key", "prepared")
+        assert "key" in cache
+        assert cache.get("key") == "prepared"
+
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self):
+        cache = PreparedKeyCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
@@ -166,3 +166,59 @@ def test_rsa_public_key_pkcs8_to_pkcs1():
     pkcs8 = base64.b64decode(PKCS8_PUBLIC_KEY)
 
     assert _asn1.rsa_public_key_pkcs8_to_pkcs1(pkcs8) == pkcs1
+
+
+def test_rsa_public_key_pkcs1_roundtrip():
+    pkcs1 = base64.b64decode(PKCS1_PUBLIC_KEY)
+
+    assert _asn1.rsa_public_key_to_pkcs1(*_asn1.rsa_public_key_from_pkcs1(pkcs1)) == pkcs1
+
+
+def test_rsa_private_key_pkcs1_roundtrip():
+    pkcs1 = base64.b64decode(PKCS1_PRIVATE_KEY)
+
+    assert _asn1.rsa_private_key_to_pkcs1(*_asn1.rsa_private_key_from_pkcs1(pkcs1)) == pkcs1
+
+
+@pytest.mark.parametrize(
+    "key, label",
+    [
+        (PKCS1_PRIVATE_KEY, "RSA PRIVATE KEY"),
+        (PKCS8_PRIVATE_KEY, "PRIVATE KEY"),
+        (PKCS1_PUBLIC_KEY, "RSA PUBLIC KEY"),
+        (PKCS8_PUBLIC_KEY, "PUBLIC KEY"),
+    ],
+)
+def test_rsa_key_der_label(key, label):
+    assert _asn1.rsa_key_der_label(base64.b64decode(key)) == label
+
+
+@pytest.mark.parametrize(
+    "der",
+    [
+        b"",
+        b"\x30",
+        b"\x30\x05\x02\x01\x00",
+        b"\x30\x03\x02\x01\x00\x00",
+        b"\x30\x84\xff\xff\xff\xff",
+        b"\x04\x03\x02\x01\x00",
+    ],
+)
+def test_invalid_der(der):
+    with pytest.raises(ValueError):
+        _asn1.rsa_key_der_label(der)
+    with pytest.raises(ValueError):
+        _asn1.rsa_public_key_from_pkcs1(der)
+    with pytest.raises(ValueError):
+        _asn1.rsa_private_key_pkcs8_to_pkcs1(der)
+    with pytest.raises(ValueError):
+        _asn1.rsa_public_key_pkcs8_to_pkcs1(der)
+
+
+def test_rsa_private_key_pkcs8_to_pkcs1_needs_rsa():
+    pkcs8 = bytearray(base64.b64decode(PKCS8_PRIVATE_KEY))
+    # Turn the rsaEncryption OID into another one.
+    pkcs8[pkcs8.index(bytes.fromhex("2a864886f70d010101")) + 8] = 0x02
+
+    with pytest.raises(ValueError):
+        _asn1.rsa_private_key_pkcs8_to_pkcs1(bytes(pkcs8))
@@ -1,5 +1,11 @@
 """Test the default import handling."""
 
+import os
+import subprocess
+import sys
+
+import pytest
+
 try:
     from jose.backends.rsa_backend import RSAKey as PurePythonRSAKey
 except ImportError:
@@ -22,8 +28,14 @@ try:
 except ImportError:
     CryptographyHMACKey = None
 
+import jose
+from jose import backends, jwk
 from jose.backends import ECKey, HMACKey, RSAKey
+from jose.backends.native import BufferedRandom
 from jose.backends.native import HMACKey as NativeHMACKey
+from jose.backends.native import get_random_bytes, set_random_source
+from jose.constants import ALGORITHMS
+from jose.exceptions import JWKError
 
 try:
     from jose.backends import AESKey
@@ -57,3 +69,182 @@ def test_default_hmac_backend():
         assert HMACKey is CryptographyHMACKey
     else:
         assert HMACKey is NativeHMACKey
+
+
+class TestBufferedRandom:
+    def test_returns_requested_number_of_bytes(self):
+        random = BufferedRandom(buffer_size=64)
+        chunks = [random(n) for n in (1, 16, 32, 64, 65, 100)]
+        assert [len(chunk) for chunk in chunks] == [1, 16, 32, 64, 65, 100]
+
+    def test_never_repeats_bytes(self):
+        random = BufferedRandom(buffer_size=64)
+        chunks = [random(16) for _ in range(100)]
+        assert len(set(chunks)) == len(chunks)
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires fork")
+    def test_child_discards_buffer_after_fork(self):
+        random = BufferedRandom()
+        random(16)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            os.close(read_fd)
+            os.write(write_fd, random(16))
+            os._exit(0)
+        os.close(write_fd)
+        child_bytes = os.read(read_fd, 16)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        assert child_bytes != random(16)
+
+    def test_used_as_random_source(self):
+        random = BufferedRandom()
+        set_random_source(random)
+        try:
+            assert len(get_random_bytes(12)) == 12
+            assert random._stream.tell() == 12
+        finally:
+            set_random_source()
+        assert len(get_random_bytes(12)) == 12
+        assert random._stream.tell() == 12
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(ALGORITHMS, "SUPPORTED", set(ALGORITHMS.SUPPORTED))
+    yield backends
+    for family in backends.FAMILIES:
+        backends.use_backend(family)
+
+
+class TestBackendRegistry:
+    def test_available_backends(self, registry):
+        assert registry.available_backends("HMAC")[-1] == "native"
+        if CryptographyRSAKey is not None:
+            assert registry.available_backends("RSA")[0] == "cryptography"
+
+    def test_unknown_family(self, registry):
+        with pytest.raises(JWKError):
+            registry.available_backends("DSA")
+        with pytest.raises(JWKError):
+            registry.use_backend("DSA", "native")
+
+    def test_unknown_backend(self, registry):
+        with pytest.raises(JWKError):
+            registry.use_backend("HMAC", "pycryptodome")
+        assert registry.get_backend("HMAC") is HMACKey
+
+    @pytest.mark.skipif(CryptographyECKey is None, reason="The cryptography EC backend is required")
+    def test_missing_backend_keeps_current_backend(self, registry, monkeypatch):
+        find_spec = registry.importlib.util.find_spec
+        monkeypatch.setattr(
+            registry.importlib.util, "find_spec", lambda name: None if name == "ecdsa" else find_spec(name)
+        )
+        assert "ecdsa" not in registry.available_backends("EC")
+        with pytest.raises(JWKError):
+            registry.use_backend("EC", "ecdsa")
+        assert registry.get_backend("EC") is ECKey
+
+    def test_use_backend(self, registry):
+        assert registry.use_backend("HMAC", "native") == "native"
+        assert registry.HMACKey is NativeHMACKey
+        assert jwk.get_key(ALGORITHMS.HS256) is NativeHMACKey
+
+        registry.use_backend("HMAC")
+        assert registry.HMACKey is HMACKey
+        assert jwk.get_key(ALGORITHMS.HS256) is HMACKey
+
+    def test_use_backend_in_order_of_preference(self, registry):
+        assert registry.use_backend("HMAC", "native", "cryptography") == "native"
+        assert registry.use_backend("HMAC", "cryptography", "native") == registry.available_backends("HMAC")[0]
+
+    @pytest.mark.skipif(None in (PurePythonRSAKey, CryptographyRSAKey), reason="Both RSA backends are required")
+    def test_supported_follows_backend(self, registry):
+        registry.use_backend("RSA", "rsa")
+        assert jwk.get_key(ALGORITHMS.RS256) is PurePythonRSAKey
+        assert ALGORITHMS.RSA_OAEP not in ALGORITHMS.SUPPORTED
+
+        registry.use_backend("RSA", "cryptography")
+        assert jwk.get_key(ALGORITHMS.RS256) is CryptographyRSAKey
+        assert ALGORITHMS.RSA_OAEP in ALGORITHMS.SUPPORTED
+
+    def test_family_without_backend_is_not_supported(self, registry):
+        registry._advertise("OKP", None)
+        assert ALGORITHMS.EdDSA not in ALGORITHMS.SUPPORTED
+        assert ALGORITHMS.HS256 in ALGORITHMS.SUPPORTED
+
+    def test_registered_key_takes_precedence(self, registry, monkeypatch):
+        monkeypatch.setattr(ALGORITHMS, "KEYS", {ALGORITHMS.HS256: NativeHMACKey})
+        assert jwk.get_key(ALGORITHMS.HS256) is NativeHMACKey
+
+    def test_use_fastest_backend(self, registry):
+        timings = registry.benchmark_backends("HMAC", "secret", ALGORITHMS.HS256, number=5)
+        assert set(timings) == set(registry.available_backends("HMAC"))
+
+        name = registry.use_fastest_backend("HMAC", "secret", ALGORITHMS.HS256, number=5)
+        assert name in timings
+
+    @pytest.mark.skipif(None in (PurePythonRSAKey, CryptographyRSAKey), reason="Both RSA backends are required")
+    def test_benchmark_leaves_supported_algorithms_alone(self):
+        output = _run_python(
+            "import rsa",
+            "from jose import backends",
+            "from jose.constants import ALGORITHMS",
+            "pem = rsa.newkeys(1024)[1].save_pkcs1()",
+            "backends.benchmark_backends('RSA', pem, 'RS256', number=1)",
+            "print(backends.get_backend('RSA').__name__, 'RSA-OAEP' in ALGORITHMS.SUPPORTED)",
+        )
+
+        assert output == b"CryptographyRSAKey True"
+
+    def test_benchmark_needs_signing_algorithm(self, registry):
+        with pytest.raises(JWKError):
+            registry.benchmark_backends("AES", b"k" * 16, ALGORITHMS.A128KW)
+        with pytest.raises(JWKError):
+            registry.benchmark_backends("HMAC", "secret", ALGORITHMS.RS256)
+
+
+ASYMMETRIC_MODULES = (
+    "rsa",
+    "ecdsa",
+    "pyasn1",
+    "cryptography.x509",
+    "cryptography.hazmat.primitives.asymmetric",
+    "jose.backends.cryptography_backend",
+    "jose.backends.rsa_backend",
+    "jose.backends.ecdsa_backend",
+)
+
+
+def _run_python(*lines):
+    # Run in a fresh interpreter, since this one has imported every backend already.
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(jose.__file__)))
+    return subprocess.run(
+        [sys.executable, "-c", "\n".join(lines)], env=env, check=True, stdout=subprocess.PIPE
+    ).stdout.strip()
+
+
+def test_hmac_does_not_import_asymmetric_backends():
+    output = _run_python(
+        "import sys",
+        "from jose import jwt",
+        "token = jwt.encode({'a': 1}, 'secret', algorithm='HS256')",
+        "jwt.decode(token, 'secret', algorithms=['HS256'])",
+        "prefixes = %r" % (ASYMMETRIC_MODULES,),
+        "print(sorted(m for m in sys.modules if m in prefixes or m.startswith(tuple(p + '.' for p in prefixes))))",
+    )
+
+    assert output == b"[]"
+
+
+def test_backend_is_imported_on_first_use():
+    output = _run_python(
+        "import sys",
+        "from jose import jwk",
+        "assert 'jose.backends.cryptography_backend' not in sys.modules",
+        "assert 'jose.backends.rsa_backend' not in sys.modules",
+        "print(jwk.get_key('RS256') is jwk.RSAKey is not None)",
+    )
+
+    assert output == b"True"
@@ -1,9 +1,15 @@
+import hashlib
+import importlib
+import json
+import pickle
+
 import pytest
 
-from jose import jwk
-from jose.backends import AESKey, ECKey, HMACKey, RSAKey
+from jose import jwe, jwk, jws, jwt
+from jose.backends import AESKey, ECKey, HMACKey, OKPKey, RSAKey
 from jose.backends.base import Key
-from jose.exceptions import JWKError
+from jose.exceptions import JWEError, JWKError, JWSError, JWTError
+from jose.utils import base64url_encode, calculate_jwk_thumbprint
 
 hmac_key = {
     "kty": "oct",
@@ -21,6 +27,13 @@ rsa_key = {
     "e": "AQAB",
 }
 
+okp_key = {
+    "kty": "OKP",
+    "crv": "Ed25519",
+    "d": "nWGxne_9WmC6hEr0kuwsxERJxWl7MmkZcDusAxyuf2A",
+    "x": "11qYAYKxCrfVS_7TyWQHOg7hcvPapiMlrwIaaPcHURo",
+}
+
 ec_key = {
     "kty": "EC",
     "kid": "bilbo.baggins@hobbiton.example",
@@ -137,3 +150,400 @@ class TestJWK:
 
         with pytest.raises(TypeError):
             assert jwk.register_key("ALG", object)
+
+
+def _key_classes(*paths):
+    classes = []
+    for path in paths:
+        module_name, class_name = path.split(":")
+        try:
+            classes.append(getattr(importlib.import_module(module_name), class_name))
+        except ImportError:
+            pass
+    return classes
+
+
+class TestThumbprint:
+    @pytest.mark.parametrize(
+        "key_class",
+        _key_classes(
+            "jose.backends.cryptography_backend:CryptographyRSAKey",
+            "jose.backends.rsa_backend:RSAKey",
+        ),
+    )
+    def test_rsa(self, key_class):
+        key = key_class(rsa_key, "RS256")
+        assert key.thumbprint() == calculate_jwk_thumbprint(rsa_key)
+
+    @pytest.mark.parametrize(
+        "key_class",
+        _key_classes(
+            "jose.backends.cryptography_backend:CryptographyECKey",
+            "jose.backends.ecdsa_backend:ECDSAECKey",
+        ),
+    )
+    def test_ec(self, key_class):
+        key = key_class(ec_key, "ES512")
+        assert key.thumbprint() == calculate_jwk_thumbprint(ec_key)
+
+    @pytest.mark.parametrize(
+        "key_class",
+        _key_classes(
+            "jose.backends.cryptography_hmac:CryptographyHMACKey",
+            "jose.backends.native:HMACKey",
+        ),
+    )
+    def test_oct(self, key_class):
+        key = key_class(hmac_key, "HS256")
+        assert key.thumbprint() == calculate_jwk_thumbprint(hmac_key)
+
+    def test_oct_with_bytes_member(self):
+        key = jwk.construct(b"secret", "dir")
+        assert key.thumbprint() == calculate_jwk_thumbprint({"kty": "oct", "k": "c2VjcmV0"})
+
+    @pytest.mark.skipif(OKPKey is None, reason="No OKP provider")
+    def test_okp(self):
+        # https://tools.ietf.org/html/rfc8037#appendix-A.3
+        key = OKPKey(okp_key, "EdDSA")
+        assert base64url_encode(key.thumbprint()) == b"kPrK_qmxVWaYVA9wwBF6Iuo3vVzz7TxHCTwXBygrS4k"
+        assert key.thumbprint() == key.public_key().thumbprint()
+
+    def test_memoized_per_hash_alg(self):
+        key = jwk.construct(hmac_key, "HS256")
+        sha256 = key.thumbprint()
+        sha512 = key.thumbprint(hashlib.sha512)
+
+        assert key.thumbprint() is sha256
+        assert key.thumbprint(hashlib.sha512) is sha512
+        assert len(sha256) == 32
+        assert len(sha512) == 64
+
+
+class TestJWKSet:
+    def test_add(self):
+        key = jwk.construct(rsa_key, "RS256")
+        jwks = jwk.JWKSet([key])
+        kid = base64url_encode(key.thumbprint()).decode("ascii")
+
+        assert len(jwks) == 1
+        assert kid in jwks
+        assert jwks.to_dict() == {"keys": [dict(key.to_dict(), kid=kid)]}
+        assert json.loads(jwks.to_json()) == jwks.to_dict()
+
+    @pytest.mark.skipif(OKPKey is None, reason="No OKP provider")
+    def test_private_key_is_published_as_public_key(self):
+        jwks = jwk.JWKSet()
+        kid = jwks.add(OKPKey(okp_key, "EdDSA"), kid="ed")
+
+        assert kid == "ed"
+        (published,) = jwks.to_dict()["keys"]
+        assert published["kid"] == "ed"
+        assert "d" not in published
+
+    def test_symmetric_key_is_rejected(self):
+        with pytest.raises(JWKError):
+            jwk.JWKSet([jwk.construct(hmac_key)])
+
+    def test_rendered_once_per_change(self):
+        jwks = jwk.JWKSet([jwk.construct(rsa_key, "RS256")])
+        document, etag = jwks.to_json(), jwks.etag
+        assert jwks.to_json() is document
+        assert jwks.etag is etag
+        assert etag == '"%s"' % base64url_encode(hashlib.sha256(document).digest()).decode("ascii")
+
+        kid = jwks.add(jwk.construct(ec_key, "ES512"))
+        assert jwks.etag != etag
+        assert len(jwks.to_dict()["keys"]) == 2
+
+        jwks.remove(kid)
+        assert jwks.to_json() == document
+        assert jwks.etag == etag
+
+    def test_remove_unknown_kid(self):
+        with pytest.raises(KeyError):
+            jwk.JWKSet().remove("missing")
+
+
+def _hmac_jwk(secret, kid):
+    return {"kty": "oct", "kid": kid, "alg": "HS256", "k": base64url_encode(secret).decode("ascii")}
+
+
+class TestKeyStore:
+    def test_verify_by_tenant_and_kid(self):
+        store = jwk.KeyStore()
+        store.set_jwks("acme", {"keys": [_hmac_jwk(b"acme one", "one"), _hmac_jwk(b"acme two", "two")]})
+        store.set_jwks("umbrella", json.dumps({"keys": [_hmac_jwk(b"umbrella one", "one")]}))
+
+        token = jws.sign({"sub": "frodo"}, "acme two", headers={"kid": "two"})
+        assert jwt.decode(token, store.tenant("acme"), algorithms=["HS256"]) == {"sub": "frodo"}
+        with pytest.raises(JWTError):
+            jwt.decode(token, store.tenant("umbrella"), algorithms=["HS256"])
+
+        # A token without a kid is checked against all keys of the tenant.
+        token = jws.sign({"sub": "frodo"}, "acme one")
+        assert jws.verify(token, store.tenant("acme"), algorithms=["HS256"])
+
+    def test_unknown_kid_constructs_nothing(self):
+        store = jwk.KeyStore()
+        store.add("acme", _hmac_jwk(b"acme one", "one"))
+        token = jws.sign({"sub": "frodo"}, "acme one", headers={"kid": "other"})
+
+        with pytest.raises(JWSError):
+            jws.verify(token, store.tenant("acme"), algorithms=["HS256"])
+        assert len(store._keys) == 0
+
+    @pytest.mark.parametrize("kid", [["one"], {"one": 1}, 1])
+    def test_kid_must_be_a_string(self, kid):
+        store = jwk.KeyStore()
+        store.add("acme", _hmac_jwk(b"acme one", "one"))
+        token = jws.sign({"sub": "frodo"}, "acme one", headers={"kid": kid})
+
+        with pytest.raises(JWSError):
+            jws.verify(token, store.tenant("acme"), algorithms=["HS256"])
+        with pytest.raises(JWTError):
+            jwt.decode(token, store.tenant("acme"), algorithms=["HS256"])
+
+    def test_keys_are_constructed_once(self):
+        store = jwk.KeyStore()
+        store.add("acme", _hmac_jwk(b"acme one", "one"))
+        assert len(store._keys) == 0
+
+        key = store.get("acme", "one")
+        assert store.get("acme", "one") is key
+        assert store.tenant("acme").get("one") is key
+
+    def test_add_key(self):
+        store = jwk.KeyStore()
+        key = jwk.construct(rsa_key, "RS256")
+        kid = store.add("acme", key)
+
+        assert kid == base64url_encode(key.thumbprint()).decode("ascii")
+        assert store.kids("acme") == [kid]
+        assert store.get("acme", kid).to_dict() == key.to_dict()
+
+    def test_add_jwk_needs_algorithm(self):
+        store = jwk.KeyStore()
+        with pytest.raises(JWKError):
+            store.add("acme", rsa_key)
+
+        kid = store.add("acme", rsa_key, algorithm="RS256")
+        assert kid == rsa_key["kid"]
+        assert store.get("acme", kid).to_dict() == jwk.construct(rsa_key, "RS256").to_dict()
+
+    def test_invalid_keys(self):
+        store = jwk.KeyStore()
+        with pytest.raises(JWKError):
+            store.add("acme", "not a jwk")
+        with pytest.raises(JWKError):
+            store.add("acme", dict(hmac_key, alg="XX256"))
+        with pytest.raises(JWKError):
+            store.set_jwks("acme", {"keys": [dict(hmac_key, kid=None)]})
+        assert "acme" not in store
+
+    def test_lru(self):
+        store = jwk.KeyStore(maxsize=2)
+        for kid in ("one", "two", "three"):
+            store.add("acme", _hmac_jwk(kid.encode("ascii"), kid))
+
+        one = store.get("acme", "one")
+        store.get("acme", "two")
+        store.get("acme", "one")
+        store.get("acme", "three")
+        assert list(store._keys) == [("acme", "one"), ("acme", "three")]
+        assert store.get("acme", "one") is one
+
+    def test_max_bytes(self):
+        store = jwk.KeyStore(max_bytes=150)
+        for kid in ("one", "two"):
+            store.add("acme", _hmac_jwk(kid.encode("ascii") * 20, kid))
+
+        store.get("acme", "one")
+        store.get("acme", "two")
+        assert list(store._keys) == [("acme", "two")]
+        assert store._size <= 150
+
+    def test_replaced_keys_are_reconstructed(self):
+        store = jwk.KeyStore()
+        store.set_jwks("acme", {"keys": [_hmac_jwk(b"old", "one")]})
+        old = store.get("acme", "one")
+
+        store.set_jwks("acme", {"keys": [_hmac_jwk(b"new", "one")]})
+        token = jws.sign({"sub": "frodo"}, "new", headers={"kid": "one"})
+        assert store.get("acme", "one") is not old
+        assert jws.verify(token, store.tenant("acme"), algorithms=["HS256"])
+
+    def test_remove(self):
+        store = jwk.KeyStore()
+        store.add("acme", _hmac_jwk(b"one", "one"))
+        store.add("acme", _hmac_jwk(b"two", "two"))
+        store.get("acme", "one")
+
+        store.remove("acme", "one")
+        assert store.kids("acme") == ["two"]
+        assert store._size == 0
+        with pytest.raises(KeyError):
+            store.get("acme", "one")
+
+        store.remove("acme")
+        assert "acme" not in store
+        with pytest.raises(KeyError):
+            store.remove("acme")
+
+    @pytest.mark.skipif(AESKey is None, reason="No AES provider")
+    def test_decrypt(self):
+        store = jwk.KeyStore()
+        secret = b"0123456789abcdef0123456789abcdef"
+        store.add("acme", {"kty": "oct", "alg": "dir", "k": base64url_encode(secret).decode("ascii")}, kid="one")
+        store.add("acme", {"kty": "oct", "alg": "dir", "k": base64url_encode(secret[::-1]).decode("ascii")}, kid="two")
+
+        for kid, key in (("one", secret), ("two", secret[::-1])):
+            token = jwe.encrypt(b"Hello", key, encryption="A256GCM", algorithm="dir", kid=kid)
+            assert jwe.decrypt(token, store.tenant("acme")) == b"Hello"
+            assert jwe.decrypt_many([token], store.tenant("acme")) == [b"Hello"]
+
+        token = jwe.encrypt(b"Hello", secret, encryption="A256GCM", algorithm="dir")
+        with pytest.raises(JWEError):
+            jwe.decrypt(token, store.tenant("acme"))
+
+    @pytest.mark.skipif(AESKey is None, reason="No AES provider")
+    def test_decrypt_with_another_alg_than_the_key(self):
+        store = jwk.KeyStore()
+        secret = b"0123456789abcdef0123456789abcdef"
+        store.add("acme", {"kty": "oct", "alg": "dir", "k": base64url_encode(secret).decode("ascii")}, kid="one")
+
+        token = jwe.encrypt(b"Hello", secret, encryption="A256GCM", algorithm="A256KW", kid="one")
+        with pytest.raises(JWEError, match="cannot be used"):
+            jwe.decrypt(token, store.tenant("acme"))
+
+        alg = "PBES2-HS256+A128KW"
+        token = jwe.Encryptor(secret, alg, "A256GCM", kid="one", p2c=1000).encrypt(b"Hello")
+        with pytest.raises(JWEError, match="cannot be used"):
+            jwe.decrypt(token, store.tenant("acme"), algorithms=alg)
+
+    def test_warmup(self):
+        store = jwk.KeyStore()
+        store.set_jwks("acme", {"keys": [_hmac_jwk(b"one", "one"), _hmac_jwk(b"two", "two")]})
+        store.add("umbrella", jwk.construct(rsa_key, "RS256"), kid="rsa")
+
+        assert store.warmup() == 3
+        assert len(store._keys) == 3
+
+    def test_snapshot(self, tmp_path):
+        path = str(tmp_path / "keys.snapshot")
+        store = jwk.KeyStore()
+        store.set_jwks("acme", {"keys": [_hmac_jwk(b"acme one", "one"), _hmac_jwk(b"acme two", "two")]})
+        store.add("umbrella", jwk.construct(rsa_key, "RS256"), kid="rsa")
+        store.save(path)
+
+        loaded = jwk.KeyStore.load(path, maxsize=10)
+        assert loaded.maxsize == 10
+        assert loaded.kids("acme") == ["one", "two"]
+        assert len(loaded._keys) == 0
+        assert loaded.get("umbrella", "rsa").to_dict() == store.get("umbrella", "rsa").to_dict()
+
+        token = jws.sign({"sub": "frodo"}, "acme two", headers={"kid": "two"})
+        assert jws.verify(token, loaded.tenant("acme"), algorithms=["HS256"])
+
+        # A loaded store can be changed and saved again over its own snapshot.
+        loaded.set_jwks("acme", {"keys": [_hmac_jwk(b"acme two", "two")]})
+        loaded.save(path)
+        assert jwk.KeyStore.load(path).kids("acme") == ["two"]
+
+    def test_snapshot_needs_string_tenants(self, tmp_path):
+        store = jwk.KeyStore()
+        store.add(1, _hmac_jwk(b"one", "one"))
+        with pytest.raises(JWKError):
+            store.save(str(tmp_path / "keys.snapshot"))
+
+    @pytest.mark.parametrize("content", [b"", b"not a snapshot", b"\x00" * 32])
+    def test_load_invalid_snapshot(self, tmp_path, content):
+        path = tmp_path / "keys.snapshot"
+        path.write_bytes(content)
+        with pytest.raises(JWKError):
+            jwk.KeyStore.load(str(path))
+
+    @pytest.mark.parametrize(
+        "index", [b"{", b"[]", b'{"acme": []}', b'{"acme": {"one": "x"}}', b'{"acme": {"one": [0, 100]}}']
+    )
+    def test_load_corrupt_index(self, tmp_path, index):
+        path = tmp_path / "keys.snapshot"
+        path.write_bytes(jwk._SNAPSHOT_HEADER.pack(jwk._SNAPSHOT_MAGIC, len(index)) + index + b"{}")
+        with pytest.raises(JWKError):
+            jwk.KeyStore.load(str(path))
+
+    def test_load_truncated_snapshot(self, tmp_path):
+        path = tmp_path / "keys.snapshot"
+        store = jwk.KeyStore()
+        store.add("acme", _hmac_jwk(b"acme one", "one"))
+        store.save(str(path))
+        path.write_bytes(path.read_bytes()[:-1])
+        with pytest.raises(JWKError):
+            jwk.KeyStore.load(str(path))
+
+    @pytest.mark.parametrize("data", [b"not json", b"[]", b"{}", b'{"alg": "HS256", "kty": "oct"}'])
+    def test_corrupt_key(self, tmp_path, data):
+        path = tmp_path / "keys.snapshot"
+        index = json.dumps({"acme": {"one": [0, len(data)]}}).encode()
+        path.write_bytes(jwk._SNAPSHOT_HEADER.pack(jwk._SNAPSHOT_MAGIC, len(index)) + index + data)
+
+        store = jwk.KeyStore.load(str(path))
+        with pytest.raises(JWKError):
+            store.get("acme", "one")
+        token = jws.sign({"sub": "frodo"}, "acme one", headers={"kid": "one"})
+        with pytest.raises(JWSError):
+            jws.verify(token, store.tenant("acme"), algorithms=["HS256"])
+
+
+SERIALIZABLE_KEYS = (
+    ("jose.backends.cryptography_backend:CryptographyRSAKey", rsa_key, "RS256"),
+    ("jose.backends.rsa_backend:RSAKey", rsa_key, "RS256"),
+    ("jose.backends.cryptography_backend:CryptographyECKey", ec_key, "ES512"),
+    ("jose.backends.ecdsa_backend:ECDSAECKey", ec_key, "ES512"),
+    ("jose.backends.cryptography_hmac:CryptographyHMACKey", hmac_key, "HS256"),
+    ("jose.backends.native:HMACKey", hmac_key, "HS256"),
+    ("jose.backends.cryptography_backend:CryptographyOKPKey", okp_key, "EdDSA"),
+    ("jose.backends.cryptography_backend:CryptographyAESKey", b"k" * 16, "A128GCM"),
+    ("jose.backends.base:DIRKey", b"secret", "dir"),
+)
+
+
+def _serializable_keys():
+    keys = []
+    for path, key_data, algorithm in SERIALIZABLE_KEYS:
+        for key_class in _key_classes(path):
+            keys.append(key_class(key_data, algorithm))
+    return keys
+
+
+class TestSerialization:
+    @pytest.mark.parametrize("key", _serializable_keys(), ids=lambda key: type(key).__name__)
+    def test_roundtrip(self, key):
+        data = key.to_bytes()
+        assert key.to_bytes() is data
+
+        loaded = type(key).from_bytes(data)
+        assert type(loaded) is type(key)
+        assert loaded.to_bytes() == data
+
+        unpickled = pickle.loads(pickle.dumps(key))
+        assert type(unpickled) is type(key)
+        assert unpickled.to_bytes() == data
+
+    def test_private_key(self):
+        key = OKPKey(okp_key, "EdDSA") if OKPKey is not None else jwk.construct(hmac_key)
+        loaded = pickle.loads(pickle.dumps(key))
+        assert loaded.verify(b"msg", key.sign(b"msg"))
+        assert key.verify(b"msg", loaded.sign(b"msg"))
+
+    def test_loaded_keys_are_cached(self):
+        key = jwk.construct(hmac_key)
+        data = key.to_bytes()
+        assert type(key).from_bytes(data) is type(key).from_bytes(bytearray(data))
+        assert pickle.loads(pickle.dumps(key)) is type(key).from_bytes(data)
+
+
+@pytest.mark.parametrize("key", _serializable_keys(), ids=lambda key: type(key).__name__)
+def test_keys_are_slotted(key):
+    assert not hasattr(key, "__dict__")
+    key.thumbprint()
+    key.to_bytes()
@@ -125,6 +125,11 @@ class TestHMAC:
         with pytest.raises(JWSError):
             jws.sign(payload, "secret", algorithm="SOMETHING")
 
+    @pytest.mark.parametrize("algorithm", [ALGORITHMS.DIR, ALGORITHMS.A128KW, ALGORITHMS.ECDH_ES])
+    def test_key_management_alg(self, payload, algorithm):
+        with pytest.raises(JWSError, match="not supported"):
+            jws.sign(payload, "secret", algorithm=algorithm)
+
     def test_add_headers(self, payload):
         additional_headers = {"test": "header"}
 
@@ -1,5 +1,7 @@
 from datetime import timedelta
 
+import pytest
+
 from jose import utils
 
 
@@ -12,3 +14,21 @@ class TestUtils:
     def test_long_to_base64(self):
         assert utils.long_to_base64(0xDEADBEEF) == b"3q2-7w"
         assert utils.long_to_base64(0xCAFED00D, size=10) == b"AAAAAAAAyv7QDQ"
+
+    def test_calculate_jwk_thumbprint(self):
+        # https://tools.ietf.org/html/rfc7638#section-3.1
+        jwk_dict = {
+            "kty": "RSA",
+            "n": "0vx7agoebGcQSuuPiLJXZptN9nndrQmbXEps2aiAFbWhM78LhWx4cbbfAAtVT86zwu1RK7aPFFxuhDR1L6tSoc_BJECPebWKRXjBZCiFV4n3oknjhMstn64tZ_2W-5JsGY4Hc5n9yBXArwl93lqt7_RN5w6Cf0h4QyQ5v-65YGjQR0_FDW2QvzqY368QQMicAtaSqzs8KJZgnYb9c7d0zgdAZHzu6qMQvRL5hajrn1n91CbOpbISD08qNLyrdkt-bFTWhAI4vMQFh6WeZu0fM4lFd2NcRwr3XPksINHaQ-G_xBniIqbw0Ls1jF44-csFCur-kEgU8awapJzKnqDKgw",  # noqa: E501
+            "e": "AQAB",
+            "alg": "RS256",
+            "kid": "2011-04-29",
+        }
+
+        thumbprint = utils.calculate_jwk_thumbprint(jwk_dict)
+
+        assert utils.base64url_encode(thumbprint) == b"NzbLsXh8uDCcd-6MNwXF4W_7noWXFZAfHkxZsRGC9Xs"
+
+    def test_calculate_jwk_thumbprint_missing_member(self):
+        with pytest.raises(KeyError):
+            utils.calculate_jwk_thumbprint({"kty": "EC", "crv": "P-256", "x": "AQAB"})
@@ -0,0 +1,207 @@
+import base64
+import datetime
+
+import pytest
+
+from jose import jwk, jws, jwt
+from jose.constants import ALGORITHMS
+from jose.exceptions import JWKError, JWSError, JWTError
+from jose.utils import base64url_encode
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    from jose.x5c import TrustStore
+except ImportError:
+    TrustStore = None
+
+pytestmark = pytest.mark.skipif(TrustStore is None, reason="cryptography is not available")
+
+KEY_USAGES = (
+    "digital_signature",
+    "content_commitment",
+    "key_encipherment",
+    "data_encipherment",
+    "key_agreement",
+    "key_cert_sign",
+    "crl_sign",
+    "encipher_only",
+    "decipher_only",
+)
+
+EPOCH = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+NOW = EPOCH.timestamp() + 3600
+
+
+def _certificate(name, key, issuer=None, issuer_key=None, ca=False, path_length=None, days=10, key_usage=None):
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(issuer.subject if issuer is not None else subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(EPOCH)
+        .not_valid_after(EPOCH + datetime.timedelta(days=days))
+    )
+    if ca:
+        builder = builder.add_extension(x509.BasicConstraints(ca=True, path_length=path_length), critical=True)
+    if key_usage is not None:
+        usages = dict.fromkeys(KEY_USAGES, False)
+        usages.update(dict.fromkeys(key_usage, True))
+        builder = builder.add_extension(x509.KeyUsage(**usages), critical=True)
+    return builder.sign(issuer_key or key, hashes.SHA256())
+
+
+def _x5c(*certificates):
+    return [base64.b64encode(c.public_bytes(serialization.Encoding.DER)).decode("ascii") for c in certificates]
+
+
+class Clock:
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="module")
+def pki():
+    root_key = ec.generate_private_key(ec.SECP256R1())
+    root = _certificate("root", root_key, ca=True)
+    intermediate_key = ec.generate_private_key(ec.SECP256R1())
+    intermediate = _certificate("intermediate", intermediate_key, root, root_key, ca=True, path_length=0, days=5)
+    leaf_key = ec.generate_private_key(ec.SECP256R1())
+    leaf = _certificate("leaf", leaf_key, intermediate, intermediate_key)
+    leaf_pem = leaf_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    return {
+        "root": root,
+        "root_key": root_key,
+        "intermediate": intermediate,
+        "intermediate_key": intermediate_key,
+        "leaf": leaf,
+        "leaf_pem": leaf_pem,
+    }
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def trust_store(pki, clock):
+    return TrustStore([pki["root"].public_bytes(serialization.Encoding.PEM)], clock=clock)
+
+
+def _sign(pki, x5c, **headers):
+    return jws.sign({"sub": "frodo"}, pki["leaf_pem"], headers=dict(headers, x5c=x5c), algorithm=ALGORITHMS.ES256)
+
+
+class TestTrustStore:
+    def test_verify_token(self, pki, trust_store):
+        token = _sign(pki, _x5c(pki["leaf"], pki["intermediate"]))
+        assert jwt.decode(token, trust_store, algorithms=[ALGORITHMS.ES256]) == {"sub": "frodo"}
+
+        # The trust anchor may be part of the chain.
+        token = _sign(pki, _x5c(pki["leaf"], pki["intermediate"], pki["root"]))
+        assert jwt.decode(token, trust_store, algorithms=[ALGORITHMS.ES256]) == {"sub": "frodo"}
+
+    def test_untrusted_chain(self, pki, clock):
+        other_key = ec.generate_private_key(ec.SECP256R1())
+        trust_store = TrustStore([_certificate("other", other_key, ca=True)], clock=clock)
+        token = _sign(pki, _x5c(pki["leaf"], pki["intermediate"]))
+
+        with pytest.raises(JWTError):
+            jwt.decode(token, trust_store, algorithms=[ALGORITHMS.ES256])
+
+    def test_token_without_chain(self, pki, trust_store):
+        token = jws.sign({"sub": "frodo"}, pki["leaf_pem"], algorithm=ALGORITHMS.ES256)
+        with pytest.raises(JWSError):
+            jws.verify(token, trust_store, algorithms=[ALGORITHMS.ES256])
+
+    def test_validation_is_cached_until_expiry(self, pki, trust_store, clock):
+        x5c = _x5c(pki["leaf"], pki["intermediate"])
+        leaf = trust_store.verify_chain(x5c)
+        assert leaf == pki["leaf"]
+        assert trust_store.verify_chain(x5c) is leaf
+        assert trust_store.key_for({"x5c": x5c}, ALGORITHMS.ES256) is trust_store.key_for(
+            {"x5c": x5c, "alg": ALGORITHMS.ES256}
+        )
+
+        # The intermediate expires first.
+        clock.now = EPOCH.timestamp() + 5 * 86400
+        with pytest.raises(JWKError, match="expired"):
+            trust_store.verify_chain(x5c)
+
+    def test_not_yet_valid(self, pki, trust_store, clock):
+        clock.now = EPOCH.timestamp() - 1
+        with pytest.raises(JWKError):
+            trust_store.verify_chain(_x5c(pki["leaf"], pki["intermediate"]))
+
+    def test_issuer_must_be_ca(self, pki, trust_store):
+        key = ec.generate_private_key(ec.SECP256R1())
+        certificate = _certificate("below leaf", key, pki["leaf"], key)
+        with pytest.raises(JWKError, match="may not issue"):
+            trust_store.verify_chain(_x5c(certificate, pki["leaf"], pki["intermediate"]))
+
+    def test_path_length(self, pki, trust_store):
+        key = ec.generate_private_key(ec.SECP256R1())
+        sub_ca = _certificate("sub ca", key, pki["intermediate"], pki["intermediate_key"], ca=True)
+        leaf = _certificate("leaf", key, sub_ca, key)
+        with pytest.raises(JWKError, match="may not issue"):
+            trust_store.verify_chain(_x5c(leaf, sub_ca, pki["intermediate"]))
+
+    def test_key_usage(self, pki, trust_store):
+        key = ec.generate_private_key(ec.SECP256R1())
+        issuing_ca = _certificate("issuing ca", key, pki["root"], pki["root_key"], ca=True, key_usage=["key_cert_sign"])
+        leaf = _certificate("leaf", key, issuing_ca, key, key_usage=["digital_signature"])
+        assert trust_store.verify_chain(_x5c(leaf, issuing_ca)) == leaf
+
+        # A CA whose key usage does not allow signing certificates may not issue them.
+        signing_ca = _certificate(
+            "signing ca", key, pki["root"], pki["root_key"], ca=True, key_usage=["digital_signature"]
+        )
+        leaf = _certificate("leaf", key, signing_ca, key)
+        with pytest.raises(JWKError, match="may not issue"):
+            trust_store.verify_chain(_x5c(leaf, signing_ca))
+
+        leaf = _certificate("leaf", key, pki["intermediate"], pki["intermediate_key"], key_usage=["key_encipherment"])
+        with pytest.raises(JWKError, match="digital signatures"):
+            trust_store.verify_chain(_x5c(leaf, pki["intermediate"]))
+
+    def test_wrong_signature(self, pki, trust_store):
+        key = ec.generate_private_key(ec.SECP256R1())
+        forged = _certificate("leaf", key, pki["intermediate"], key)
+        with pytest.raises(JWKError, match="not signed"):
+            trust_store.verify_chain(_x5c(forged, pki["intermediate"]))
+
+    def test_x5t_s256(self, pki, trust_store):
+        x5c = _x5c(pki["leaf"], pki["intermediate"])
+        fingerprint = base64url_encode(pki["leaf"].fingerprint(hashes.SHA256())).decode("ascii")
+
+        assert trust_store.verify_chain(x5c, fingerprint) == pki["leaf"]
+        token = _sign(pki, x5c, **{"x5t#S256": base64url_encode(b"\0" * 32).decode("ascii")})
+        with pytest.raises(JWSError):
+            jws.verify(token, trust_store, algorithms=[ALGORITHMS.ES256])
+
+    @pytest.mark.parametrize("x5c", ["MIIB", [], ["not base64!"], ["AAAA"]])
+    def test_invalid_x5c(self, trust_store, x5c):
+        with pytest.raises(JWKError):
+            trust_store.verify_chain(x5c)
+
+    def test_jwk_must_match_certificate(self, pki, trust_store):
+        x5c = _x5c(pki["leaf"], pki["intermediate"])
+        key = trust_store.key_for({"x5c": x5c}, ALGORITHMS.ES256)
+        jwk_dict = dict(key.to_dict(), x5c=x5c)
+        assert trust_store.key_for(jwk_dict).to_dict() == key.to_dict()
+
+        other_key = ec.generate_private_key(ec.SECP256R1()).public_key()
+        other = dict(jwk.construct(other_key, ALGORITHMS.ES256).to_dict(), x5c=x5c)
+        with pytest.raises(JWKError):
+            trust_store.key_for(other)